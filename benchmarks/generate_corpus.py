@@ -0,0 +1,182 @@
+"""
+A script to generate a synthetic corpus of HTML pages that follow the page
+layouts handled by lib.extractor, for benchmarking the analyzer.
+"""
+import argparse
+import os
+import random
+
+import lib.logger as logger
+
+
+# Page layouts, one per extraction strategy of lib.extractor plus a page
+# without any known structure that ends up in the fallback
+LAYOUT_CAAS = "caas-content-wrapper"
+LAYOUT_SECTION = "section-articles"
+LAYOUT_MAIN = "main-w100"
+LAYOUT_READ_FULL_ARTICLE = "read-full-article"
+LAYOUT_SEE_ALL_ARTICLES = "see-all-articles"
+LAYOUT_UNSTRUCTURED = "unstructured"
+LAYOUTS = [LAYOUT_CAAS, LAYOUT_SECTION, LAYOUT_MAIN, LAYOUT_READ_FULL_ARTICLE,
+           LAYOUT_SEE_ALL_ARTICLES, LAYOUT_UNSTRUCTURED]
+
+_LETTERS = "abcdefghijklmnopqrstuvwxyz"
+
+
+class SyntheticPageGenerator(object):
+    """Generates HTML pages with words drawn from a Zipf-like distribution
+    over a synthetic vocabulary, so that the word frequencies look like the
+    ones of real articles. Some tokens are too short or contain digits, so
+    that they are dropped by the word validation.
+    """
+
+    def __init__(self, vocabulary_size=20000, words_per_page=800,
+                 layouts=None, seed=0):
+        """
+        Constructor
+
+        Args:
+            vocabulary_size(int): No.of distinct valid words. Default: 20000
+            words_per_page(int): No.of words in the article of a page.
+                                 Default: 800
+            layouts(list): Layouts the pages are spread over round robin.
+                           Default: LAYOUTS
+            seed(int): Seed of the random generator. Default: 0
+        """
+        self.random = random.Random(seed)
+        self.words_per_page = words_per_page
+        self.layouts = layouts or LAYOUTS
+        self.vocabulary = self._make_vocabulary(vocabulary_size)
+        # Zipf: the weight of the word of rank r is 1/r
+        self._cumulative_weights = []
+        total = 0.0
+        for rank in range(1, vocabulary_size + 1):
+            total += 1.0 / rank
+            self._cumulative_weights.append(total)
+
+    def _make_vocabulary(self, size):
+        words = set()
+        while len(words) < size:
+            length = self.random.randint(3, 12)
+            words.add("".join(self.random.choice(_LETTERS)
+                              for _ in range(length)))
+        return sorted(words)
+
+    def article(self):
+        """
+        Returns: Article text of a page
+        """
+        words = self.random.choices(self.vocabulary,
+                                    cum_weights=self._cumulative_weights,
+                                    k=self.words_per_page)
+        # Sprinkle in tokens that are not valid words
+        for _ in range(self.words_per_page // 20):
+            position = self.random.randrange(len(words))
+            words[position] = self.random.choice(
+                ["a", "of", "to", "2019", "mp3", "x86", "COVID-19"])
+        # Capitalize the starts of the sentences
+        for position in range(0, len(words), 15):
+            words[position] = words[position].capitalize() + "."
+        return " ".join(words)
+
+    def page(self, index):
+        """
+        Args:
+            index(int): Index of the page, selects its layout
+
+        Returns: (layout, HTML source) tuple
+        """
+        layout = self.layouts[index % len(self.layouts)]
+        article = self.article()
+        head = ("<head><title>Page {index}</title>"
+                "<style>body {{ font-family: sans-serif; }}</style>"
+                "<script>window.pageId = {index};</script></head>"
+                ).format(index=index)
+        nav = ('<nav><a href="/">Home</a> <a href="/tech">Tech</a> '
+               '<a href="/science">Science</a></nav>')
+        footer = ("<!-- footer --><footer>Copyright. Latest Stories and "
+                  "more</footer>")
+        if layout == LAYOUT_CAAS:
+            body = f'<div class="caas-content-wrapper"><p>{article}</p></div>'
+        elif layout == LAYOUT_SECTION:
+            body = f'<section class="articles"><p>{article}</p></section>'
+        elif layout == LAYOUT_MAIN:
+            body = f'<main class="W(100%)"><p>{article}</p></main>'
+        elif layout == LAYOUT_READ_FULL_ARTICLE:
+            # The article has to stay on a single line for the regex
+            body = f"<div><p>Read full article</p><p>{article}</p></div>"
+            footer = "<footer>Latest Stories</footer>"
+        elif layout == LAYOUT_SEE_ALL_ARTICLES:
+            body = (f"<div><p>See all articles</p>\n<p>{article}</p>\n"
+                    "<p>View All Comments</p></div>")
+        else:
+            body = f"<div><p>{article}</p></div>"
+        return layout, (f"<!DOCTYPE html><html>{head}<body>{nav}{body}"
+                        f"{footer}</body></html>")
+
+
+def generate_corpus(output_dir, num_files, word_bank_file_path=None,
+                    **kwargs):
+    """
+    Writes a synthetic corpus as one html file per page, like the downloader
+    does.
+
+    Args:
+        output_dir(str): Directory the html files are written to
+        num_files(int): No.of pages
+        word_bank_file_path(str): When given, a word bank with every second
+                                  word of the vocabulary is written to this
+                                  file. Default: None
+        kwargs(dict): Arguments for SyntheticPageGenerator
+
+    Returns: Total no.of bytes written
+    """
+    generator = SyntheticPageGenerator(**kwargs)
+    os.makedirs(output_dir, exist_ok=True)
+    total_bytes = 0
+    for index in range(num_files):
+        layout, html = generator.page(index)
+        content = html.encode("utf-8")
+        file_path = os.path.join(output_dir, f"{layout}-{index}.html")
+        with open(file_path, "wb") as file:
+            file.write(content)
+        total_bytes += len(content)
+    if word_bank_file_path:
+        with open(word_bank_file_path, "w", encoding="utf-8") as file:
+            file.write("\n".join(generator.vocabulary[::2]))
+    return total_bytes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="A script to generate a synthetic HTML corpus")
+    parser.add_argument("-o", "--output_dir",
+                        help="relative (to the cwd) directory path the html "
+                             "files are written to",
+                        type=str, required=True)
+    parser.add_argument("-n", "--num_files", help="No.of pages. Default: 1000",
+                        type=int, default=1000)
+    parser.add_argument("--words_per_page",
+                        help="No.of words in the article of a page. "
+                             "Default: 800",
+                        type=int, default=800)
+    parser.add_argument("--vocabulary_size",
+                        help="No.of distinct valid words. Default: 20000",
+                        type=int, default=20000)
+    parser.add_argument("-w", "--word_bank_file_path",
+                        help="relative (to the cwd) file path to write a word "
+                             "bank with half of the vocabulary to. "
+                             "Default: None",
+                        type=str, default=None)
+    parser.add_argument("-s", "--seed", help="Random seed. Default: 0",
+                        type=int, default=0)
+
+    parsed_args = parser.parse_args()
+    total_bytes = generate_corpus(
+        parsed_args.output_dir, parsed_args.num_files,
+        word_bank_file_path=parsed_args.word_bank_file_path,
+        vocabulary_size=parsed_args.vocabulary_size,
+        words_per_page=parsed_args.words_per_page,
+        seed=parsed_args.seed)
+    logger.INFO(f"Wrote {parsed_args.num_files} pages ({total_bytes} bytes) "
+                f"to {parsed_args.output_dir}")
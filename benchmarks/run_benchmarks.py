@@ -0,0 +1,372 @@
+"""
+A script to benchmark the analyzer stage by stage, the analyzer end to end
+across executors and worker counts, and the downloader against a local stub
+server. The results are written to a JSON file that can be compared against
+the results of another version with --baseline.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+from collections import Counter
+
+import lib.constants as constants
+import lib.logger as logger
+from benchmarks.generate_corpus import generate_corpus
+from benchmarks.stub_server import StubServer
+from lib.corpus import open_corpus
+from lib.extractor import ContentExtractor
+from lib.tokenizer import TokenCounter
+from lib.word_bank import TOKEN_PATTERN, WordBank
+from scripts.download_data import PageSourceDownloader
+from scripts.word_analyzer import WordFrequencyProcessor
+
+STAGE_READ = "read"
+STAGE_EXTRACT = "parse-extract"
+STAGE_TOKENIZE = "tokenize"
+STAGE_FILTER = "filter"
+STAGE_COUNT = "count"
+# Tokenize, filter and count of lib.tokenizer.TokenCounter in batches
+STAGE_BATCHED_COUNT = "batched-tokenize-filter-count"
+STAGES = [STAGE_READ, STAGE_EXTRACT, STAGE_TOKENIZE, STAGE_FILTER,
+          STAGE_COUNT, STAGE_BATCHED_COUNT]
+
+
+def throughput(name, files, num_bytes, seconds, **details):
+    """
+    Args:
+        name(str): Name of the measurement
+        files(int): No.of files handled
+        num_bytes(int): No.of bytes handled
+        seconds(float): Time taken
+        details(dict): Extra fields of the measurement, eg: worker count
+
+    Returns: Dict that describes the measurement
+    """
+    result = {"name": name}
+    result.update(details)
+    result.update({
+        "files": files,
+        "bytes": num_bytes,
+        "seconds": round(seconds, 6),
+        "files_per_sec": round(files / seconds, 2) if seconds else None,
+        "mb_per_sec": round(num_bytes / seconds / 2 ** 20, 3)
+        if seconds else None,
+    })
+    return result
+
+
+def benchmark_stages(corpus_path, word_bank):
+    """
+    Runs the analyzer stages one after the other on a single thread and
+    measures each of them separately. Every stage is measured against the
+    size of its own input, eg: the tokenize stage against the size of the
+    extracted text. The batched stage does the work of the tokenize, filter
+    and count stages the way the analyzer does it.
+
+    Args:
+        corpus_path(str): Directory, zip archive or packed segment file path
+        word_bank(lib.word_bank.WordBank): Word bank used by the filter stage
+
+    Returns: List of measurements, one per stage
+    """
+    corpus = open_corpus(corpus_path)
+    extractor = ContentExtractor()
+    names = corpus.names()
+    seconds = dict.fromkeys(STAGES, 0.0)
+    num_bytes = dict.fromkeys(STAGES, 0)
+    counter = Counter()
+    token_counter = TokenCounter(word_bank)
+    batch = []
+
+    def count_batch():
+        started = time.perf_counter()
+        token_counter.update(batch)
+        seconds[STAGE_BATCHED_COUNT] += time.perf_counter() - started
+        num_bytes[STAGE_BATCHED_COUNT] += sum(len(text) for text in batch)
+        batch.clear()
+
+    for name in names:
+        started = time.perf_counter()
+        content = corpus.read_bytes(name)
+        seconds[STAGE_READ] += time.perf_counter() - started
+        num_bytes[STAGE_READ] += len(content)
+
+        started = time.perf_counter()
+        text = extractor.extract(content.decode("utf-8"))
+        seconds[STAGE_EXTRACT] += time.perf_counter() - started
+        num_bytes[STAGE_EXTRACT] += len(content)
+
+        started = time.perf_counter()
+        tokens = TOKEN_PATTERN.findall(text.lower())
+        seconds[STAGE_TOKENIZE] += time.perf_counter() - started
+        num_bytes[STAGE_TOKENIZE] += len(text)
+
+        started = time.perf_counter()
+        words = [token for token in tokens if token in word_bank]
+        seconds[STAGE_FILTER] += time.perf_counter() - started
+        num_bytes[STAGE_FILTER] += sum(len(token) for token in tokens)
+
+        started = time.perf_counter()
+        counter.update(words)
+        seconds[STAGE_COUNT] += time.perf_counter() - started
+        num_bytes[STAGE_COUNT] += sum(len(word) for word in words)
+
+        batch.append(text)
+        if len(batch) == constants.PROCESS_BATCH_SIZE:
+            count_batch()
+    if batch:
+        count_batch()
+    return [throughput(stage, len(names), num_bytes[stage], seconds[stage])
+            for stage in STAGES]
+
+
+def benchmark_analyzer(corpus_path, word_bank_file_path, executors,
+                       worker_counts):
+    """
+    Measures WordFrequencyProcessor end to end for every executor and worker
+    count.
+
+    Args:
+        corpus_path(str): Directory, zip archive or packed segment file path
+        word_bank_file_path(str): Word bank file path
+        executors(list): Executors, "thread" and/or "process"
+        worker_counts(list): Worker counts
+
+    Returns: List of measurements
+    """
+    corpus = open_corpus(corpus_path)
+    names = corpus.names()
+    total_bytes = sum(len(corpus.read_bytes(name)) for name in names)
+    results = []
+    for executor in executors:
+        for num_workers in worker_counts:
+            processor = WordFrequencyProcessor(
+                html_files_dir_path=corpus_path,
+                word_bank_file_path=word_bank_file_path,
+                num_threads=num_workers, executor=executor)
+            started = time.perf_counter()
+            processor.process_all_files()
+            seconds = time.perf_counter() - started
+            results.append(throughput("analyzer", len(names), total_bytes,
+                                      seconds, executor=executor,
+                                      workers=num_workers))
+            logger.INFO(f"Analyzer {executor} x {num_workers}: "
+                        f"{results[-1]['files_per_sec']} files/sec")
+    return results
+
+
+def benchmark_downloader(work_dir, num_urls, backends, concurrencies,
+                         latency):
+    """
+    Measures PageSourceDownloader for every backend and concurrency against
+    a local stub server.
+
+    Args:
+        work_dir(str): Scratch directory
+        num_urls(int): No.of urls downloaded per measurement
+        backends(list): Download backends, "thread" and/or "async"
+        concurrencies(list): Thread counts for the thread backend, max
+                             in-flight requests for the async backend
+        latency(float): Seconds the stub server delays each response by
+
+    Returns: List of measurements
+    """
+    results = []
+    with StubServer(latency=latency) as stub_server:
+        url_list_file = os.path.join(work_dir, "urls")
+        with open(url_list_file, "w") as file:
+            file.write("\n".join(stub_server.urls(num_urls)))
+        for backend in backends:
+            for concurrency in concurrencies:
+                save_dir = os.path.join(work_dir,
+                                        f"downloads-{backend}-{concurrency}")
+                downloader = PageSourceDownloader(
+                    save_dir=save_dir, url_list_file=url_list_file,
+                    num_threads=concurrency, backend=backend,
+                    max_in_flight=concurrency,
+                    max_connections_per_host=concurrency)
+                started = time.perf_counter()
+                downloader.begin_execution()
+                seconds = time.perf_counter() - started
+                with os.scandir(save_dir) as entries:
+                    sizes = [entry.stat().st_size for entry in entries]
+                shutil.rmtree(save_dir)
+                results.append(throughput("downloader", len(sizes),
+                                          sum(sizes), seconds,
+                                          backend=backend,
+                                          concurrency=concurrency,
+                                          latency=latency))
+                logger.INFO(f"Downloader {backend} x {concurrency}: "
+                            f"{results[-1]['files_per_sec']} files/sec")
+    return results
+
+
+def compare_results(baseline, current):
+    """
+    Pairs up the measurements of two benchmark results.
+
+    Args:
+        baseline(dict): Earlier benchmark results
+        current(dict): Benchmark results to compare
+
+    Returns: List of (section, measurement key, baseline files/sec, current
+             files/sec, ratio) tuples
+    """
+    def key(measurement):
+        return tuple(sorted((name, value)
+                            for name, value in measurement.items()
+                            if name in ("name", "executor", "workers",
+                                        "backend", "concurrency")))
+
+    rows = []
+    for section in ("stages", "analyzer", "downloader"):
+        earlier = {key(measurement): measurement
+                   for measurement in baseline.get(section, [])}
+        for measurement in current.get(section, []):
+            before = earlier.get(key(measurement))
+            if before is None or not before["files_per_sec"]:
+                continue
+            ratio = measurement["files_per_sec"] / before["files_per_sec"]
+            rows.append((section, dict(key(measurement)),
+                         before["files_per_sec"],
+                         measurement["files_per_sec"], round(ratio, 3)))
+    return rows
+
+
+def git_revision():
+    """
+    Returns: Commit hash of the checked out version or None
+    """
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL,
+            cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_list(value, item_type=str):
+    return [item_type(item) for item in value.split(",") if item]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="A script to benchmark the analyzer and the downloader")
+    parser.add_argument("-p", "--corpus_path",
+                        help="relative (to the cwd) path of the corpus to "
+                             "benchmark the analyzer on. Default: a synthetic "
+                             "corpus generated for the run",
+                        type=str, default=None)
+    parser.add_argument("-w", "--word_bank_file_path",
+                        help="relative (to the cwd) file path for word bank. "
+                             "Default: the word bank of the synthetic corpus, "
+                             f"or {constants.RELATIVE_WORD_BANK_FILE_PATH} "
+                             "with --corpus_path",
+                        type=str, default=None)
+    parser.add_argument("-n", "--num_files",
+                        help="No.of pages of the synthetic corpus. "
+                             "Default: 2000",
+                        type=int, default=2000)
+    parser.add_argument("--workers",
+                        help="Comma separated worker counts of the analyzer. "
+                             f"Default: 1,2,4,{os.cpu_count()},"
+                             f"{constants.MAX_THREADS}",
+                        type=str,
+                        default=f"1,2,4,{os.cpu_count()},{constants.MAX_THREADS}")
+    parser.add_argument("--executors",
+                        help="Comma separated executors of the analyzer. "
+                             "Default: thread,process",
+                        type=str, default="thread,process")
+    parser.add_argument("--num_urls",
+                        help="No.of urls downloaded per downloader "
+                             "measurement. 0 skips the downloader. "
+                             "Default: 1000",
+                        type=int, default=1000)
+    parser.add_argument("--backends",
+                        help="Comma separated download backends. "
+                             "Default: thread,async",
+                        type=str, default="thread,async")
+    parser.add_argument("--concurrency",
+                        help="Comma separated download thread counts (max "
+                             "in-flight requests with the async backend). "
+                             f"Default: 10,{constants.MAX_THREADS},100",
+                        type=str, default=f"10,{constants.MAX_THREADS},100")
+    parser.add_argument("-l", "--latency",
+                        help="Seconds the stub server delays each response "
+                             "by. Default: 0.05",
+                        type=float, default=0.05)
+    parser.add_argument("-o", "--output_file",
+                        help="relative (to the cwd) file path of the JSON "
+                             "results. Default: benchmark_results.json",
+                        type=str, default="benchmark_results.json")
+    parser.add_argument("-b", "--baseline",
+                        help="relative (to the cwd) file path of the JSON "
+                             "results of an earlier run to compare with",
+                        type=str, default=None)
+    parser.add_argument("--log_level",
+                        help="Log level of the benchmarked code. The per-file "
+                             "logs are left out by default so that they don't "
+                             "dominate the measurements. Default: ERROR",
+                        choices=["DEBUG", "INFO", "ERROR"], default="ERROR")
+
+    parsed_args = parser.parse_args()
+    logger.setup_logging(log_level=parsed_args.log_level)
+    work_dir = tempfile.mkdtemp(prefix="word_processor_benchmark_")
+    try:
+        corpus_path = parsed_args.corpus_path
+        word_bank_file_path = parsed_args.word_bank_file_path
+        if corpus_path is None:
+            corpus_path = os.path.join(work_dir, "corpus")
+            if word_bank_file_path is None:
+                word_bank_file_path = os.path.join(work_dir, "word_bank.txt")
+            generate_corpus(corpus_path, parsed_args.num_files,
+                            word_bank_file_path=word_bank_file_path)
+        elif word_bank_file_path is None:
+            word_bank_file_path = constants.RELATIVE_WORD_BANK_FILE_PATH
+        corpus_path = os.path.join(os.getcwd(), corpus_path)
+        word_bank_file_path = os.path.join(os.getcwd(), word_bank_file_path)
+
+        results = {
+            "revision": git_revision(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+            "config": vars(parsed_args),
+        }
+        results["stages"] = benchmark_stages(
+            corpus_path, WordBank.from_text_file(word_bank_file_path))
+        results["analyzer"] = benchmark_analyzer(
+            corpus_path, word_bank_file_path,
+            parse_list(parsed_args.executors),
+            parse_list(parsed_args.workers, int))
+        results["downloader"] = []
+        if parsed_args.num_urls:
+            results["downloader"] = benchmark_downloader(
+                work_dir, parsed_args.num_urls,
+                parse_list(parsed_args.backends),
+                parse_list(parsed_args.concurrency, int),
+                parsed_args.latency)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    with open(parsed_args.output_file, "w") as file:
+        json.dump(results, file, indent=2)
+    print(f"Results are written to {parsed_args.output_file}")
+    for section in ("stages", "analyzer", "downloader"):
+        for measurement in results[section]:
+            print(json.dumps(measurement))
+
+    if parsed_args.baseline:
+        with open(parsed_args.baseline, "r") as file:
+            baseline = json.load(file)
+        print(f"Compared to {parsed_args.baseline} "
+              f"(revision {baseline.get('revision')}):")
+        for section, key, before, after, ratio in compare_results(
+                baseline, results):
+            print(f"{section} {json.dumps(key)}: {before} -> {after} "
+                  f"files/sec ({ratio}x)")
@@ -0,0 +1,181 @@
+"""
+A script to benchmark the startup time of the command line entry points:
+the time it takes to import each script and to print the help of each
+wordprocessor subcommand, in a fresh interpreter every time. The slowest
+imports of each script are listed from python -X importtime. The results
+are written to a JSON file that can be compared against the results of
+another version with --baseline.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks.run_benchmarks import git_revision, parse_list
+from scripts.wordprocessor import SUBCOMMANDS
+
+# The repo root, which has to be on the path of the interpreters started
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORDPROCESSOR_PATH = os.path.join(ROOT_DIR, "scripts", "wordprocessor.py")
+
+
+def time_command(command, repeat):
+    """
+    Args:
+        command(list): Command to run
+        repeat(int): No.of runs
+
+    Returns: Median no.of seconds a run takes
+    """
+    env = dict(os.environ, PYTHONPATH=ROOT_DIR)
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        subprocess.run(command, env=env, cwd=ROOT_DIR, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        durations.append(time.perf_counter() - started)
+    return statistics.median(durations)
+
+
+def slowest_imports(module, count):
+    """
+    Args:
+        module(str): Module to import
+        count(int): No.of imports needed
+
+    Returns: List of (imported module, cumulative microseconds) pairs of the
+             slowest top level imports of the module
+    """
+    env = dict(os.environ, PYTHONPATH=ROOT_DIR)
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=env, cwd=ROOT_DIR, check=True, stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE).stderr.decode()
+    imports = []
+    # Lines are "import time: self [us] | cumulative | imported package"
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        # Nested imports are indented. Only the imports done by the module
+        # itself (one level deep) are kept.
+        if len(name) - len(name.lstrip()) <= 3:
+            imports.append((name.strip(), int(cumulative)))
+    imports.sort(key=lambda item: -item[1])
+    return imports[:count]
+
+
+def benchmark_startup(commands, repeat, num_slowest_imports=5):
+    """
+    Measures the startup of each subcommand.
+
+    Args:
+        commands(list): wordprocessor subcommands
+        repeat(int): No.of runs per measurement
+        num_slowest_imports(int): No.of slowest imports listed per
+                                  subcommand. Default: 5
+
+    Returns: List of measurements
+    """
+    results = [{
+        "name": "help",
+        "command": None,
+        "seconds": round(time_command(
+            [sys.executable, WORDPROCESSOR_PATH, "--help"], repeat), 6),
+    }]
+    baseline = time_command([sys.executable, "-c", "pass"], repeat)
+    results.append({"name": "interpreter", "command": None,
+                    "seconds": round(baseline, 6)})
+    for command in commands:
+        module = SUBCOMMANDS[command][0]
+        results.append({
+            "name": "import",
+            "command": command,
+            "seconds": round(time_command(
+                [sys.executable, "-c", f"import {module}"], repeat), 6),
+            "slowest_imports": slowest_imports(module, num_slowest_imports),
+        })
+        results.append({
+            "name": "help",
+            "command": command,
+            "seconds": round(time_command(
+                [sys.executable, WORDPROCESSOR_PATH, command, "--help"],
+                repeat), 6),
+        })
+    return results
+
+
+def compare_results(baseline, current):
+    """
+    Pairs up the measurements of two benchmark results.
+
+    Args:
+        baseline(dict): Earlier benchmark results
+        current(dict): Benchmark results to compare
+
+    Returns: List of (name, command, baseline seconds, current seconds,
+             speedup) tuples
+    """
+    earlier = {(measurement["name"], measurement["command"]): measurement
+               for measurement in baseline.get("startup", [])}
+    rows = []
+    for measurement in current.get("startup", []):
+        before = earlier.get((measurement["name"], measurement["command"]))
+        if before is None or not measurement["seconds"]:
+            continue
+        rows.append((measurement["name"], measurement["command"],
+                     before["seconds"], measurement["seconds"],
+                     round(before["seconds"] / measurement["seconds"], 3)))
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="A script to benchmark the startup of the command line "
+                    "entry points")
+    parser.add_argument("--commands",
+                        help="Comma separated wordprocessor subcommands. "
+                             f"Default: {','.join(SUBCOMMANDS)}",
+                        type=str, default=",".join(SUBCOMMANDS))
+    parser.add_argument("-r", "--repeat",
+                        help="No.of runs per measurement. Default: 10",
+                        type=int, default=10)
+    parser.add_argument("-o", "--output_file",
+                        help="relative (to the cwd) file path of the JSON "
+                             "results. Default: startup_results.json",
+                        type=str, default="startup_results.json")
+    parser.add_argument("-b", "--baseline",
+                        help="relative (to the cwd) file path of the JSON "
+                             "results of an earlier run to compare with",
+                        type=str, default=None)
+
+    parsed_args = parser.parse_args()
+    results = {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "config": vars(parsed_args),
+        "startup": benchmark_startup(parse_list(parsed_args.commands),
+                                     parsed_args.repeat),
+    }
+    with open(parsed_args.output_file, "w") as file:
+        json.dump(results, file, indent=2)
+    print(f"Results are written to {parsed_args.output_file}")
+    for measurement in results["startup"]:
+        print(json.dumps(measurement))
+
+    if parsed_args.baseline:
+        with open(parsed_args.baseline, "r") as file:
+            baseline = json.load(file)
+        print(f"Compared to {parsed_args.baseline} "
+              f"(revision {baseline.get('revision')}):")
+        for name, command, before, after, speedup in compare_results(
+                baseline, results):
+            print(f"{name} {command}: {before} -> {after} seconds "
+                  f"({speedup}x)")
@@ -0,0 +1,147 @@
+"""
+A local stub HTTP server that serves synthetic pages, so that the download
+throughput can be measured offline.
+"""
+import argparse
+import http.server
+import threading
+import time
+import zlib
+
+import lib.logger as logger
+from benchmarks.generate_corpus import SyntheticPageGenerator
+
+
+class _StubRequestHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        if server.latency:
+            time.sleep(server.latency)
+        # The same path always gets the same response
+        key = zlib.crc32(self.path.encode("utf-8"))
+        if key % 10000 < server.not_found_ratio * 10000:
+            status_code, body = 404, b""
+        else:
+            status_code = 200
+            body = server.pages[key % len(server.pages)]
+        # Pages never change, so the ETag of a page is its index and a
+        # conditional request for a page always gets a 304
+        etag = f'"{key % len(server.pages)}"'
+        if status_code == 200 and \
+                self.headers.get("If-None-Match") == etag:
+            status_code, body = 304, b""
+        self.send_response(status_code)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        if status_code != 404:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Access logs would only slow down the server
+        pass
+
+
+class _StubHTTPServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+    # The downloader opens hundreds of connections at once
+    request_queue_size = 1024
+
+
+class StubServer(object):
+    """Serves synthetic pages on localhost from a background thread.
+
+    Every path gets one of a fixed set of pre-generated pages, or a 404 for
+    the given share of the paths. Can be used as a context manager.
+    """
+
+    def __init__(self, port=0, num_pages=100, latency=0.0,
+                 not_found_ratio=0.0, **kwargs):
+        """
+        Constructor
+
+        Args:
+            port(int): Port to listen on. Default: 0 (any free port)
+            num_pages(int): No.of distinct pages served. Default: 100
+            latency(float): Seconds each response is delayed by, to mimic a
+                            remote server. Default: 0
+            not_found_ratio(float): Share of the paths that get a 404.
+                                    Default: 0
+            kwargs(dict): Arguments for SyntheticPageGenerator
+        """
+        generator = SyntheticPageGenerator(**kwargs)
+        self.server = _StubHTTPServer(("127.0.0.1", port), _StubRequestHandler)
+        self.server.pages = [generator.page(index)[1].encode("utf-8")
+                             for index in range(num_pages)]
+        self.server.latency = latency
+        self.server.not_found_ratio = not_found_ratio
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def urls(self, count):
+        """
+        Args:
+            count(int): No.of urls
+
+        Returns: List of distinct urls served by the server
+        """
+        return [f"{self.base_url}/articles/2019/page-{index}"
+                for index in range(count)]
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="A stub HTTP server that serves synthetic pages")
+    parser.add_argument("-P", "--port", help="Port. Default: 8000",
+                        type=int, default=8000)
+    parser.add_argument("-l", "--latency",
+                        help="Seconds each response is delayed by. "
+                             "Default: 0",
+                        type=float, default=0.0)
+    parser.add_argument("--not_found_ratio",
+                        help="Share of the urls that get a 404. Default: 0",
+                        type=float, default=0.0)
+    parser.add_argument("-f", "--url_list_file",
+                        help="When given, a url list with --num_urls urls "
+                             "served by the server is written to this file",
+                        type=str, default=None)
+    parser.add_argument("--num_urls",
+                        help="No.of urls in the url list. Default: 1000",
+                        type=int, default=1000)
+
+    parsed_args = parser.parse_args()
+    stub_server = StubServer(port=parsed_args.port,
+                             latency=parsed_args.latency,
+                             not_found_ratio=parsed_args.not_found_ratio)
+    if parsed_args.url_list_file:
+        with open(parsed_args.url_list_file, "w") as file:
+            file.write("\n".join(stub_server.urls(parsed_args.num_urls)))
+    logger.INFO(f"Serving on {stub_server.base_url}")
+    try:
+        stub_server.server.serve_forever()
+    except KeyboardInterrupt:
+        stub_server.server.server_close()
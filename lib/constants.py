@@ -1,8 +1,46 @@
 """Constants file"""
 
 MAX_RETRIES_TO_GET_URL_CONTENT = 5
+# Max no.of attempts for a url whose requests keep getting throttled
+MAX_RATE_LIMITED_RETRIES = 20
+# Seconds after which a request that got no response is failed and retried
+REQUEST_TIMEOUT = 60
 RELATIVE_WORD_BANK_FILE_PATH = 'data/word_bank.txt'
 RELATIVE_HTML_DIR_PATH = 'data/downloaded_files'
 RELATIVE_URL_LIST_FILE_PATH = 'data/endg-urls'
+RELATIVE_PACKED_CORPUS_FILE_PATH = 'data/corpus.seg'
+RELATIVE_DOWNLOAD_MANIFEST_FILE_PATH = 'data/download_manifest.sqlite'
+RELATIVE_COUNT_CACHE_FILE_PATH = 'data/word_count_cache.pickle'
+RELATIVE_TEXT_CACHE_DIR_PATH = 'data/text_cache'
+RELATIVE_SERVICE_SNAPSHOT_FILE_PATH = 'data/analyzer_service.pickle'
+RELATIVE_PARTIAL_COUNTS_DIR_PATH = 'data/partial_counts'
+RELATIVE_FINGERPRINT_INDEX_FILE_PATH = 'data/fingerprints.pickle'
+# Suffix of the fingerprint index kept next to a count cache by default
+FINGERPRINT_FILE_SUFFIX = '.fingerprints'
+RELATIVE_DATE_PARTITIONS_FILE_PATH = 'data/date_partitions.sqlite'
 TOP_WORD_COUNT = 10
 MAX_THREADS = 30
+EXECUTOR_THREAD = "thread"
+EXECUTOR_PROCESS = "process"
+# Duplicate pages skipped by the analyzer: exact copies only, or near
+# duplicates as well
+DEDUP_EXACT = "exact"
+DEDUP_NEAR = "near"
+# Max no.of files and file bytes handed over to a worker at a time
+PROCESS_BATCH_SIZE = 100
+MAX_BATCH_BYTES = 8 * 1024 * 1024
+# Bounds of the files handed over to the workers and not processed yet
+BATCHES_IN_FLIGHT_PER_WORKER = 2
+MAX_BYTES_IN_FLIGHT = 256 * 1024 * 1024
+DOWNLOAD_BACKEND_THREAD = "thread"
+DOWNLOAD_BACKEND_ASYNC = "async"
+MAX_IN_FLIGHT_REQUESTS = 1000
+MAX_CONNECTIONS_PER_HOST = 100
+PIPELINE_QUEUE_SIZE = 100
+# Seconds between two progress checkpoints of the downloader
+PROGRESS_INTERVAL = 30
+SERVICE_PORT = 8080
+# Seconds between two scans of the html files dir and two snapshots of the
+# analyzer service
+SERVICE_POLL_INTERVAL = 5
+SERVICE_SNAPSHOT_INTERVAL = 60
@@ -0,0 +1,343 @@
+"""Corpus storage module
+
+A corpus is a set of named HTML documents. It can be stored as
+  1. a directory with one file per document (the downloader's default),
+  2. a zip archive of such a directory, read in place, or
+  3. a packed segment: a single append-only file of zlib compressed records
+     along with an index file of (name, offset, length) entries.
+"""
+
+import mmap
+import os
+import struct
+import threading
+import zipfile
+import zlib
+
+
+NOT_FOUND_PREFIX = "NOT_FOUND_"
+PACKED_SEGMENT_EXTENSION = ".seg"
+PACKED_INDEX_EXTENSION = ".idx"
+
+# Index entry: name length, record offset, record length, flags
+_INDEX_ENTRY = struct.Struct("<HQIB")
+_FLAG_NOT_FOUND = 1
+
+
+class DirectoryCorpus(object):
+    """Corpus stored as one file per document in a directory"""
+
+    def __init__(self, dir_path):
+        """
+        Constructor
+
+        Args:
+            dir_path(str): Directory that contains the html files
+        """
+        self.path = dir_path
+
+    def names(self):
+        """
+        Returns: List of the names of the documents. Not found markers are
+                 excluded.
+        """
+        with os.scandir(self.path) as entries:
+            return [entry.name for entry in entries
+                    if entry.is_file() and
+                    not entry.name.startswith(NOT_FOUND_PREFIX)]
+
+    def iter_entries(self):
+        """
+        Lists the documents lazily, so that the names of a huge directory
+        are never all in memory at once. Whether an entry is a file comes
+        from the directory listing itself, only its size needs a stat.
+
+        Returns: Generator of (name, size in bytes) tuples. Not found
+                 markers are excluded.
+        """
+        with os.scandir(self.path) as entries:
+            for entry in entries:
+                if entry.is_file() and \
+                        not entry.name.startswith(NOT_FOUND_PREFIX):
+                    yield entry.name, entry.stat().st_size
+
+    def signature(self, name):
+        """
+        Args:
+            name(str): Document name
+
+        Returns: Tuple that changes whenever the document is rewritten
+        """
+        stat = os.stat(os.path.join(self.path, name))
+        return stat.st_size, stat.st_mtime_ns
+
+    def read_bytes(self, name):
+        """
+        Args:
+            name(str): Document name
+
+        Returns: Raw content of the document
+        """
+        with open(os.path.join(self.path, name), "rb") as file:
+            return file.read()
+
+    def read(self, name):
+        """
+        Args:
+            name(str): Document name
+
+        Returns: Content of the document
+        """
+        with open(os.path.join(self.path, name), "r", encoding="utf-8") as file:
+            return file.read()
+
+
+class ZipCorpus(object):
+    """Corpus stored in a zip archive of a directory of html files. The
+    archive is read in place without extracting it.
+    """
+
+    def __init__(self, zip_file_path):
+        """
+        Constructor
+
+        Args:
+            zip_file_path(str): Path of the zip archive
+        """
+        self.path = zip_file_path
+        self.zip_file = zipfile.ZipFile(zip_file_path)
+        self.entries = {}
+        for info in self.zip_file.infolist():
+            name = os.path.basename(info.filename)
+            if info.is_dir() or not name or name.startswith(NOT_FOUND_PREFIX) \
+                    or name.startswith("."):
+                continue
+            self.entries[name] = info
+
+    def names(self):
+        return list(self.entries)
+
+    def iter_entries(self):
+        for name, info in self.entries.items():
+            yield name, info.file_size
+
+    def signature(self, name):
+        info = self.entries[name]
+        return info.file_size, info.CRC
+
+    def read_bytes(self, name):
+        return self.zip_file.read(self.entries[name])
+
+    def read(self, name):
+        return self.read_bytes(name).decode("utf-8")
+
+
+class PackedCorpus(object):
+    """Corpus stored as a packed segment file read through mmap"""
+
+    def __init__(self, segment_file_path):
+        """
+        Constructor
+
+        Args:
+            segment_file_path(str): Path of the segment file. The index file
+                                    is expected next to it with the .idx
+                                    extension.
+        """
+        self.path = segment_file_path
+        self.index = read_index(packed_index_path(segment_file_path))
+        self._file = open(segment_file_path, "rb")
+        self._mmap = None
+        if os.fstat(self._file.fileno()).st_size:
+            self._mmap = mmap.mmap(self._file.fileno(), 0,
+                                   access=mmap.ACCESS_READ)
+
+    def names(self):
+        return [name for name, (_, _, flags) in self.index.items()
+                if not flags & _FLAG_NOT_FOUND]
+
+    def iter_entries(self):
+        # Sizes are the compressed sizes of the records
+        for name, (_, length, flags) in self.index.items():
+            if not flags & _FLAG_NOT_FOUND:
+                yield name, length
+
+    def signature(self, name):
+        offset, length, _ = self.index[name]
+        return length, offset
+
+    def read_record(self, name):
+        """
+        Args:
+            name(str): Name of a document of the segment
+
+        Returns: Compressed record of the document, as stored
+        """
+        offset, length, _ = self.index[name]
+        return self._mmap[offset:offset + length]
+
+    def read_bytes(self, name):
+        return zlib.decompress(self.read_record(name))
+
+    def read(self, name):
+        return self.read_bytes(name).decode("utf-8")
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+        self._file.close()
+
+
+class PackedCorpusWriter(object):
+    """Appends documents to a packed segment file and its index. Safe to be
+    used from multiple threads.
+    """
+
+    def __init__(self, segment_file_path, compression_level=6):
+        """
+        Constructor
+
+        Args:
+            segment_file_path(str): Path of the segment file. The index file
+                                    is written next to it with the .idx
+                                    extension.
+            compression_level(int): zlib compression level. Default: 6
+        """
+        self.path = segment_file_path
+        self.compression_level = compression_level
+        index_path = packed_index_path(segment_file_path)
+        segment_dir = os.path.dirname(segment_file_path)
+        if segment_dir:
+            os.makedirs(segment_dir, exist_ok=True)
+        self.index = read_index(index_path)
+        self._segment = open(segment_file_path, "ab")
+        self._index = open(index_path, "ab")
+        # Reads back the documents added so far
+        self._reader = open(segment_file_path, "rb")
+        self._lock = threading.Lock()
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def is_not_found(self, name):
+        """
+        Args:
+            name(str): Name of a document of the segment
+
+        Returns: Whether the document is a not found marker
+        """
+        return bool(self.index[name][2] & _FLAG_NOT_FOUND)
+
+    def add(self, name, content, not_found=False, compressed=False):
+        """
+        Appends a document. A document added again with the same name
+        replaces the earlier one.
+
+        Args:
+            name(str): Document name
+            content(str or bytes): Content of the document
+            not_found(bool): Whether the document is a not found marker
+                             without content. Default: False
+            compressed(bool): Whether the content is a record read from
+                              another segment (see PackedCorpus.read_record),
+                              which is copied without compressing it again.
+                              Default: False
+        """
+        if isinstance(content, str):
+            content = content.encode("utf-8")
+        if not_found:
+            record = b""
+        elif compressed:
+            record = bytes(content)
+        else:
+            record = zlib.compress(content, self.compression_level)
+        flags = _FLAG_NOT_FOUND if not_found else 0
+        encoded_name = name.encode("utf-8")
+        with self._lock:
+            offset = self._segment.tell()
+            self._segment.write(record)
+            # The record must be on disk before the index entry that points
+            # to it, so that a crash never leaves a dangling index entry.
+            self._segment.flush()
+            self._index.write(_INDEX_ENTRY.pack(
+                len(encoded_name), offset, len(record), flags) + encoded_name)
+            self._index.flush()
+            self.index[name] = (offset, len(record), flags)
+
+    def read_bytes(self, name):
+        offset, length, _ = self.index[name]
+        return zlib.decompress(os.pread(self._reader.fileno(), length,
+                                        offset))
+
+    def read(self, name):
+        return self.read_bytes(name).decode("utf-8")
+
+    def close(self):
+        with self._lock:
+            self._segment.close()
+            self._index.close()
+            self._reader.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def packed_index_path(segment_file_path):
+    """
+    Args:
+        segment_file_path(str): Path of the segment file
+
+    Returns: Path of the index file of the segment
+    """
+    return os.path.splitext(segment_file_path)[0] + PACKED_INDEX_EXTENSION
+
+
+def read_index(index_file_path):
+    """
+    Reads the index file of a packed segment.
+
+    Args:
+        index_file_path(str): Path of the index file
+
+    Returns: Dict of name to (offset, length, flags). A truncated trailing
+             entry (from an interrupted write) is ignored.
+    """
+    index = {}
+    if not os.path.isfile(index_file_path):
+        return index
+    with open(index_file_path, "rb") as file:
+        data = file.read()
+    position = 0
+    entry_size = _INDEX_ENTRY.size
+    while position + entry_size <= len(data):
+        name_length, offset, length, flags = _INDEX_ENTRY.unpack_from(
+            data, position)
+        position += entry_size
+        if position + name_length > len(data):
+            break
+        name = data[position:position + name_length].decode("utf-8")
+        position += name_length
+        index[name] = (offset, length, flags)
+    return index
+
+
+def open_corpus(path):
+    """
+    Opens the corpus stored at the path, detecting how it is stored.
+
+    Args:
+        path(str): Directory, zip archive or packed segment file path
+
+    Returns: DirectoryCorpus, ZipCorpus or PackedCorpus object
+    """
+    if os.path.isdir(path):
+        return DirectoryCorpus(path)
+    if os.path.isfile(packed_index_path(path)):
+        return PackedCorpus(path)
+    if zipfile.is_zipfile(path):
+        return ZipCorpus(path)
+    raise ValueError(f"{path} is neither a directory, a zip archive nor a "
+                     "packed corpus segment")
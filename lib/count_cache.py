@@ -0,0 +1,188 @@
+"""Persistent per-file word count cache module"""
+
+import hashlib
+import os
+import pickle
+from array import array
+from collections import Counter
+
+
+# Bump this whenever the layout of the cache file changes
+CACHE_FORMAT_VERSION = 2
+
+
+def file_digest(content):
+    """
+    Computes the content hash used to identify a file's content.
+
+    Args:
+        content(bytes): File content
+
+    Returns: Hex digest of the content
+    """
+    return hashlib.sha1(content).hexdigest()
+
+
+class CacheEntry(object):
+    """Cached word counts of a single file"""
+
+    __slots__ = ("signature", "digest", "word_ids", "counts")
+
+    def __init__(self, signature, digest, word_ids, counts):
+        # Changes whenever the file is rewritten, eg: (size, mtime)
+        self.signature = signature
+        self.digest = digest
+        # Parallel arrays of word ids (into the cache vocabulary) and counts
+        self.word_ids = word_ids
+        self.counts = counts
+
+
+class FileCountCache(object):
+    """On-disk cache of per-file word counts keyed by file name, file
+    signature (size/mtime) and content hash, plus the aggregate of all of
+    them.
+
+    A rerun only needs to parse the files that are new or whose content
+    changed. The counts of deleted files are subtracted from the aggregate.
+    """
+
+    def __init__(self, cache_file_path, settings_key=""):
+        """
+        Constructor
+
+        Args:
+            cache_file_path(str): Path of the cache file
+            settings_key(str): Identifies the settings (word bank, validation
+                               rules, extraction logic) the counts were
+                               computed with. A cache built with different
+                               settings is discarded.
+        """
+        self.cache_file_path = cache_file_path
+        self.settings_key = settings_key
+        self.entries = {}
+        self.vocabulary = []
+        self.word_ids = {}
+        self.aggregate = Counter()
+        self.load()
+
+    def load(self):
+        """
+        Loads the cache file if it exists and is compatible with the current
+        settings.
+        """
+        if not os.path.isfile(self.cache_file_path):
+            return
+        with open(self.cache_file_path, "rb") as file:
+            data = pickle.load(file)
+        if data.get("version") != CACHE_FORMAT_VERSION or \
+                data.get("settings_key") != self.settings_key:
+            return
+        self.entries = data["entries"]
+        self.vocabulary = data["vocabulary"]
+        self.word_ids = {word: word_id for word_id, word
+                         in enumerate(self.vocabulary)}
+        self.aggregate = data["aggregate"]
+
+    def save(self):
+        """
+        Atomically writes the cache to disk.
+        """
+        data = {
+            "version": CACHE_FORMAT_VERSION,
+            "settings_key": self.settings_key,
+            "entries": self.entries,
+            "vocabulary": self.vocabulary,
+            "aggregate": self.aggregate,
+        }
+        cache_dir = os.path.dirname(self.cache_file_path)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{self.cache_file_path}.tmp"
+        with open(tmp_path, "wb") as file:
+            pickle.dump(data, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.cache_file_path)
+
+    def refresh(self, corpus, file_names):
+        """
+        Compares the cache against the current files. Counts of files that
+        no longer exist are subtracted from the aggregate. Files whose
+        signature changed but whose content hash did not are kept.
+
+        Args:
+            corpus(object): Corpus that contains the files (see lib.corpus)
+            file_names(list): Names of the files that should be counted
+
+        Returns: List of (file_name, signature, digest) tuples for the files
+                 that need to be (re)processed
+        """
+        pending = []
+        current = set(file_names)
+        for file_name in list(self.entries):
+            if file_name not in current:
+                self.remove(file_name)
+
+        for file_name in file_names:
+            signature = corpus.signature(file_name)
+            entry = self.entries.get(file_name)
+            if entry is not None and entry.signature == signature:
+                continue
+            digest = file_digest(corpus.read_bytes(file_name))
+            if entry is not None and entry.digest == digest:
+                entry.signature = signature
+                continue
+            pending.append((file_name, signature, digest))
+        return pending
+
+    def remove(self, file_name):
+        """
+        Removes a file from the cache and its counts from the aggregate.
+
+        Args:
+            file_name(str): Name of the file
+        """
+        entry = self.entries.pop(file_name, None)
+        if entry is not None:
+            self.aggregate -= self._entry_counter(entry)
+
+    def update(self, file_name, signature, digest, counter):
+        """
+        Stores the word counts of a file, replacing the older counts of the
+        same file in the aggregate.
+
+        Args:
+            file_name(str): Name of the file
+            signature(tuple): File signature, eg: (size, mtime)
+            digest(str): Content hash of the file
+            counter(Counter): Word counts of the file
+        """
+        self.remove(file_name)
+        word_ids = array("I")
+        counts = array("I")
+        for word, count in counter.items():
+            word_id = self.word_ids.get(word)
+            if word_id is None:
+                word_id = self.word_ids[word] = len(self.vocabulary)
+                self.vocabulary.append(word)
+            word_ids.append(word_id)
+            counts.append(count)
+        self.entries[file_name] = CacheEntry(
+            signature, digest, word_ids, counts)
+        self.aggregate.update(counter)
+
+    def get(self, file_name):
+        """
+        Args:
+            file_name(str): Name of the file
+
+        Returns: Counter of the cached word counts of the file or None if
+                 it is not cached
+        """
+        entry = self.entries.get(file_name)
+        if entry is None:
+            return None
+        return self._entry_counter(entry)
+
+    def _entry_counter(self, entry):
+        vocabulary = self.vocabulary
+        return Counter({vocabulary[word_id]: count for word_id, count
+                        in zip(entry.word_ids, entry.counts)})
@@ -0,0 +1,150 @@
+"""Date-partitioned word counts module
+
+The word counts of the pages are kept per publish day in a SQLite database,
+so that the top words of any date range are answered by adding up the
+counts of the days in the range, without reading the pages again. The counts
+table is clustered by (day, word), so a range query only reads the rows of
+its own days.
+
+The publish day of a page is taken from its url, eg:
+https://www.engadget.com/2019/08/24/crime-allegation-in-space/, or from its
+file name when the file is named after the url path. Pages without a date
+are kept under the "undated" partition, which no date range includes.
+"""
+
+import datetime
+import os
+import re
+import sqlite3
+
+
+UNDATED = "undated"
+# /YYYY/MM/DD/ (url path) or -YYYY-MM-DD- (file name of a url path)
+_DATE_PATTERN = re.compile(r"(?:^|[/-])(\d{4})[/-](\d{2})[/-](\d{2})(?=[/-]|$)")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS partitions (
+    day TEXT PRIMARY KEY,
+    num_files INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS counts (
+    day TEXT NOT NULL,
+    word TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (day, word)
+) WITHOUT ROWID;
+"""
+
+
+def parse_date(value):
+    """
+    Parses a YYYY-MM-DD date, eg: for argparse.
+
+    Args:
+        value(str): Date
+
+    Returns: Date in the YYYY-MM-DD format
+    """
+    try:
+        return datetime.date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise ValueError(f"Invalid date {value}, expected YYYY-MM-DD")
+
+
+def date_of(text):
+    """
+    Finds the publish date in a url or a file name.
+
+    Args:
+        text(str): URL or file name
+
+    Returns: Date in the YYYY-MM-DD format or None if there is no valid
+             date in the text
+    """
+    for match in _DATE_PATTERN.finditer(text):
+        try:
+            return datetime.date(*map(int, match.groups())).isoformat()
+        except ValueError:
+            continue
+    return None
+
+
+class DatePartitions(object):
+    """On-disk word counts of the pages per publish day"""
+
+    def __init__(self, partitions_file_path):
+        """
+        Constructor
+
+        Args:
+            partitions_file_path(str): Path of the SQLite database
+        """
+        self.path = partitions_file_path
+        partitions_dir = os.path.dirname(partitions_file_path)
+        if partitions_dir:
+            os.makedirs(partitions_dir, exist_ok=True)
+        self._connection = sqlite3.connect(partitions_file_path)
+        with self._connection:
+            self._connection.executescript(_SCHEMA)
+
+    def replace(self, day_counters, day_files):
+        """
+        Replaces all the partitions with the counts of a run, in a single
+        transaction, so that queries never see a half-written index.
+
+        Args:
+            day_counters(dict): Day -> Counter of words
+            day_files(dict): Day -> no.of files
+        """
+        with self._connection:
+            self._connection.execute("DELETE FROM counts")
+            self._connection.execute("DELETE FROM partitions")
+            self._connection.executemany(
+                "INSERT INTO partitions (day, num_files) VALUES (?, ?)",
+                day_files.items())
+            for day, counter in day_counters.items():
+                self._connection.executemany(
+                    "INSERT INTO counts (day, word, count) VALUES (?, ?, ?)",
+                    ((day, word, count) for word, count in counter.items()))
+        # Rebuilds the table without the space freed by the deletes
+        self._connection.execute("VACUUM")
+
+    def _range_clause(self, start, end):
+        return ("day BETWEEN ? AND ?",
+                (start or "0000-00-00", end or "9999-99-99"))
+
+    def num_files(self, start=None, end=None):
+        """
+        Args:
+            start(str): First day (YYYY-MM-DD) of the range. Default: None
+                        (from the first day)
+            end(str): Last day (YYYY-MM-DD) of the range. Default: None
+                      (up to the last day)
+
+        Returns: No.of files published in the date range
+        """
+        clause, args = self._range_clause(start, end)
+        return self._connection.execute(
+            f"SELECT COALESCE(SUM(num_files), 0) FROM partitions "
+            f"WHERE {clause}", args).fetchone()[0]
+
+    def top_words(self, count, start=None, end=None):
+        """
+        Args:
+            count(int): Count of top no.of words needed
+            start(str): First day (YYYY-MM-DD) of the range. Default: None
+                        (from the first day)
+            end(str): Last day (YYYY-MM-DD) of the range. Default: None
+                      (up to the last day)
+
+        Returns: List of top (word, no_of_occurences) pairs of the files
+                 published in the date range
+        """
+        clause, args = self._range_clause(start, end)
+        return [list(row) for row in self._connection.execute(
+            f"SELECT word, SUM(count) AS total FROM counts WHERE {clause} "
+            f"GROUP BY word ORDER BY total DESC, word LIMIT ?",
+            args + (count,))]
+
+    def close(self):
+        self._connection.close()
@@ -0,0 +1,279 @@
+"""Article content extraction module"""
+
+import re
+import threading
+import time
+
+from lib.count_cache import file_digest
+
+
+# Bump this whenever a change to the strategies can change the extracted text
+EXTRACTOR_VERSION = 1
+
+# Elements whose text is not displayed
+INVISIBLE_TAGS = frozenset(["script", "style", "template"])
+
+
+class ElementStrategy(object):
+    """Takes the text of the only element with the given tag and class"""
+
+    def __init__(self, name, tag, class_name):
+        """
+        Constructor
+
+        Args:
+            name(str): Strategy name used in the stats
+            tag(str): Element tag
+            class_name(str): Exact value of the element's class attribute
+        """
+        self.name = name
+        self.tag = tag
+        self.class_name = class_name
+
+
+class RegexStrategy(object):
+    """Takes the first group of a regex match over the visible text"""
+
+    def __init__(self, name, pattern):
+        """
+        Constructor
+
+        Args:
+            name(str): Strategy name used in the stats
+            pattern(re.Pattern): Compiled regex with one group
+        """
+        self.name = name
+        self.pattern = pattern
+
+
+# Different HTML pages follow different structure but they typically
+# fall under one of the below expected structures. Whenever a new structure
+# is encountered, here is where the strategies should be updated. They are
+# tried in this order.
+DEFAULT_STRATEGIES = [
+    ElementStrategy("caas-content-wrapper", "div", "caas-content-wrapper"),
+    ElementStrategy("section-articles", "section", "articles"),
+    ElementStrategy("main-w100", "main", "W(100%)"),
+    RegexStrategy("read-full-article",
+                  re.compile(r'Read full article(.+)Latest Stories')),
+    RegexStrategy("see-all-articles",
+                  re.compile(r'See all articles(.+)View All Comments', re.S)),
+]
+
+# Stats entries that are not strategies
+TEXT_CACHE_STAT = "text-cache"
+PARSE_STAT = "parse"
+SCAN_STAT = "element-scan"
+VISIBLE_TEXT_STAT = "visible-text"
+FALLBACK_STAT = "fallback"
+
+
+def visible_text(tree):
+    """
+    Joins the displayable text of the tree, skipping comments and the
+    contents of script, style and template elements.
+
+    Args:
+        tree(lxml.html.HtmlElement): Parsed HTML
+
+    Returns: Text
+    """
+    parts = []
+    # Holds elements still to be visited and tail texts still to be added,
+    # so that every tail is added right after the subtree of its element
+    stack = [tree]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str):
+            parts.append(item)
+            continue
+        if item.text and isinstance(item.tag, str) and \
+                item.tag not in INVISIBLE_TAGS:
+            parts.append(item.text)
+        for child in reversed(item):
+            if child.tail:
+                stack.append(child.tail)
+            stack.append(child)
+    return "".join(parts)
+
+
+class ContentExtractor(object):
+    """Extracts the article text of a page with a single parse.
+
+    All the element strategies are matched in a single pass over the tree
+    that only yields the elements of their tags. An XPath union would still
+    scan the tree once per strategy. If none of them matches, the regex
+    strategies run over the visible text taken from the same tree. The hit
+    count and the time spent are recorded per strategy.
+    """
+
+    def __init__(self, strategies=None, text_cache=None):
+        """
+        Constructor
+
+        Args:
+            strategies(list): ElementStrategy and RegexStrategy objects in the
+                              order they should be tried.
+                              Default: DEFAULT_STRATEGIES
+            text_cache(lib.text_cache.ExtractedTextCache): When given, the
+                              extracted texts are stored in it and pages
+                              extracted earlier are served from it without
+                              being parsed. Default: None
+        """
+        if strategies is None:
+            strategies = DEFAULT_STRATEGIES
+        self.element_strategies = [strategy for strategy in strategies
+                                   if isinstance(strategy, ElementStrategy)]
+        self.regex_strategies = [strategy for strategy in strategies
+                                 if isinstance(strategy, RegexStrategy)]
+        # Tags and (tag, class) pairs matched by the element strategies
+        self._scan_tags = list(dict.fromkeys(
+            strategy.tag for strategy in self.element_strategies))
+        self._scan_keys = {(strategy.tag, strategy.class_name)
+                           for strategy in self.element_strategies}
+        # Loaded on the first page that has to be parsed, so that lxml is
+        # never loaded by runs served from the text cache
+        self._parse = None
+        self.text_cache = text_cache
+        self._lock = threading.Lock()
+        self.stats = {}
+        self.reset_stats()
+
+    def reset_stats(self):
+        """
+        Clears the stats.
+        """
+        names = [TEXT_CACHE_STAT, PARSE_STAT, SCAN_STAT] + \
+            [strategy.name for strategy in self.element_strategies] + \
+            [VISIBLE_TEXT_STAT] + \
+            [strategy.name for strategy in self.regex_strategies] + \
+            [FALLBACK_STAT]
+        with self._lock:
+            self.stats = {name: [0, 0.0] for name in names}
+
+    def pop_stats(self):
+        """
+        Returns the stats and clears them.
+
+        Returns: Dict of name to [hits, seconds]
+        """
+        with self._lock:
+            stats = self.stats
+            self.stats = {name: [0, 0.0] for name in stats}
+        return stats
+
+    def merge_stats(self, stats):
+        """
+        Adds stats collected by another extractor, eg: in a worker process.
+
+        Args:
+            stats(dict): Dict of name to [hits, seconds]
+        """
+        with self._lock:
+            for name, (hits, seconds) in stats.items():
+                entry = self.stats.setdefault(name, [0, 0.0])
+                entry[0] += hits
+                entry[1] += seconds
+
+    def _load_parser(self):
+        # lxml quirk to explicitly import subpackage
+        import lxml.html
+
+        with self._lock:
+            if self._parse is None:
+                self._parse = lxml.html.fromstring
+
+    def _record(self, name, hit, started):
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            entry = self.stats[name]
+            entry[0] += hit
+            entry[1] += elapsed
+
+    def extract(self, html_content, digest=None):
+        """
+        Extracts the article text of the page.
+
+        Args:
+            html_content(str or bytes): HTML source of the page. Bytes are
+                                        decoded as utf-8.
+            digest(str): Content hash of the page (see
+                         lib.count_cache.file_digest), used as the text cache
+                         key. Computed from the content when not given.
+                         Default: None
+
+        Returns: Text
+        """
+        if self.text_cache is None:
+            return self._extract(html_content)
+
+        started = time.perf_counter()
+        if digest is None:
+            digest = file_digest(html_content.encode("utf-8")
+                                 if isinstance(html_content, str)
+                                 else html_content)
+        text = self.text_cache.get(digest)
+        self._record(TEXT_CACHE_STAT, 0 if text is None else 1, started)
+        if text is None:
+            text = self._extract(html_content)
+            self.text_cache.put(digest, text)
+        return text
+
+    def _extract(self, html_content):
+        if isinstance(html_content, bytes):
+            html_content = html_content.decode("utf-8")
+        if self._parse is None:
+            self._load_parser()
+        started = time.perf_counter()
+        parsed_html = self._parse(html_content)
+        self._record(PARSE_STAT, 1, started)
+
+        started = time.perf_counter()
+        # (tag, class) -> list of the matching elements
+        matches = {}
+        if self._scan_tags:
+            for element in parsed_html.iter(*self._scan_tags):
+                key = (element.tag, element.get("class"))
+                if key in self._scan_keys:
+                    matches.setdefault(key, []).append(element)
+        self._record(SCAN_STAT, 1, started)
+
+        for strategy in self.element_strategies:
+            elements = matches.get((strategy.tag, strategy.class_name), ())
+            if len(elements) == 1:
+                started = time.perf_counter()
+                text = elements[0].text_content()
+                self._record(strategy.name, 1, started)
+                return text
+
+        started = time.perf_counter()
+        all_text = visible_text(parsed_html)
+        self._record(VISIBLE_TEXT_STAT, 1, started)
+
+        for strategy in self.regex_strategies:
+            started = time.perf_counter()
+            match = strategy.pattern.search(all_text)
+            self._record(strategy.name, 1 if match else 0, started)
+            if match:
+                return match.group(1)
+
+        # A fallback of considering the whole visible text (title + essay +
+        # reviews + extras) can be considered to avoid unnecessary exception.
+        # When processing in 1000s, such fallbacks for a few no.of files will
+        # not skew the result majorly.
+        self._record(FALLBACK_STAT, 1, time.perf_counter())
+        return all_text
+
+    def report(self):
+        """
+        Returns: List of lines describing the hits and time of each strategy
+        """
+        with self._lock:
+            stats = {name: list(entry) for name, entry in self.stats.items()}
+        pages = stats[TEXT_CACHE_STAT][0] + stats[PARSE_STAT][0]
+        lines = []
+        for name, (hits, seconds) in stats.items():
+            share = 100.0 * hits / pages if pages else 0.0
+            lines.append(f"{name}: {hits} hits ({share:.1f}% of {pages} "
+                         f"pages), {seconds:.3f}s")
+        return lines
@@ -0,0 +1,284 @@
+"""Content fingerprint index module
+
+Every file gets two fingerprints: the content hash of its raw bytes (see
+lib.count_cache.file_digest), which finds exact copies before they are
+parsed, and a SimHash of the word shingles of its article text, which finds
+near-identical copies, eg: syndicated pages that only differ in their
+markup, ads or related links.
+
+Two SimHashes are near duplicates when they differ in at most max_distance
+bits. The 64 bits are split into max_distance + 1 bands, so two near
+duplicates always share at least one band exactly, and a new SimHash only
+has to be compared with the SimHashes that share one of its bands.
+
+numpy is used to add up the bits of the shingle hashes when it is installed.
+It is imported on the first SimHash, see lib.tokenizer.load_numpy.
+"""
+
+import hashlib
+import os
+import pickle
+import threading
+
+from lib.count_cache import file_digest
+from lib.tokenizer import load_numpy
+
+
+# Bump this whenever the layout of the index file changes
+FINGERPRINT_FORMAT_VERSION = 1
+SIMHASH_BITS = 64
+# No.of consecutive words hashed together into a SimHash feature
+SHINGLE_SIZE = 3
+# Max no.of differing SimHash bits of near duplicates
+NEAR_DUPLICATE_DISTANCE = 3
+
+
+def _shingle_hashes(words, shingle_size):
+    if len(words) < shingle_size:
+        shingles = [" ".join(words)]
+    else:
+        shingles = (" ".join(words[index:index + shingle_size])
+                    for index in range(len(words) - shingle_size + 1))
+    for shingle in shingles:
+        yield int.from_bytes(hashlib.blake2b(
+            shingle.encode("utf-8"), digest_size=SIMHASH_BITS // 8).digest(),
+            "little")
+
+
+def simhash(words, shingle_size=SHINGLE_SIZE):
+    """
+    Computes the SimHash of a text: each bit is set when it is set in the
+    hashes of most of its word shingles.
+
+    Args:
+        words(list): Words of the text, in order
+        shingle_size(int): No.of words per shingle. Default: 3
+
+    Returns: 64 bit SimHash or None if there are no words
+    """
+    if not words:
+        return None
+    hashes = list(_shingle_hashes(words, shingle_size))
+    numpy = load_numpy()
+    if numpy is not None:
+        bits = numpy.unpackbits(
+            numpy.array(hashes, dtype="<u8").view(numpy.uint8),
+            bitorder="little").reshape(len(hashes), SIMHASH_BITS)
+        majority = bits.sum(axis=0, dtype=numpy.int64) * 2 > len(hashes)
+        return int.from_bytes(
+            numpy.packbits(majority, bitorder="little").tobytes(), "little")
+    value = 0
+    for bit in range(SIMHASH_BITS):
+        mask = 1 << bit
+        if sum(1 for item in hashes if item & mask) * 2 > len(hashes):
+            value |= mask
+    return value
+
+
+def hamming_distance(first, second):
+    """
+    Args:
+        first(int): SimHash
+        second(int): SimHash
+
+    Returns: No.of bits the SimHashes differ in
+    """
+    return bin(first ^ second).count("1")
+
+
+class FingerprintEntry(object):
+    """Fingerprints of a single file"""
+
+    __slots__ = ("signature", "digest", "simhash")
+
+    def __init__(self, signature, digest, simhash=None):
+        # Changes whenever the file is rewritten, eg: (size, mtime)
+        self.signature = signature
+        self.digest = digest
+        self.simhash = simhash
+
+
+class FingerprintIndex(object):
+    """Fingerprints of the files of a corpus, and the first file seen with
+    each content (the canonical copy) in the current run. Safe to be used
+    from multiple threads.
+
+    Only the fingerprints are kept across runs, not which copy is the
+    duplicate of which, so the files are deduplicated again in every run and
+    deleting the canonical copy of some content promotes the next one. Files
+    whose signature didn't change are fingerprinted without reading them.
+    """
+
+    def __init__(self, index_file_path=None, settings_key="",
+                 max_distance=NEAR_DUPLICATE_DISTANCE):
+        """
+        Constructor
+
+        Args:
+            index_file_path(str): Path of the index file. Default: None (the
+                                  fingerprints are kept in memory only)
+            settings_key(str): Identifies the settings (extraction logic,
+                               token rules) the SimHashes depend on. An index
+                               built with different settings is discarded.
+            max_distance(int): Max no.of differing SimHash bits of near
+                               duplicates. Default: 3
+        """
+        self.index_file_path = index_file_path
+        self.settings_key = settings_key
+        self.max_distance = max_distance
+        # Bit offset and mask of each band
+        num_bands = max_distance + 1
+        self.bands = []
+        for band in range(num_bands):
+            start = band * SIMHASH_BITS // num_bands
+            end = (band + 1) * SIMHASH_BITS // num_bands
+            self.bands.append((start, (1 << (end - start)) - 1))
+        self.entries = {}
+        # Content hash -> canonical file name
+        self.canonical_digests = {}
+        # (band, band value) -> canonical (file name, SimHash) pairs
+        self.canonical_simhashes = {}
+        self.canonical_names = set()
+        # Files fingerprinted in this run
+        self.seen = set()
+        self.exact_duplicates = 0
+        self.near_duplicates = 0
+        self.skipped_bytes = 0
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        """
+        Loads the index file if it exists and is compatible with the current
+        settings.
+        """
+        if not self.index_file_path or \
+                not os.path.isfile(self.index_file_path):
+            return
+        with open(self.index_file_path, "rb") as file:
+            data = pickle.load(file)
+        if data.get("version") != FINGERPRINT_FORMAT_VERSION or \
+                data.get("settings_key") != self.settings_key:
+            return
+        self.entries = data["entries"]
+
+    def save(self):
+        """
+        Atomically writes the fingerprints to disk, if an index file path is
+        given.
+        """
+        if not self.index_file_path:
+            return
+        # The fingerprints of the files that no longer exist are dropped
+        data = {
+            "version": FINGERPRINT_FORMAT_VERSION,
+            "settings_key": self.settings_key,
+            "entries": {file_name: self.entries[file_name]
+                        for file_name in self.seen},
+        }
+        index_dir = os.path.dirname(self.index_file_path)
+        if index_dir:
+            os.makedirs(index_dir, exist_ok=True)
+        tmp_path = f"{self.index_file_path}.tmp"
+        with open(tmp_path, "wb") as file:
+            pickle.dump(data, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.index_file_path)
+
+    def fingerprint(self, corpus, file_name):
+        """
+        Returns the fingerprints of a file, reading it only if it is new or
+        its signature changed.
+
+        Args:
+            corpus(object): Corpus that contains the file (see lib.corpus)
+            file_name(str): Name of the file
+
+        Returns: FingerprintEntry
+        """
+        signature = corpus.signature(file_name)
+        self.seen.add(file_name)
+        entry = self.entries.get(file_name)
+        if entry is not None and entry.signature == signature:
+            return entry
+        digest = file_digest(corpus.read_bytes(file_name))
+        if entry is not None and entry.digest == digest:
+            entry.signature = signature
+            return entry
+        entry = FingerprintEntry(signature, digest)
+        with self._lock:
+            self.entries[file_name] = entry
+        return entry
+
+    def claim_digest(self, file_name, size=0):
+        """
+        Makes the file the canonical copy of its content, unless another
+        file with the same content hash was seen first in this run.
+
+        Args:
+            file_name(str): Name of a fingerprinted file
+            size(int): Size of the file in bytes, added to the skipped bytes
+                       if it is a duplicate. Default: 0
+
+        Returns: Name of the canonical copy or None if the file is the
+                 canonical copy itself
+        """
+        digest = self.entries[file_name].digest
+        with self._lock:
+            canonical = self.canonical_digests.setdefault(digest, file_name)
+            if canonical == file_name:
+                return None
+            self.exact_duplicates += 1
+            self.skipped_bytes += size
+            return canonical
+
+    def claim_simhash(self, file_name, simhash_value=None, size=0):
+        """
+        Makes the file a canonical copy of its text, unless a file whose
+        SimHash is within max_distance bits was seen first in this run.
+
+        Args:
+            file_name(str): Name of a fingerprinted file
+            simhash_value(int): SimHash of the text of the file, stored in
+                                its fingerprints. Default: None (the stored
+                                SimHash)
+            size(int): Size of the file in bytes, added to the skipped bytes
+                       if it is a duplicate. 0 for a file that was parsed
+                       to get its SimHash. Default: 0
+
+        Returns: Name of the canonical copy or None if the file is a
+                 canonical copy itself or has no SimHash
+        """
+        entry = self.entries[file_name]
+        if simhash_value is not None:
+            entry.simhash = simhash_value
+        simhash_value = entry.simhash
+        if simhash_value is None:
+            return None
+        band_keys = [(band, (simhash_value >> start) & mask)
+                     for band, (start, mask) in enumerate(self.bands)]
+        with self._lock:
+            if file_name in self.canonical_names:
+                return None
+            for band_key in band_keys:
+                for canonical, value in self.canonical_simhashes.get(
+                        band_key, ()):
+                    if hamming_distance(simhash_value, value) <= \
+                            self.max_distance:
+                        self.near_duplicates += 1
+                        self.skipped_bytes += size
+                        return canonical
+            self.canonical_names.add(file_name)
+            for band_key in band_keys:
+                self.canonical_simhashes.setdefault(band_key, []).append(
+                    (file_name, simhash_value))
+        return None
+
+    def stats(self):
+        """
+        Returns: Dict with the no.of exact and near duplicates skipped in
+                 this run, and the no.of bytes of the ones skipped without
+                 being parsed
+        """
+        return {"exact_duplicates": self.exact_duplicates,
+                "near_duplicates": self.near_duplicates,
+                "skipped_bytes": self.skipped_bytes}
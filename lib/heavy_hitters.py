@@ -0,0 +1,160 @@
+"""Bounded-memory approximate top-K (heavy hitters) module"""
+
+import heapq
+
+
+class SpaceSaving(object):
+    """Space-Saving sketch that tracks the approximate most frequent words of
+    an unbounded stream using a fixed no.of counters.
+
+    Every tracked word has a count and an error. The true no.of occurrences
+    of the word is between (count - error) and count. Any word that occurs
+    more than (total / capacity) times is guaranteed to be tracked.
+    """
+
+    def __init__(self, capacity):
+        """
+        Constructor
+
+        Args:
+            capacity(int): Max no.of words tracked at a time
+        """
+        if capacity < 1:
+            raise ValueError("capacity must be a positive integer")
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self.total = 0
+        # Min-heap of (count, word). Entries are invalidated lazily: an entry
+        # is stale if the word's current count differs from the entry's.
+        self._heap = []
+
+    def __len__(self):
+        return len(self.counts)
+
+    def update(self, counter):
+        """
+        Adds the occurrences of words to the sketch.
+
+        Args:
+            counter(dict): Mapping of word to its no.of occurrences
+        """
+        counts = self.counts
+        errors = self.errors
+        heap = self._heap
+        for word, weight in counter.items():
+            self.total += weight
+            count = counts.get(word)
+            if count is not None:
+                count += weight
+            elif len(counts) < self.capacity:
+                count = weight
+                errors[word] = 0
+            else:
+                # Replace the word with the smallest count. The new word
+                # inherits that count as its error.
+                min_count, min_word = self._pop_min()
+                del counts[min_word]
+                del errors[min_word]
+                count = min_count + weight
+                errors[word] = min_count
+            counts[word] = count
+            heapq.heappush(heap, (count, word))
+        if len(heap) > 4 * self.capacity:
+            self._rebuild_heap()
+
+    def merge(self, other):
+        """
+        Merges another sketch into this one. The merged error bounds still
+        hold for the combined stream.
+
+        Args:
+            other(SpaceSaving): Sketch to be merged
+        """
+        self_min = self.min_count()
+        other_min = other.min_count()
+        counts = {}
+        errors = {}
+        for word in set(self.counts) | set(other.counts):
+            count = 0
+            error = 0
+            for sketch, sketch_min in ((self, self_min), (other, other_min)):
+                if word in sketch.counts:
+                    count += sketch.counts[word]
+                    error += sketch.errors[word]
+                else:
+                    # The word may have occurred up to sketch_min times in
+                    # the stream of the sketch that does not track it.
+                    count += sketch_min
+                    error += sketch_min
+            counts[word] = count
+            errors[word] = error
+        kept = heapq.nlargest(self.capacity, counts, key=counts.get)
+        self.counts = {word: counts[word] for word in kept}
+        self.errors = {word: errors[word] for word in kept}
+        self.total += other.total
+        self._rebuild_heap()
+
+    def min_count(self):
+        """
+        Returns: Upper bound on the no.of occurrences of any word that is not
+                 tracked by the sketch
+        """
+        if len(self.counts) < self.capacity:
+            return 0
+        count, _ = self._peek_min()
+        return count
+
+    def top(self, count):
+        """
+        Returns the approximate top words.
+
+        Args:
+            count(int): Count of top no.of words needed
+
+        Returns:
+            List of top (word, no_of_occurences, max_overestimation) tuples
+        """
+        words = heapq.nlargest(count, self.counts, key=self.counts.get)
+        return [(word, self.counts[word], self.errors[word]) for word in words]
+
+    def to_dict(self):
+        """
+        Returns: JSON serializable state of the sketch
+        """
+        return {
+            "capacity": self.capacity,
+            "total": self.total,
+            "words": list(self.counts),
+            "counts": list(self.counts.values()),
+            "errors": [self.errors[word] for word in self.counts],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Args:
+            data(dict): State returned by to_dict
+
+        Returns: SpaceSaving object
+        """
+        sketch = cls(data["capacity"])
+        sketch.total = data["total"]
+        sketch.counts = dict(zip(data["words"], data["counts"]))
+        sketch.errors = dict(zip(data["words"], data["errors"]))
+        sketch._rebuild_heap()
+        return sketch
+
+    def _peek_min(self):
+        heap = self._heap
+        while heap[0][0] != self.counts.get(heap[0][1]):
+            heapq.heappop(heap)
+        return heap[0]
+
+    def _pop_min(self):
+        self._peek_min()
+        return heapq.heappop(self._heap)
+
+    def _rebuild_heap(self):
+        self._heap = [(count, word) for word, count in self.counts.items()]
+        heapq.heapify(self._heap)
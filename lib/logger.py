@@ -1,32 +1,70 @@
-"""Logging module"""
+"""Logging module
 
+Records are handed over to a background thread through a queue, which writes
+them to the console and the log file, so that the worker threads never wait
+on the console or the disk. The caller's file and line are looked up only for
+records whose level is enabled.
+
+Logging is set up on the first message, unless setup_logging is called
+before, so that importing the module is free and a run that never logs
+doesn't create a log directory.
+
+Messages logged once per item (file, url, ...) pass a sample_key. They are
+rate-limited per key and the no.of suppressed messages is added to the next
+one that gets through. In quiet mode they are dropped altogether.
+"""
+
+import atexit
 import logging
+import logging.handlers
 import os
+import queue
 import sys
-import traceback
+import threading
+import time
 from datetime import datetime
 
 
 NAME = "app"
 
+# Default max no.of messages per second logged for a single sample key
+MAX_SAMPLED_MESSAGES_PER_SECOND = 10
+
+# Background writer of the records and the rate limiter of the current setup
+_listener = None
+_rate_limiter = None
+_quiet = False
+# Arguments of the current setup, see get_settings
+_settings = None
+_setup_lock = threading.Lock()
+
 
 def setup_logging(log_dir=None, log_file="run.log",
-                  log_level="INFO"):
+                  log_level="INFO", quiet=False,
+                  max_sampled_per_second=MAX_SAMPLED_MESSAGES_PER_SECOND):
     """Initializes and configures the loggers that does logging to
     console as well as in the specified file path
 
     Args:
-      log_dir (str): The absolute log directory path. 
+      log_dir (str): The absolute log directory path.
                      Default: Current working dir/logs/<timestamp dir>
       log_file (str): Log file name. Default: run.log
       log_level (str): The minimum log level severity that should be considered
                        for logging.
                        Defaults to 'INFO'
+      quiet (bool): Drops the per-item messages (the ones logged with a
+                    sample_key), eg: for bulk runs. Default: False
+      max_sampled_per_second (int): Max no.of messages per second logged for
+                                    a single sample key. Default: 10
     """
+    global _listener, _rate_limiter, _quiet, _settings
 
     if log_dir is None:
         log_dir = os.path.join(os.getcwd(), "logs",
                                datetime.today().strftime("%Y%m%d_%H%M%S"))
+    _settings = {"log_dir": log_dir, "log_file": log_file,
+                 "log_level": log_level, "quiet": quiet,
+                 "max_sampled_per_second": max_sampled_per_second}
 
     if not os.path.exists(log_dir):
         os.makedirs(log_dir)
@@ -42,7 +80,11 @@ def setup_logging(log_dir=None, log_file="run.log",
     # Create the loggers
     logging.app_logger = logging.getLogger(NAME)
 
-    # Remove all existing handlers
+    # Flush and remove the writer of an earlier setup
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
     logging.app_logger.handlers = []
 
     # Disable the root logger
@@ -54,65 +96,202 @@ def setup_logging(log_dir=None, log_file="run.log",
     # setup console handler
     console_handler = logging.StreamHandler(stream=sys.stdout)
     console_handler.setFormatter(formatter)
-    logging.app_logger.addHandler(console_handler)
 
     # setup file handler
-    __configure_file_handler(abs_log_file_path)
+    file_handler = __configure_file_handler(abs_log_file_path)
+
+    # The handlers are run by the background writer
+    record_queue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(
+        record_queue, console_handler, file_handler)
+    _listener.start()
+    logging.app_logger.addHandler(_QueueHandler(record_queue))
+
+    _rate_limiter = RateLimiter(max_sampled_per_second)
+    _quiet = quiet
 
     # configure logger
     logging.app_logger.setLevel(log_level)
     logging.app_logger.propagate = 0
 
 
+def get_settings():
+    """
+    Returns: Dict of the setup_logging arguments of the current setup, to
+             be handed over to worker processes (see setup_worker_logging),
+             or None if the logging isn't set up yet
+    """
+    return None if _settings is None else dict(_settings)
+
+
+def setup_worker_logging(settings):
+    """Sets up the logging of a worker process the same way as in its parent
+    process. A worker started with the spawn start method imports this
+    module afresh, and would otherwise set up the default logging on its
+    first message. A forked worker already inherits the parent's setup, so
+    nothing is done there.
+
+    Args:
+      settings (dict): Settings of the parent process, see get_settings.
+                       None leaves the default setup.
+    """
+    with _setup_lock:
+        if _listener is None and settings is not None:
+            setup_logging(**settings)
+
+
 def __configure_file_handler(abs_log_file_path):
     formatter = __get_formatter()
     # To store all logs of various severity/log level
     file_handler = logging.FileHandler(abs_log_file_path, 'a')
     file_handler.setFormatter(formatter)
-    logging.app_logger.addHandler(file_handler)
-    sys.stderr = Tee(sys.stderr, file_handler.stream)
+    console_stream = sys.stderr
+    if isinstance(console_stream, Tee):
+        # Don't keep writing to the log file of an earlier setup
+        console_stream = console_stream.stream1
+    sys.stderr = Tee(console_stream, file_handler.stream)
+    return file_handler
 
 
 def __get_formatter():
     formatter = logging.Formatter('%(asctime)s (%(threadName)s) %(levelname)s '
-                                  '[%(file_line)s] : %(message)s')
+                                  '[%(filename)s:%(lineno)d] : %(message)s')
     return formatter
 
 
-def INFO(msg):
+def INFO(msg, sample_key=None):
     """INFO level logging
 
     Args:
         msg(str): Message to be logged
+        sample_key(str): Set for messages logged once per item (file, url,
+                         ...) to rate-limit them. Default: None
     """
-    logging.app_logger.info(msg, extra=__extra())
+    __log(logging.INFO, msg, sample_key)
 
 
-def ERROR(msg):
+def ERROR(msg, sample_key=None):
     """ERROR level logging
 
     Args:
         msg(str): Message to be logged
+        sample_key(str): Set for messages logged once per item (file, url,
+                         ...) to rate-limit them. Default: None
     """
-    logging.app_logger.error(msg, extra=__extra())
+    __log(logging.ERROR, msg, sample_key)
 
 
-def DEBUG(msg):
+def DEBUG(msg, sample_key=None):
     """DEBUG level logging
 
     Args:
         msg(str): Message to be logged
+        sample_key(str): Set for messages logged once per item (file, url,
+                         ...) to rate-limit them. Default: None
+    """
+    __log(logging.DEBUG, msg, sample_key)
+
+
+def __log(level, msg, sample_key):
+    if _listener is None:
+        with _setup_lock:
+            if _listener is None:
+                setup_logging()
+    app_logger = logging.app_logger
+    if not app_logger.isEnabledFor(level):
+        return
+    if sample_key is not None:
+        if _quiet:
+            return
+        allowed, suppressed = _rate_limiter.allow(sample_key)
+        if not allowed:
+            return
+        if suppressed:
+            msg = f"{msg} (+{suppressed} similar messages suppressed)"
+    # The caller of INFO/ERROR/DEBUG. Looked up directly instead of letting
+    # the logger walk and normalize the whole stack.
+    frame = sys._getframe(2)
+    code = frame.f_code
+    app_logger.handle(app_logger.makeRecord(
+        app_logger.name, level, code.co_filename, frame.f_lineno, msg, (),
+        None, code.co_name))
+
+
+class RateLimiter(object):
+    """Lets through at most a given no.of messages per second for each key
+    and counts the ones that were held back.
     """
-    logging.app_logger.debug(msg, extra=__extra())
 
+    def __init__(self, max_per_second):
+        """
+        Constructor
 
-def __extra():
-    frame = traceback.extract_stack()[-3]
-    file_name = frame[0].split("/")[-1]
-    file_line = frame[1]
-    return {
-        'file_line': "%s:%s" % (file_name, file_line)
-    }
+        Args:
+            max_per_second(int): Max no.of messages per second for a key
+        """
+        self.max_per_second = max_per_second
+        # key -> [second, no.of messages let through in it, suppressed]
+        self.windows = {}
+        self._lock = threading.Lock()
+
+    def allow(self, key):
+        """
+        Args:
+            key(str): Sample key of the message
+
+        Returns: (allowed, no.of messages suppressed since the last allowed
+                 one) tuple
+        """
+        second = int(time.monotonic())
+        with self._lock:
+            window = self.windows.get(key)
+            if window is None or window[0] != second:
+                suppressed = window[2] if window is not None else 0
+                self.windows[key] = [second, 1, 0]
+                return True, suppressed
+            if window[1] < self.max_per_second:
+                window[1] += 1
+                suppressed, window[2] = window[2], 0
+                return True, suppressed
+            window[2] += 1
+            return False, 0
+
+    def pop_suppressed(self):
+        """
+        Returns: Dict of key to the no.of messages suppressed since the last
+                 allowed one, for the keys that have any
+        """
+        with self._lock:
+            suppressed = {key: window[2] for key, window
+                          in self.windows.items() if window[2]}
+            for window in self.windows.values():
+                window[2] = 0
+        return suppressed
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # The messages are plain strings without args or exc_info, so the
+        # record can be queued as it is instead of being formatted here
+        return record
+
+
+def _write_directly():
+    # A forked worker process doesn't have the parent's background writer,
+    # so it runs the console and file handlers itself
+    if _listener is not None:
+        logging.app_logger.handlers = list(_listener.handlers)
+
+
+def _stop_listener():
+    # Writes out the queued records. Registered after logging's own exit
+    # handler, so it runs before the handlers are closed.
+    if _rate_limiter is not None:
+        for key, suppressed in _rate_limiter.pop_suppressed().items():
+            logging.app_logger.info(
+                f"{suppressed} more '{key}' messages were suppressed")
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
 
 
 class Tee(object):
@@ -133,12 +312,21 @@ class Tee(object):
           msg(str): Message to be written
         """
         self.stream1.write(msg)
-        self.stream2.write(msg)
+        if not self.stream2.closed:
+            self.stream2.write(msg)
 
     def flush(self):
         """Flush the messages written so far
         """
-        self.stream2.flush()
+        self.stream1.flush()
+        # The log file is closed by logging at exit, before the interpreter
+        # flushes stderr for the last time
+        if not self.stream2.closed:
+            self.stream2.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream1, name)
 
 
-setup_logging()
+os.register_at_fork(after_in_child=_write_directly)
+atexit.register(_stop_listener)
@@ -0,0 +1,205 @@
+"""Download manifest module
+
+The manifest is a SQLite database with the state of every url the downloader
+has seen: the file name its page source is stored under, whether it was
+downloaded or not found, the validators (ETag/Last-Modified) to re-fetch it
+conditionally, and the size and content hash of the stored page.
+
+Urls are looked up in the database as they are needed rather than loaded
+into memory, so that the memory used stays the same however many urls the
+manifest has, and every change is committed as its own transaction, so that
+an interrupted run resumes from where it stopped.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+
+STATUS_PENDING = "pending"
+STATUS_DOWNLOADED = "downloaded"
+STATUS_NOT_FOUND = "not_found"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS urls (
+    url TEXT PRIMARY KEY,
+    file_name TEXT NOT NULL UNIQUE,
+    status TEXT NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    size INTEGER,
+    content_hash TEXT,
+    updated_at REAL
+)
+"""
+_COLUMNS = ("url", "file_name", "status", "etag", "last_modified", "size",
+            "content_hash", "updated_at")
+
+
+class ManifestEntry(object):
+    """State of a single url"""
+
+    __slots__ = _COLUMNS
+
+    def __init__(self, url, file_name, status, etag=None, last_modified=None,
+                 size=None, content_hash=None, updated_at=None):
+        self.url = url
+        # Name the page source is stored under, unique across urls
+        self.file_name = file_name
+        self.status = status
+        # Validators sent back on a refresh to only get the page if it changed
+        self.etag = etag
+        self.last_modified = last_modified
+        self.size = size
+        self.content_hash = content_hash
+        self.updated_at = updated_at
+
+    def values(self):
+        return tuple(getattr(self, column) for column in _COLUMNS)
+
+
+class DownloadManifest(object):
+    """Transactional store of the download state of urls. Safe to be used
+    from multiple threads.
+    """
+
+    def __init__(self, manifest_file_path=None):
+        """
+        Constructor
+
+        Args:
+            manifest_file_path(str): Path of the SQLite database. Default:
+                                     None (the state is kept in memory only)
+        """
+        self.path = manifest_file_path
+        database = ":memory:"
+        if manifest_file_path:
+            manifest_dir = os.path.dirname(manifest_file_path)
+            if manifest_dir:
+                os.makedirs(manifest_dir, exist_ok=True)
+            database = manifest_file_path
+        self._connection = sqlite3.connect(database, check_same_thread=False)
+        # Commits don't wait for the disk, but a crash never leaves a
+        # half-written transaction behind
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        with self._connection:
+            self._connection.execute(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def __contains__(self, url):
+        return self.get(url) is not None
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute(
+                "SELECT COUNT(*) FROM urls").fetchone()[0]
+
+    def get(self, url):
+        """
+        Args:
+            url(str): URL
+
+        Returns: ManifestEntry of the url or None if it wasn't seen yet
+        """
+        with self._lock:
+            return self._get(url)
+
+    def _get(self, url):
+        row = self._connection.execute(
+            f"SELECT {', '.join(_COLUMNS)} FROM urls WHERE url = ?",
+            (url,)).fetchone()
+        return ManifestEntry(*row) if row else None
+
+    def _is_file_name_taken(self, file_name):
+        return self._connection.execute(
+            "SELECT 1 FROM urls WHERE file_name = ?",
+            (file_name,)).fetchone() is not None
+
+    def iter_entries(self):
+        """
+        Returns: Generator of the ManifestEntry of every url, read from the
+                 database in chunks
+        """
+        with self._lock:
+            cursor = self._connection.cursor()
+            cursor.execute(f"SELECT {', '.join(_COLUMNS)} FROM urls")
+        while True:
+            with self._lock:
+                rows = cursor.fetchmany(1000)
+            if not rows:
+                return
+            for row in rows:
+                yield ManifestEntry(*row)
+
+    def assign_file_name(self, url, candidates):
+        """
+        Returns the file name of the url. A url seen for the first time gets
+        the first candidate no other url has, or the first candidate with a
+        numeric suffix if all of them are taken, and is recorded as pending.
+
+        Args:
+            url(str): URL
+            candidates(list): Preferred file names, in order of preference
+
+        Returns: ManifestEntry of the url
+        """
+        with self._lock:
+            entry = self._get(url)
+            if entry is not None:
+                return entry
+            file_name = next((candidate for candidate in candidates
+                              if not self._is_file_name_taken(candidate)),
+                             None)
+            if file_name is None:
+                stem, extension = os.path.splitext(candidates[0])
+                suffix = 2
+                while self._is_file_name_taken(
+                        f"{stem}-{suffix}{extension}"):
+                    suffix += 1
+                file_name = f"{stem}-{suffix}{extension}"
+            entry = ManifestEntry(url, file_name, STATUS_PENDING,
+                                  updated_at=time.time())
+            self._write(entry)
+            return entry
+
+    def record(self, url, status, etag=None, last_modified=None, size=None,
+               content_hash=None):
+        """
+        Records the outcome of a download of the url.
+
+        Args:
+            url(str): URL that has a file name assigned
+            status(str): "downloaded" or "not_found"
+            etag(str): ETag response header. Default: None
+            last_modified(str): Last-Modified response header. Default: None
+            size(int): Size of the stored page in bytes. Default: None
+            content_hash(str): Content hash of the stored page. Default: None
+        """
+        with self._lock:
+            entry = ManifestEntry(url, self._get(url).file_name, status,
+                                  etag, last_modified, size, content_hash,
+                                  time.time())
+            self._write(entry)
+
+    def mark_unchanged(self, url):
+        """
+        Records that a refresh found the page of the url unchanged.
+
+        Args:
+            url(str): URL that has a file name assigned
+        """
+        with self._lock:
+            entry = ManifestEntry(*self._get(url).values()[:-1], time.time())
+            self._write(entry)
+
+    def _write(self, entry):
+        with self._connection:
+            self._connection.execute(
+                f"INSERT OR REPLACE INTO urls ({', '.join(_COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(_COLUMNS))})", entry.values())
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,160 @@
+"""Partial word count artifact module
+
+A sharded run writes the word counts of its shard to a partial count file.
+Any set of partial count files can be merged into the counts of the shards
+they cover, including partial count files that are themselves merged.
+
+The files are gzip compressed JSON so that they can be shared between
+machines and read without trusting the writer (unlike pickles).
+"""
+
+import gzip
+import json
+import os
+from collections import Counter
+
+from lib.heavy_hitters import SpaceSaving
+
+
+# Bump this whenever the layout of the file changes
+PARTIAL_COUNTS_FORMAT_VERSION = 1
+PARTIAL_COUNTS_EXTENSION = ".json.gz"
+
+
+def partial_counts_file_name(shard):
+    """
+    Args:
+        shard(tuple): (index, num_shards) tuple
+
+    Returns: Default file name of the partial counts of the shard
+    """
+    index, num_shards = shard
+    return f"shard-{index}-of-{num_shards}{PARTIAL_COUNTS_EXTENSION}"
+
+
+class PartialCounts(object):
+    """Word counts of a set of shards. The counts are either exact (a
+    Counter) or approximate (a SpaceSaving sketch).
+    """
+
+    def __init__(self, shards, num_shards, settings_key, num_files,
+                 counter=None, sketch=None):
+        """
+        Constructor
+
+        Args:
+            shards(iterable): Indices of the shards covered
+            num_shards(int): Total no.of shards
+            settings_key(str): Identifies the settings the words were
+                               counted with (see
+                               WordFrequencyProcessor.settings_key). Counts
+                               of different settings can't be merged.
+            num_files(int): No.of files counted
+            counter(Counter): Exact word counts. Default: None
+            sketch(lib.heavy_hitters.SpaceSaving): Approximate word counts,
+                                                   when counter isn't given.
+                                                   Default: None
+        """
+        self.shards = frozenset(shards)
+        self.num_shards = num_shards
+        self.settings_key = settings_key
+        self.num_files = num_files
+        self.counter = counter
+        self.sketch = sketch
+        if counter is None and sketch is None:
+            self.counter = Counter()
+
+    def is_exact(self):
+        return self.sketch is None
+
+    def missing_shards(self):
+        """
+        Returns: Sorted list of the indices of the shards not covered
+        """
+        return sorted(set(range(self.num_shards)) - self.shards)
+
+    def merge(self, other):
+        """
+        Adds the counts of other shards.
+
+        Args:
+            other(PartialCounts): Counts of shards not covered yet
+        """
+        if other.num_shards != self.num_shards:
+            raise ValueError(f"Can't merge counts of {other.num_shards} "
+                             f"shards into counts of {self.num_shards} shards")
+        if other.settings_key != self.settings_key:
+            raise ValueError("Can't merge counts computed with different "
+                             "settings")
+        if other.is_exact() != self.is_exact():
+            raise ValueError("Can't merge exact and approximate counts")
+        overlap = self.shards & other.shards
+        if overlap:
+            raise ValueError(f"Shards {sorted(overlap)} are already covered")
+        if self.is_exact():
+            self.counter.update(other.counter)
+        else:
+            self.sketch.merge(other.sketch)
+        self.shards |= other.shards
+        self.num_files += other.num_files
+
+    def get_top_words(self, count):
+        """
+        Args:
+            count(int): Count of top no.of words needed
+
+        Returns: List of top (word, no_of_occurences) pairs, or
+                 (word, no_of_occurences, max_overestimation) tuples for
+                 approximate counts
+        """
+        if self.is_exact():
+            return self.counter.most_common(count)
+        return self.sketch.top(count)
+
+    def save(self, file_path):
+        """
+        Atomically writes the counts to a file.
+
+        Args:
+            file_path(str): Path of the file
+        """
+        data = {
+            "version": PARTIAL_COUNTS_FORMAT_VERSION,
+            "shards": sorted(self.shards),
+            "num_shards": self.num_shards,
+            "settings_key": self.settings_key,
+            "num_files": self.num_files,
+        }
+        if self.is_exact():
+            data["words"] = list(self.counter)
+            data["counts"] = list(self.counter.values())
+        else:
+            data["sketch"] = self.sketch.to_dict()
+        file_dir = os.path.dirname(file_path)
+        if file_dir:
+            os.makedirs(file_dir, exist_ok=True)
+        tmp_path = f"{file_path}.tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as file:
+            json.dump(data, file, separators=(",", ":"))
+        os.replace(tmp_path, file_path)
+
+    @classmethod
+    def load(cls, file_path):
+        """
+        Args:
+            file_path(str): Path of the file
+
+        Returns: PartialCounts object
+        """
+        with gzip.open(file_path, "rt", encoding="utf-8") as file:
+            data = json.load(file)
+        if data.get("version") != PARTIAL_COUNTS_FORMAT_VERSION:
+            raise ValueError(f"{file_path} has an unsupported format version "
+                             f"{data.get('version')}")
+        counter, sketch = None, None
+        if "sketch" in data:
+            sketch = SpaceSaving.from_dict(data["sketch"])
+        else:
+            counter = Counter(dict(zip(data["words"], data["counts"])))
+        return cls(data["shards"], data["num_shards"], data["settings_key"],
+                   data["num_files"], counter=counter, sketch=sketch)
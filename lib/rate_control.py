@@ -0,0 +1,369 @@
+"""Adaptive per-host rate control module
+
+asyncio is imported by the async_* methods only, so that the thread
+backend doesn't pay for it.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+
+def parse_retry_after(value, now=None):
+    """
+    Parses the value of a Retry-After header.
+
+    Args:
+        value(str): Header value. Either delay seconds or an HTTP date
+        now(float): Current epoch time. Default: time.time()
+
+    Returns: Delay in seconds or None if the value can't be parsed
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+    if now is None:
+        now = time.time()
+    return max(0.0, retry_at - now)
+
+
+class HostState(object):
+    """Rate control state of a single host"""
+
+    def __init__(self, limit):
+        self.limit = float(limit)
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self.consecutive_failures = 0
+
+
+class HostRateController(object):
+    """Limits the no.of concurrent requests per host using AIMD.
+
+    Every successful response increases the allowed concurrency of the host
+    additively (by 1 per window of `limit` responses). Every throttled or
+    failed response halves it and blocks the host for the Retry-After delay
+    sent by the server or an exponential backoff, whichever is longer.
+    """
+
+    def __init__(self, max_limit, min_limit=1, initial_limit=None,
+                 base_backoff=1.0, max_backoff=300.0, decrease_factor=0.5):
+        """
+        Constructor
+
+        Args:
+            max_limit(int): Max no.of concurrent requests to a host
+            min_limit(int): Min no.of concurrent requests to a host.
+                            Default: 1
+            initial_limit(int): No.of concurrent requests to a host to start
+                                with. Default: max_limit
+            base_backoff(float): Backoff in seconds after the first failure.
+                                 Default: 1
+            max_backoff(float): Max backoff in seconds. Default: 300
+            decrease_factor(float): Factor the limit is multiplied with on a
+                                    failure. Default: 0.5
+        """
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.initial_limit = initial_limit or max_limit
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.decrease_factor = decrease_factor
+        self.hosts = {}
+        self._lock = threading.Lock()
+        self._condition = threading.Condition(self._lock)
+        # Set on every release to wake up the coroutines waiting in
+        # async_acquire. Only used from the event loop thread.
+        self._async_released = None
+
+    def _host(self, host):
+        state = self.hosts.get(host)
+        if state is None:
+            state = self.hosts[host] = HostState(self.initial_limit)
+        return state
+
+    def try_acquire(self, host, now=None):
+        """
+        Tries to take a request slot of the host without blocking.
+
+        Args:
+            host(str): Host name
+            now(float): Current monotonic time. Default: time.monotonic()
+
+        Returns: 0 if the slot was taken, the no.of seconds the host is
+                 blocked for, or None if all the slots of the host are in use
+        """
+        with self._lock:
+            return self._try_acquire(host, now)
+
+    def _try_acquire(self, host, now=None):
+        if now is None:
+            now = time.monotonic()
+        state = self._host(host)
+        if state.blocked_until > now:
+            return state.blocked_until - now
+        if state.in_flight >= int(state.limit):
+            return None
+        state.in_flight += 1
+        return 0
+
+    def acquire(self, host):
+        """
+        Takes a request slot of the host, blocking until one is available.
+
+        Args:
+            host(str): Host name
+        """
+        with self._condition:
+            while True:
+                wait = self._try_acquire(host)
+                if wait == 0:
+                    return
+                self._condition.wait(timeout=wait)
+
+    async def async_acquire(self, host):
+        """
+        Asyncio counterpart of acquire. Meant to be used from a single event
+        loop thread.
+
+        Args:
+            host(str): Host name
+        """
+        import asyncio
+
+        if self._async_released is None:
+            self._async_released = asyncio.Event()
+        while True:
+            wait = self.try_acquire(host)
+            if wait == 0:
+                return
+            self._async_released.clear()
+            await _wait_for_event(self._async_released, wait)
+
+    def release(self, host, status_code=None, retry_after=None):
+        """
+        Returns the request slot of the host and adjusts the host's limit
+        based on the outcome of the request.
+
+        Args:
+            host(str): Host name
+            status_code(int): Response status code or None if the request
+                              failed without a response
+            retry_after(str): Value of the Retry-After response header.
+                              Default: None
+
+        Returns: No.of seconds to wait before retrying a request to the host
+                 if the request was throttled or failed, else 0
+        """
+        now = time.monotonic()
+        with self._condition:
+            state = self._host(host)
+            state.in_flight -= 1
+            self._condition.notify_all()
+            if self._async_released is not None:
+                self._async_released.set()
+            if status_code is not None and not self.is_throttled(status_code):
+                state.consecutive_failures = 0
+                state.limit = min(self.max_limit,
+                                  state.limit + 1.0 / state.limit)
+                return 0
+
+            server_delay = parse_retry_after(retry_after)
+            if state.blocked_until <= now:
+                # Requests that were already in flight when the host got
+                # blocked fail together, so back off once per block only.
+                state.consecutive_failures += 1
+                state.limit = max(self.min_limit,
+                                  state.limit * self.decrease_factor)
+                state.blocked_until = now + min(
+                    self.max_backoff, self.base_backoff *
+                    2 ** (state.consecutive_failures - 1))
+            if server_delay is not None:
+                state.blocked_until = max(state.blocked_until,
+                                          now + server_delay)
+            return state.blocked_until - now
+
+    @staticmethod
+    def is_throttled(status_code):
+        """
+        Args:
+            status_code(int): Response status code
+
+        Returns: True if the response means that the request should be
+                 retried later at a lower rate. Besides 429 and 5xx, any
+                 other unexpected status code is treated the same way since
+                 that is how the servers we download from respond to bursts.
+        """
+        return status_code not in (200, 304, 404)
+
+
+class RetryingWorkQueue(object):
+    """Work queue that hands out items from an iterator and reschedules
+    failed items after a delay.
+
+    The iterator is consumed lazily, one item per request. Items that are
+    due for a retry are handed out before new items.
+    """
+
+    def __init__(self, items):
+        """
+        Constructor
+
+        Args:
+            items(iterable): Work items
+        """
+        self._items = iter(items)
+        # Serializes the calls to the iterator, which are made outside of the
+        # condition from the worker threads, or from the threads of the
+        # event loop's default executor
+        self._items_lock = threading.Lock()
+        self._exhausted = False
+        self._delayed = []
+        self._sequence = itertools.count()
+        self.in_progress = 0
+        self._condition = threading.Condition()
+        # Set whenever an item is done or rescheduled to wake up the
+        # coroutines waiting in async_get. Only used from the event loop
+        # thread.
+        self._async_changed = None
+
+    def __len__(self):
+        """No.of items waiting for a retry"""
+        return len(self._delayed)
+
+    def poll(self, now=None):
+        """
+        Takes the next item that is due for a retry without blocking. Must
+        be called with the queue's condition held. New items are taken with
+        take_new instead, outside of the condition, since the iterator may
+        block, eg: on I/O.
+
+        Args:
+            now(float): Current monotonic time. Default: time.monotonic()
+
+        Returns: (item, None) if an item is due, else (None, wait) where
+                 wait is the no.of seconds until the next retry is due, or
+                 None if there are no delayed items
+        """
+        if now is None:
+            now = time.monotonic()
+        if self._delayed and self._delayed[0][0] <= now:
+            item = heapq.heappop(self._delayed)[2]
+            self.in_progress += 1
+            return item, None
+        if self._delayed:
+            return None, self._delayed[0][0] - now
+        return None, None
+
+    def get(self):
+        """
+        Takes the next item, blocking until one is due.
+
+        Returns: Item or None once all items are done
+        """
+        while True:
+            with self._condition:
+                item, wait = self.poll()
+                if item is not None:
+                    return item
+                if self._exhausted:
+                    if wait is None and self.in_progress == 0:
+                        return None
+                    self._condition.wait(timeout=wait)
+                    continue
+            item = self.take_new()
+            if item is not None:
+                return item
+
+    def task_done(self):
+        """
+        Marks an item taken from the queue as handled.
+        """
+        with self._condition:
+            self.in_progress -= 1
+            self._condition.notify_all()
+        if self._async_changed is not None:
+            self._async_changed.set()
+
+    def retry(self, item, delay):
+        """
+        Reschedules an item taken from the queue. The item is handed out
+        again once the delay elapses. task_done must still be called for
+        the item that was taken.
+
+        Args:
+            item(object): Work item
+            delay(float): No.of seconds to wait before retrying
+        """
+        with self._condition:
+            heapq.heappush(self._delayed, (time.monotonic() + delay,
+                                           next(self._sequence), item))
+            self._condition.notify_all()
+        if self._async_changed is not None:
+            self._async_changed.set()
+
+    def take_new(self):
+        """
+        Takes a new item from the iterator, blocking while the iterator
+        computes it.
+
+        Returns: Item or None if the iterator is exhausted
+        """
+        with self._items_lock:
+            try:
+                item = next(self._items)
+            except StopIteration:
+                with self._condition:
+                    self._exhausted = True
+                    self._condition.notify_all()
+                return None
+            with self._condition:
+                self.in_progress += 1
+            return item
+
+    async def async_get(self):
+        """
+        Asyncio counterpart of get. Meant to be used from a single event
+        loop thread. New items are taken from the iterator on the default
+        executor, so that an iterator that does I/O, eg: reads a file or a
+        database, never blocks the event loop.
+
+        Returns: Item or None once all items are done
+        """
+        import asyncio
+
+        if self._async_changed is None:
+            self._async_changed = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._condition:
+                item, wait = self.poll()
+                if item is not None:
+                    return item
+                exhausted = self._exhausted
+                if exhausted and wait is None and self.in_progress == 0:
+                    return None
+            if not exhausted:
+                item = await loop.run_in_executor(None, self.take_new)
+                if item is not None:
+                    return item
+                continue
+            self._async_changed.clear()
+            await _wait_for_event(self._async_changed, wait)
+
+
+async def _wait_for_event(event, timeout):
+    import asyncio
+
+    try:
+        await asyncio.wait_for(event.wait(), timeout=timeout)
+    except asyncio.TimeoutError:
+        pass
@@ -0,0 +1,157 @@
+"""Report spec module
+
+A report is a top words query with its own word bank, word length rules and
+no.of top words. Any no.of reports are answered from the word counts of a
+single pass over the corpus: the corpus is counted once, restricted to the
+union of the word banks of the reports when all of them have one, and every
+report then picks its top words out of those counts.
+
+Report specs are read from a JSON file with a list of objects, eg:
+
+    [
+        {"name": "all", "count": 10},
+        {"name": "bank", "word_bank": "data/word_bank.txt", "count": 50},
+        {"name": "long", "count": 20, "min_length": 8}
+    ]
+"""
+
+import heapq
+import itertools
+import json
+import os
+
+import lib.constants as constants
+from lib.word_bank import WordBank
+
+
+# Shorter tokens are never counted, see lib.word_bank.TOKEN_PATTERN
+MIN_WORD_LENGTH = 3
+_SPEC_KEYS = frozenset(("name", "count", "word_bank", "min_length",
+                        "max_length"))
+
+
+class ReportSpec(object):
+    """A top words query over the word counts"""
+
+    def __init__(self, name, count=constants.TOP_WORD_COUNT,
+                 word_bank_file_path=None, word_bank=None,
+                 min_length=MIN_WORD_LENGTH, max_length=None):
+        """
+        Constructor
+
+        Args:
+            name(str): Name of the report in the output
+            count(int): Count of top no.of words needed. Default: 10
+            word_bank_file_path(str): Path of the word bank file the report
+                                      is restricted to. Default: None
+            word_bank(lib.word_bank.WordBank): Word bank loaded from the
+                                               file. Default: None
+            min_length(int): Min no.of letters of a word. Default: 3
+            max_length(int): Max no.of letters of a word. Default: None
+        """
+        if count < 1:
+            raise ValueError(f"Report {name}: count must be a positive "
+                             f"integer")
+        if min_length < MIN_WORD_LENGTH:
+            raise ValueError(f"Report {name}: words shorter than "
+                             f"{MIN_WORD_LENGTH} letters are never counted")
+        if max_length is not None and max_length < min_length:
+            raise ValueError(f"Report {name}: max_length is less than "
+                             f"min_length")
+        self.name = name
+        self.count = count
+        self.word_bank_file_path = word_bank_file_path
+        self.word_bank = word_bank
+        self.min_length = min_length
+        self.max_length = max_length
+
+    def accepts(self, word):
+        """
+        Args:
+            word(str): Valid word
+
+        Returns: Whether the word is part of the report
+        """
+        if len(word) < self.min_length:
+            return False
+        if self.max_length is not None and len(word) > self.max_length:
+            return False
+        return self.word_bank is None or word in self.word_bank
+
+    def top_words(self, counter):
+        """
+        Args:
+            counter(Counter): Word counts of the corpus
+
+        Returns: List of top (word, no_of_occurences) pairs of the report.
+                 Ties are in the order of the counter, like
+                 Counter.most_common.
+        """
+        words = heapq.nlargest(self.count, filter(self.accepts, counter),
+                               key=counter.__getitem__)
+        return [(word, counter[word]) for word in words]
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "word_bank": self.word_bank_file_path,
+            "min_length": self.min_length,
+            "max_length": self.max_length,
+        }
+
+
+def load_report_specs(spec_file_path):
+    """
+    Reads the report specs. Word bank paths are relative to the cwd, and a
+    word bank used by several reports is loaded once.
+
+    Args:
+        spec_file_path(str): Path of the JSON file of report specs
+
+    Returns: List of ReportSpec objects
+    """
+    with open(spec_file_path, "r", encoding="utf-8") as file:
+        data = json.load(file)
+    if not isinstance(data, list) or not data:
+        raise ValueError(f"{spec_file_path} must contain a non-empty list of "
+                         f"report specs")
+    word_banks = {}
+    specs = []
+    for position, item in enumerate(data, start=1):
+        unknown_keys = set(item) - _SPEC_KEYS
+        if unknown_keys:
+            raise ValueError(f"Report spec {position} has unknown keys "
+                             f"{sorted(unknown_keys)}")
+        name = item.get("name", f"report-{position}")
+        if any(spec.name == name for spec in specs):
+            raise ValueError(f"Report name {name} is used more than once")
+        word_bank_file_path = item.get("word_bank")
+        word_bank = None
+        if word_bank_file_path:
+            if word_bank_file_path not in word_banks:
+                word_banks[word_bank_file_path] = WordBank.load(
+                    os.path.join(os.getcwd(), word_bank_file_path))
+            word_bank = word_banks[word_bank_file_path]
+        specs.append(ReportSpec(
+            name, count=item.get("count", constants.TOP_WORD_COUNT),
+            word_bank_file_path=word_bank_file_path, word_bank=word_bank,
+            min_length=item.get("min_length", MIN_WORD_LENGTH),
+            max_length=item.get("max_length")))
+    return specs
+
+
+def union_word_bank(specs):
+    """
+    Args:
+        specs(list): ReportSpec objects
+
+    Returns: WordBank with the words of the word banks of all the reports,
+             or None if a report isn't restricted to a word bank
+    """
+    if any(spec.word_bank is None for spec in specs):
+        return None
+    word_banks = {id(spec.word_bank): spec.word_bank for spec in specs}
+    if len(word_banks) == 1:
+        return specs[0].word_bank
+    return WordBank(itertools.chain.from_iterable(
+        word_bank.words for word_bank in word_banks.values()))
@@ -0,0 +1,80 @@
+"""Bounded batch scheduler module
+
+Work items, eg: files, are grouped into batches and handed over to an
+executor lazily: only a bounded no.of batches, holding a bounded no.of bytes,
+are in flight at a time, and the next batch is only taken from the source
+once one of them is done. The memory and the bookkeeping of the scheduler
+stay flat no matter how many items the source yields.
+"""
+
+import concurrent.futures
+
+
+def iter_batches(entries, max_batch_items, max_batch_bytes):
+    """
+    Groups items into batches. The first batches are small and the batch
+    size doubles up to max_batch_items, so that every worker gets a batch
+    early on even when there are only a few items.
+
+    Args:
+        entries(iterable): (item, size in bytes) tuples
+        max_batch_items(int): Max no.of items of a batch
+        max_batch_bytes(int): Max no.of bytes of a batch. A single item
+                              larger than this gets a batch of its own.
+
+    Returns: Generator of (list of items, no.of bytes) tuples
+    """
+    batch, batch_bytes = [], 0
+    batch_limit = 1
+    for item, size in entries:
+        if batch and batch_bytes + size > max_batch_bytes:
+            yield batch, batch_bytes
+            batch, batch_bytes = [], 0
+            batch_limit = min(2 * batch_limit, max_batch_items)
+        batch.append(item)
+        batch_bytes += size
+        if len(batch) >= batch_limit:
+            yield batch, batch_bytes
+            batch, batch_bytes = [], 0
+            batch_limit = min(2 * batch_limit, max_batch_items)
+    if batch:
+        yield batch, batch_bytes
+
+
+def run_bounded(executor, fn, batches, max_in_flight, max_bytes_in_flight):
+    """
+    Runs fn on every batch on the executor, keeping at most max_in_flight
+    batches and max_bytes_in_flight bytes submitted at a time. A batch that
+    is larger than max_bytes_in_flight on its own is still run, alone.
+
+    Args:
+        executor(concurrent.futures.Executor): Executor
+        fn(callable): Function that gets the list of items of a batch
+        batches(iterable): (list of items, no.of bytes) tuples, see
+                           iter_batches
+        max_in_flight(int): Max no.of batches submitted at a time
+        max_bytes_in_flight(int): Max no.of bytes of the batches submitted
+                                  at a time
+
+    Returns: Generator of (list of items, result of fn) tuples, in the order
+             the batches complete
+    """
+    batches = iter(batches)
+    in_flight = {}
+    bytes_in_flight = 0
+    next_batch = next(batches, None)
+    while next_batch is not None or in_flight:
+        while next_batch is not None and len(in_flight) < max_in_flight:
+            items, num_bytes = next_batch
+            if in_flight and \
+                    bytes_in_flight + num_bytes > max_bytes_in_flight:
+                break
+            in_flight[executor.submit(fn, items)] = next_batch
+            bytes_in_flight += num_bytes
+            next_batch = next(batches, None)
+        done, _ = concurrent.futures.wait(
+            in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+        for future in done:
+            items, num_bytes = in_flight.pop(future)
+            bytes_in_flight -= num_bytes
+            yield items, future.result()
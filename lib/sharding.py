@@ -0,0 +1,48 @@
+"""Sharding module
+
+A shard is written as "i/N", the i-th (0 based) of N shards. Every name is
+assigned to exactly one shard by a hash of the name, so that separate runs,
+eg: on separate machines, split a corpus the same way without coordinating.
+"""
+
+import hashlib
+
+
+def parse_shard(spec):
+    """
+    Args:
+        spec(str): Shard as "i/N", eg: "0/4" for the first of 4 shards
+
+    Returns: (index, num_shards) tuple
+    """
+    try:
+        index, num_shards = (int(part) for part in spec.split("/"))
+    except ValueError:
+        raise ValueError(f"Shard must be given as i/N, got {spec}")
+    if num_shards < 1 or not 0 <= index < num_shards:
+        raise ValueError(f"Shard index must be between 0 and N-1, got {spec}")
+    return index, num_shards
+
+
+def shard_of(name, num_shards):
+    """
+    Args:
+        name(str): Name, eg: file name
+        num_shards(int): No.of shards
+
+    Returns: Index of the shard the name belongs to
+    """
+    digest = hashlib.sha1(name.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % num_shards
+
+
+def in_shard(name, shard):
+    """
+    Args:
+        name(str): Name, eg: file name
+        shard(tuple): (index, num_shards) tuple
+
+    Returns: Whether the name belongs to the shard
+    """
+    index, num_shards = shard
+    return shard_of(name, num_shards) == index
@@ -0,0 +1,191 @@
+"""Extracted article text cache module"""
+
+import fcntl
+import os
+import threading
+import time
+
+from lib.corpus import (PACKED_SEGMENT_EXTENSION, PackedCorpus,
+                        PackedCorpusWriter, packed_index_path)
+from lib.extractor import EXTRACTOR_VERSION
+
+
+# Max no.of segments a cache is left with after a run, see
+# ExtractedTextCache.compact
+MAX_SEGMENTS = 8
+_LOCK_FILE_NAME = "lock"
+
+
+class ExtractedTextCache(object):
+    """On-disk store of the article text extracted from each page, keyed by
+    the content hash of the page. Reruns with a different word bank, token
+    rules or top word count only need to tokenize the stored text instead of
+    parsing the HTML again.
+
+    The texts are kept in packed segments (see lib.corpus) under a directory
+    per extractor version, so that a change to the extraction logic never
+    serves stale text. Every process appends to its own segment, which lets
+    worker processes fill the cache without coordinating with each other.
+    The segments are merged by compact once a run is over, while the
+    writers hold a shared lock on the cache directory.
+    """
+
+    def __init__(self, cache_dir_path, extractor_version=EXTRACTOR_VERSION):
+        """
+        Constructor
+
+        Args:
+            cache_dir_path(str): Directory of the cache
+            extractor_version(int): Version of the extraction logic the texts
+                                    are extracted with.
+                                    Default: EXTRACTOR_VERSION
+        """
+        self.path = os.path.join(cache_dir_path, f"v{extractor_version}")
+        # Content hash -> segment (or writer) that holds the text
+        self.locations = {}
+        self._segments = []
+        self._writer = None
+        self._writer_pid = None
+        self._lock_file = None
+        self._lock = threading.Lock()
+        self.load()
+
+    def __contains__(self, digest):
+        return digest in self.locations
+
+    def __len__(self):
+        return len(self.locations)
+
+    def _list_segments(self):
+        if not os.path.isdir(self.path):
+            return []
+        with os.scandir(self.path) as entries:
+            return sorted(entry.path for entry in entries
+                          if entry.name.endswith(PACKED_SEGMENT_EXTENSION))
+
+    def load(self):
+        """
+        Opens the segments of the cache.
+        """
+        for segment_path in self._list_segments():
+            try:
+                segment = PackedCorpus(segment_path)
+            except FileNotFoundError:
+                # Merged into another segment by a concurrent compaction
+                continue
+            self._segments.append(segment)
+            for digest in segment.names():
+                self.locations[digest] = segment
+
+    def get(self, digest):
+        """
+        Args:
+            digest(str): Content hash of the page
+
+        Returns: Stored text of the page or None if it is not cached
+        """
+        segment = self.locations.get(digest)
+        if segment is None:
+            return None
+        return segment.read(digest)
+
+    def put(self, digest, text):
+        """
+        Stores the text extracted from a page.
+
+        Args:
+            digest(str): Content hash of the page
+            text(str): Extracted text
+        """
+        writer = self._get_writer()
+        writer.add(digest, text)
+        self.locations[digest] = writer
+
+    def _get_writer(self):
+        pid = os.getpid()
+        with self._lock:
+            # A forked worker process must not append to its parent's segment
+            if self._writer is None or self._writer_pid != pid:
+                os.makedirs(self.path, exist_ok=True)
+                # Waits for a compaction in progress, which could otherwise
+                # merge and delete the segment while it is appended to
+                self._lock_file = open(
+                    os.path.join(self.path, _LOCK_FILE_NAME), "a")
+                fcntl.flock(self._lock_file, fcntl.LOCK_SH)
+                self._writer = PackedCorpusWriter(os.path.join(
+                    self.path, f"{pid}{PACKED_SEGMENT_EXTENSION}"))
+                self._writer_pid = pid
+            return self._writer
+
+    def _close_writer(self):
+        with self._lock:
+            if self._writer is not None and self._writer_pid == os.getpid():
+                self._writer.close()
+                self._lock_file.close()
+                # The texts written so far are read from the segment instead
+                for segment in self._segments:
+                    if segment.path == self._writer.path:
+                        segment.close()
+                self._segments = [segment for segment in self._segments
+                                  if segment.path != self._writer.path]
+                segment = PackedCorpus(self._writer.path)
+                self._segments.append(segment)
+                for digest in segment.names():
+                    self.locations[digest] = segment
+            self._writer = None
+            self._writer_pid = None
+            self._lock_file = None
+
+    def compact(self, max_segments=MAX_SEGMENTS):
+        """
+        Merges all the segments into a single one when there are more than
+        max_segments of them, so that the no.of open files and memory maps
+        stays bounded however many runs and worker processes filled the
+        cache. Skipped while another process is writing to the cache. Must
+        not be called while the worker processes of a run are alive.
+
+        Args:
+            max_segments(int): Max no.of segments left as they are.
+                               Default: 8
+
+        Returns: Whether the segments were merged
+        """
+        self._close_writer()
+        if len(self._list_segments()) <= max_segments:
+            return False
+        with open(os.path.join(self.path, _LOCK_FILE_NAME), "a") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+            segment_paths = self._list_segments()
+            # The merged segment only gets the segment extension, and so is
+            # only seen by the readers, once it is complete
+            merged_name = f"merged-{time.time_ns()}"
+            tmp_path = os.path.join(self.path, f"{merged_name}.tmp")
+            with PackedCorpusWriter(tmp_path) as writer:
+                for segment_path in segment_paths:
+                    segment = PackedCorpus(segment_path)
+                    for digest in segment.names():
+                        if digest not in writer:
+                            writer.add(digest, segment.read_record(digest),
+                                       compressed=True)
+                    segment.close()
+            os.replace(tmp_path, os.path.join(
+                self.path, f"{merged_name}{PACKED_SEGMENT_EXTENSION}"))
+            for segment_path in segment_paths:
+                os.remove(segment_path)
+                os.remove(packed_index_path(segment_path))
+        self.close()
+        self.load()
+        return True
+
+    def close(self):
+        """
+        Closes the segments and the writer of this process.
+        """
+        self._close_writer()
+        for segment in self._segments:
+            segment.close()
+        self._segments = []
+        self.locations = {}
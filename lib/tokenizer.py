@@ -0,0 +1,264 @@
+"""Batched word counting module
+
+Texts are counted in batches: a batch is joined into a single ascii buffer,
+split into tokens with one translate and split pass over the bytes, and the
+tokens are mapped to dense integer word ids that are counted with a single
+bulk update of a count vector. Tokens that aren't valid words (see
+lib.word_bank.TOKEN_PATTERN) are dropped by the id lookup, or once per
+distinct token when the top words are asked for, instead of once per token.
+Words are converted back to strings only at the end.
+
+numpy is used for the count vector when it is installed, otherwise an
+array.array is used. It is imported on the first count, not along with the
+module.
+"""
+
+import functools
+import itertools
+import re
+from array import array
+from collections import Counter, defaultdict
+
+
+# Keeps the word characters of the lowercased ascii text and turns the rest
+# into spaces. Each token of the split result is then a maximal run of word
+# characters, which is a valid word if it is made of 3 or more letters.
+_WORD_CHARACTERS = b"abcdefghijklmnopqrstuvwxyz0123456789_"
+_TOKEN_TABLE = bytes(character if character in _WORD_CHARACTERS else 32
+                     for character in range(256))
+# Runs of non-ascii characters
+NON_ASCII_PATTERN = re.compile(r'[^\x00-\x7f]+')
+# Separates the texts of a batch in the buffer
+_SEPARATOR = b"\n"
+
+
+@functools.lru_cache(maxsize=None)
+def load_numpy():
+    """
+    Returns: numpy module or None if it isn't installed
+    """
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def _replace_non_ascii(match):
+    # Keep whether each character is a word character for the \b of the
+    # token pattern: "0" is one that can never be part of a token
+    return "".join("0" if character.isalnum() or character == "_" else " "
+                   for character in match.group())
+
+
+def is_valid_token(token):
+    """
+    Args:
+        token(bytes): Token, a maximal run of word characters
+
+    Returns: Whether the token is a valid word
+    """
+    return len(token) >= 3 and token.isalpha()
+
+
+def to_ascii(text):
+    """
+    Lowercases the text and converts it to ascii bytes. Every non-ascii
+    character is replaced by an ascii character that is a word character
+    (but not a letter) if and only if the original one is, so that the
+    valid words of the bytes are the ones lib.word_bank.TOKEN_PATTERN finds
+    in the lowercased text.
+
+    Args:
+        text(str): Text
+
+    Returns: Lowercased ascii bytes
+    """
+    if text.isascii():
+        return text.encode("ascii").lower()
+    return NON_ASCII_PATTERN.sub(_replace_non_ascii,
+                                 text.lower()).encode("ascii")
+
+
+class TokenCounter(object):
+    """Counts of the valid words of many texts, kept as a vector indexed by
+    dense word ids.
+
+    With a word bank the ids are the fixed ids of the bank (see
+    lib.word_bank.WordBank.token_ids) and tokens that aren't in the bank are
+    dropped. Without one, every token gets an id the first time it is seen,
+    and the tokens that aren't valid words are left out of the results.
+    """
+
+    def __init__(self, word_bank=None):
+        """
+        Constructor
+
+        Args:
+            word_bank(lib.word_bank.WordBank): Word bank. Default: None
+        """
+        self.word_bank = word_bank
+        if word_bank is not None:
+            self.token_ids = word_bank.token_ids
+            # Tokens that aren't in the bank are counted in the last slot
+            self._missing_id = len(self.token_ids)
+        else:
+            self.token_ids = defaultdict(itertools.count().__next__)
+            self._missing_id = None
+        self.counts = _zeros(0)
+
+    def __len__(self):
+        return len(self.token_ids)
+
+    def _ensure_size(self):
+        size = len(self.token_ids) + 1
+        if len(self.counts) < size:
+            self.counts = _resize(self.counts, size)
+
+    def _map_tokens(self, tokens):
+        if self._missing_id is None:
+            # Assigns ids to the new tokens
+            return map(self.token_ids.__getitem__, tokens)
+        return map(self.token_ids.get, tokens,
+                   itertools.repeat(self._missing_id))
+
+    def update(self, texts):
+        """
+        Counts the valid words of the texts.
+
+        Args:
+            texts(iterable): Texts (str)
+        """
+        buffer = _SEPARATOR.join(to_ascii(text) for text in texts)
+        tokens = buffer.translate(_TOKEN_TABLE).split()
+        self._add_ids(self._map_tokens(tokens), len(tokens))
+
+    def _add_ids(self, ids, num_ids, weights=None):
+        numpy = load_numpy()
+        if numpy is not None:
+            ids = numpy.fromiter(ids, dtype=numpy.intp, count=num_ids)
+            self._ensure_size()
+            if weights is None:
+                bin_counts = numpy.bincount(ids, minlength=len(self.counts))
+            else:
+                bin_counts = numpy.bincount(
+                    ids, weights=numpy.asarray(weights, dtype=numpy.float64),
+                    minlength=len(self.counts)).astype(numpy.int64)
+            self.counts += bin_counts
+            return
+        if weights is None:
+            id_counts = Counter(ids)
+        else:
+            id_counts = Counter()
+            for word_id, weight in zip(ids, weights):
+                id_counts[word_id] += weight
+        self._ensure_size()
+        counts = self.counts
+        for word_id, count in id_counts.items():
+            counts[word_id] += count
+
+    def pop_sparse(self):
+        """
+        Returns the non-zero counts and clears them, eg: to be sent from a
+        worker process to be merged into the counts of the parent. Without a
+        word bank, the ids are cleared as well so that the vocabulary of a
+        long-running worker doesn't keep growing.
+
+        Returns: (list of words as bytes, list of counts) tuple
+        """
+        vocabulary = self._vocabulary()
+        numpy = load_numpy()
+        if numpy is not None:
+            word_ids = numpy.flatnonzero(
+                self.counts[:len(vocabulary)]).tolist()
+        else:
+            word_ids = [word_id for word_id, count
+                        in enumerate(self.counts[:len(vocabulary)]) if count]
+        word_ids = [word_id for word_id in word_ids
+                    if vocabulary[word_id] is not None]
+        words = [vocabulary[word_id] for word_id in word_ids]
+        counts = [int(self.counts[word_id]) for word_id in word_ids]
+        if self.word_bank is None:
+            self.token_ids = defaultdict(itertools.count().__next__)
+            self.counts = _zeros(0)
+        else:
+            self.counts = _zeros(len(self.counts))
+        return words, counts
+
+    def merge_sparse(self, words, counts):
+        """
+        Adds counts returned by pop_sparse of another counter.
+
+        Args:
+            words(list): Words as bytes
+            counts(list): Counts of the words
+        """
+        self._add_ids(self._map_tokens(words), len(words), weights=counts)
+
+    def _vocabulary(self):
+        # List of the words by their ids. Tokens that aren't valid words
+        # are None.
+        if self.word_bank is not None:
+            return self.word_bank.vocabulary
+        vocabulary = [None] * len(self.token_ids)
+        for token, word_id in self.token_ids.items():
+            if is_valid_token(token):
+                vocabulary[word_id] = token
+        return vocabulary
+
+    def top(self, count):
+        """
+        Args:
+            count(int): Count of top no.of words needed
+
+        Returns: List of top (word, no_of_occurences) pairs
+        """
+        vocabulary = self._vocabulary()
+        numpy = load_numpy()
+        if numpy is not None:
+            counts = self.counts[:len(vocabulary)].copy()
+            counts[[word_id for word_id, word in enumerate(vocabulary)
+                    if word is None]] = 0
+            if len(counts) > count:
+                # Only the words that count at least as much as the
+                # count-th largest one are sorted
+                threshold = numpy.partition(counts, -count)[-count]
+                word_ids = numpy.flatnonzero(counts >= max(threshold, 1))
+            else:
+                word_ids = numpy.flatnonzero(counts)
+            pairs = [(int(counts[word_id]), word_id)
+                     for word_id in word_ids.tolist()]
+        else:
+            pairs = [(int(word_count), word_id) for word_id, word_count
+                     in enumerate(self.counts[:len(vocabulary)])
+                     if word_count and vocabulary[word_id] is not None]
+        # Ties are broken by the first seen word, like Counter.most_common
+        pairs.sort(key=lambda pair: (-pair[0], pair[1]))
+        return [(vocabulary[word_id].decode("ascii"), word_count)
+                for word_count, word_id in pairs[:count]]
+
+    def to_counter(self):
+        """
+        Returns: Counter of the words
+        """
+        vocabulary = self._vocabulary()
+        return Counter({vocabulary[word_id].decode("ascii"): int(word_count)
+                        for word_id, word_count
+                        in enumerate(self.counts[:len(vocabulary)])
+                        if word_count and vocabulary[word_id] is not None})
+
+
+def _zeros(size):
+    numpy = load_numpy()
+    if numpy is not None:
+        return numpy.zeros(size, dtype=numpy.int64)
+    return array("q", bytes(8 * size))
+
+
+def _resize(counts, size):
+    numpy = load_numpy()
+    if numpy is not None:
+        resized = numpy.zeros(size, dtype=numpy.int64)
+        resized[:len(counts)] = counts
+        return resized
+    return counts + array("q", bytes(8 * (size - len(counts))))
@@ -0,0 +1,51 @@
+"""URL list reading module
+
+URL lists are read line by line, so that lists of millions of urls are
+streamed instead of being loaded into memory. A list can be a plain text
+file, a gzip compressed one (.gz) or the standard input ("-").
+"""
+
+import gzip
+import sys
+
+
+STDIN = "-"
+
+
+def open_url_list(url_list_file):
+    """
+    Opens a url list for reading.
+
+    Args:
+        url_list_file(str): File path of the url list, a .gz file path or
+                            "-" for the standard input
+
+    Returns: Text file object
+    """
+    if url_list_file == STDIN:
+        # The standard input itself is left open
+        return open(sys.stdin.fileno(), "r", encoding="utf-8",
+                    errors="replace", closefd=False)
+    if url_list_file.endswith(".gz"):
+        return gzip.open(url_list_file, "rt", encoding="utf-8",
+                         errors="replace")
+    return open(url_list_file, "r", encoding="utf-8", errors="replace")
+
+
+def iter_urls(url_list_file):
+    """
+    Reads the urls of a url list lazily. Surrounding whitespace and trailing
+    slashes are stripped.
+
+    Args:
+        url_list_file(str): File path of the url list, a .gz file path or
+                            "-" for the standard input
+
+    Returns: Generator of (line number, url) tuples, leaving out the empty
+             lines
+    """
+    with open_url_list(url_list_file) as file:
+        for line_number, line in enumerate(file, start=1):
+            url = line.strip().strip("/")
+            if url:
+                yield line_number, url
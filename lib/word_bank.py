@@ -0,0 +1,154 @@
+"""Word bank index module"""
+
+import hashlib
+import os
+import pickle
+import re
+
+
+# Tokens are lowercased before matching, so only words made of 3 or more
+# lowercase ascii letters can ever match a token. Everything else in the
+# word bank file is dropped at load time.
+TOKEN_PATTERN = re.compile(r'\b[a-z]{3,}\b')
+VALID_WORD_PATTERN = re.compile(r'[a-z]{3,}')
+
+# Bump this whenever the layout of the compiled file changes
+COMPILED_FORMAT_VERSION = 1
+
+
+class WordBank(object):
+    """Hash-indexed set of valid words loaded from a word bank file.
+
+    The validation rules (minimum of 3 letters, alphabetic only) are applied
+    once when the bank is loaded, so that tokenizing a document only costs a
+    set lookup per token.
+
+    Every word also has a dense integer id, its index in the sorted
+    vocabulary, used to count words in a vector (see lib.tokenizer).
+    """
+
+    # Built on first use
+    _vocabulary = None
+    _token_ids = None
+
+    def __init__(self, words=()):
+        """
+        Constructor
+
+        Args:
+            words(iterable): Words of the bank. Words that can never be
+                             valid tokens are dropped.
+        """
+        self.words = frozenset(
+            word for word in words if VALID_WORD_PATTERN.fullmatch(word))
+
+    def __contains__(self, word):
+        return word in self.words
+
+    def __len__(self):
+        return len(self.words)
+
+    def __bool__(self):
+        # An empty bank still means "filter everything out" once a bank
+        # file was given, so truthiness must not depend on the size.
+        return True
+
+    @property
+    def vocabulary(self):
+        """Words of the bank as ascii bytes, sorted by their ids"""
+        if self._vocabulary is None:
+            self._vocabulary = [word.encode("ascii")
+                                for word in sorted(self.words)]
+        return self._vocabulary
+
+    @property
+    def token_ids(self):
+        """Dict of word (ascii bytes) to its id"""
+        if self._token_ids is None:
+            self._token_ids = {word: word_id for word_id, word
+                               in enumerate(self.vocabulary)}
+        return self._token_ids
+
+    def fingerprint(self):
+        """
+        Returns: Hash that identifies the content of the bank
+        """
+        return hashlib.sha1(
+            "\n".join(sorted(self.words)).encode("utf-8")).hexdigest()
+
+    def tokenize(self, text):
+        """
+        Tokenizes the text into valid words that are part of the bank.
+
+        Args:
+            text(str): Text to be tokenized into words
+
+        Returns: List of words
+        """
+        words = self.words
+        return [word for word in TOKEN_PATTERN.findall(text.lower())
+                if word in words]
+
+    def save(self, compiled_file_path, source_signature=None):
+        """
+        Saves the compiled bank to a binary file that can be reloaded
+        without re-applying the validation rules.
+
+        Args:
+            compiled_file_path(str): Path of the compiled file
+            source_signature(tuple): (size, mtime_ns) of the word bank file
+                                     the bank was compiled from
+        """
+        data = {
+            "version": COMPILED_FORMAT_VERSION,
+            "source_signature": source_signature,
+            "words": self.words,
+        }
+        tmp_path = f"{compiled_file_path}.tmp"
+        with open(tmp_path, "wb") as file:
+            pickle.dump(data, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, compiled_file_path)
+
+    @classmethod
+    def from_text_file(cls, word_bank_file_path):
+        """
+        Builds the bank from a plain text file with one word per line.
+
+        Args:
+            word_bank_file_path(str): Path of the word bank file
+
+        Returns: WordBank object
+        """
+        with open(word_bank_file_path, "r", encoding="utf-8") as file:
+            return cls(file.read().splitlines())
+
+    @classmethod
+    def load(cls, word_bank_file_path, compiled_file_path=None):
+        """
+        Loads the bank. If a compiled file path is given, the compiled file
+        is used as long as it was built from the current version of the word
+        bank file, otherwise it gets (re)built from the text file.
+
+        Args:
+            word_bank_file_path(str): Path of the word bank file
+            compiled_file_path(str): Path of the compiled file. Default: None
+
+        Returns: WordBank object
+        """
+        if not compiled_file_path:
+            return cls.from_text_file(word_bank_file_path)
+
+        stat = os.stat(word_bank_file_path)
+        source_signature = (stat.st_size, stat.st_mtime_ns)
+        if os.path.isfile(compiled_file_path):
+            with open(compiled_file_path, "rb") as file:
+                data = pickle.load(file)
+            if data.get("version") == COMPILED_FORMAT_VERSION and \
+                    data.get("source_signature") == source_signature:
+                word_bank = cls.__new__(cls)
+                word_bank.words = data["words"]
+                return word_bank
+
+        word_bank = cls.from_text_file(word_bank_file_path)
+        word_bank.save(compiled_file_path, source_signature=source_signature)
+        return word_bank
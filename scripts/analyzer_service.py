@@ -0,0 +1,289 @@
+"""
+A long-running word frequency service. It keeps the word counts of the HTML
+files in memory, folds in the files that are added, modified or deleted as
+it polls the directory, and answers top words queries over a local HTTP
+endpoint:
+
+    GET /top?count=10    Top words
+    GET /status          No.of files and words, time of the last update
+
+The per-file word counts are snapshotted to disk (see lib.count_cache), so a
+restart only has to process the files that changed while it was down.
+"""
+import argparse
+import http.server
+import json
+import os
+import signal
+import threading
+import time
+from collections import Counter
+from urllib.parse import parse_qs, urlparse
+
+import lib.constants as constants
+import lib.logger as logger
+from lib.count_cache import FileCountCache
+from scripts.word_analyzer import WordFrequencyProcessor
+
+
+class _ServiceRequestHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        service = self.server.service
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        status_code = 200
+        try:
+            if url.path == "/top":
+                count = int(query.get("count", [constants.TOP_WORD_COUNT])[0])
+                data = service.get_top_words(count)
+            elif url.path == "/status":
+                data = service.get_status()
+            else:
+                status_code, data = 404, {"error": f"Unknown path {url.path}"}
+        except ValueError as e:
+            status_code, data = 400, {"error": str(e)}
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.DEBUG(f"{self.address_string()} - {format % args}",
+                     sample_key="request")
+
+
+class AnalyzerService(object):
+    """Word counts of a directory of html files, kept up to date by polling
+    the directory and served over HTTP.
+    """
+
+    def __init__(self, html_files_dir_path, snapshot_file_path,
+                 host="127.0.0.1", port=constants.SERVICE_PORT,
+                 poll_interval=constants.SERVICE_POLL_INTERVAL,
+                 snapshot_interval=constants.SERVICE_SNAPSHOT_INTERVAL,
+                 **kwargs):
+        """
+        Constructor
+
+        Args:
+            html_files_dir_path(str): Directory that contains the html files
+            snapshot_file_path(str): File path of the snapshot of the
+                                     per-file word counts
+            host(str): Address the endpoint listens on. Default: 127.0.0.1
+            port(int): Port the endpoint listens on. Default: 8080
+            poll_interval(float): Seconds between two scans of the directory.
+                                  Default: 5
+            snapshot_interval(float): Min no.of seconds between two
+                                      snapshots. Default: 60
+            kwargs(dict): Arguments for WordFrequencyProcessor
+        """
+        self.processor = WordFrequencyProcessor(
+            html_files_dir_path=html_files_dir_path, **kwargs)
+        self.cache = FileCountCache(
+            snapshot_file_path, settings_key=self.processor.settings_key())
+        self.poll_interval = poll_interval
+        self.snapshot_interval = snapshot_interval
+        # (counts, no.of files, update time, top words by count) published
+        # to the queries. The updater replaces the whole tuple instead of
+        # changing it, so queries never need a lock.
+        self.published = None
+        self.publish()
+        self._snapshot_at = time.time()
+        self._dirty = False
+        self.stopped = threading.Event()
+        self.server = http.server.ThreadingHTTPServer(
+            (host, port), _ServiceRequestHandler)
+        self.server.daemon_threads = True
+        self.server.service = self
+
+    def get_top_words(self, count):
+        """
+        Args:
+            count(int): Count of top no.of words needed
+
+        Returns: Dict with the top (word, no_of_occurences) pairs
+        """
+        if count < 1:
+            raise ValueError("count must be a positive integer")
+        counts, num_files, updated_at, top_words = self.published
+        if count not in top_words:
+            top_words[count] = counts.most_common(count)
+        return {"count": count, "files": num_files,
+                "updated_at": updated_at, "top_words": top_words[count]}
+
+    def get_status(self):
+        """
+        Returns: Dict with the no.of files and words counted
+        """
+        counts, num_files, updated_at, _ = self.published
+        return {"files": num_files, "words": len(counts),
+                "updated_at": updated_at}
+
+    def publish(self):
+        """
+        Makes the current word counts visible to the queries.
+        """
+        self.published = (Counter(self.cache.aggregate),
+                          len(self.cache.entries), time.time(), {})
+
+    def poll(self):
+        """
+        Processes the files that were added or modified since the last poll
+        and drops the ones that were deleted, then publishes the new counts.
+        """
+        self.processor.reopen_corpus()
+        file_entries = list(self.processor.corpus.iter_entries())
+        num_files = len(self.cache.entries)
+        num_processed = self.processor.update_count_cache(self.cache,
+                                                          file_entries)
+        if self.processor.extractor.text_cache is not None:
+            self.processor.extractor.text_cache.compact()
+        if not num_processed and num_files == len(self.cache.entries):
+            return
+        self.publish()
+        self._dirty = True
+        logger.INFO(f"Processed {num_processed} files, "
+                    f"{len(self.cache.entries)} files are counted")
+
+    def snapshot(self, force=False):
+        """
+        Saves the per-file word counts, unless they didn't change or the
+        last snapshot is more recent than the snapshot interval.
+
+        Args:
+            force(bool): Whether the interval should be ignored.
+                         Default: False
+        """
+        if not self._dirty or (not force and time.time() - self._snapshot_at
+                               < self.snapshot_interval):
+            return
+        self.cache.save()
+        self._snapshot_at = time.time()
+        self._dirty = False
+
+    def run(self):
+        """
+        Serves the queries from a background thread and polls the directory
+        until stop is called.
+        """
+        server_thread = threading.Thread(target=self.server.serve_forever,
+                                         name="server", daemon=True)
+        server_thread.start()
+        host, port = self.server.server_address[:2]
+        logger.INFO(f"Serving on http://{host}:{port}")
+        try:
+            while not self.stopped.is_set():
+                started = time.perf_counter()
+                try:
+                    self.poll()
+                    self.snapshot()
+                except Exception as e:
+                    logger.ERROR(f"Error updating the word counts: {e}")
+                self.stopped.wait(max(
+                    0.0, self.poll_interval - (time.perf_counter() - started)))
+        finally:
+            self.server.shutdown()
+            self.server.server_close()
+            self.snapshot(force=True)
+            logger.INFO("Stopped")
+
+    def stop(self, *args):
+        self.stopped.set()
+
+
+def main(argv=None, prog=None):
+    """
+    Runs the word frequency service until it is stopped.
+
+    Args:
+        argv(list): Command line arguments. Default: None (sys.argv)
+        prog(str): Program name in the usage message. Default: None
+    """
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        description="A word frequency service that watches a directory of "
+                    "html files")
+    parser.add_argument("-p", "--relative_dir_path",
+                        help='relative (to the cwd) directory path that '
+                             'contains html files. '
+                             f"Default: {constants.RELATIVE_HTML_DIR_PATH}",
+                        type=str, default=constants.RELATIVE_HTML_DIR_PATH)
+    parser.add_argument("-w", "--word_bank_file_path",
+                        help='relative (to the cwd) file path for word bank. '
+                             'Default: None',
+                        type=str, default=None)
+    parser.add_argument("-n", "--num_threads", "--workers",
+                        help=f"No.of worker threads (or processes with the "
+                             "process executor) to use. "
+                             f"Default: {constants.MAX_THREADS} threads or "
+                             "one process per core",
+                             type=int, default=None)
+    parser.add_argument("-e", "--executor",
+                        help="Executor used to process the files. "
+                             f"Default: {constants.EXECUTOR_THREAD}",
+                        choices=[constants.EXECUTOR_THREAD,
+                                 constants.EXECUTOR_PROCESS],
+                        default=constants.EXECUTOR_THREAD)
+    parser.add_argument("-s", "--snapshot_file",
+                        help="relative (to the cwd) file path of the snapshot "
+                             "of the word counts. "
+                             f"Default: {constants.RELATIVE_SERVICE_SNAPSHOT_FILE_PATH}",
+                        type=str,
+                        default=constants.RELATIVE_SERVICE_SNAPSHOT_FILE_PATH)
+    parser.add_argument("--text_cache_dir",
+                        help="relative (to the cwd) directory path of the "
+                             "extracted text cache. Default: None",
+                        type=str, default=None)
+    parser.add_argument("-H", "--host",
+                        help="Address to listen on. Default: 127.0.0.1",
+                        type=str, default="127.0.0.1")
+    parser.add_argument("-P", "--port",
+                        help=f"Port to listen on. Default: {constants.SERVICE_PORT}",
+                        type=int, default=constants.SERVICE_PORT)
+    parser.add_argument("-i", "--poll_interval",
+                        help="Seconds between two scans of the directory. "
+                             f"Default: {constants.SERVICE_POLL_INTERVAL}",
+                        type=float, default=constants.SERVICE_POLL_INTERVAL)
+    parser.add_argument("--snapshot_interval",
+                        help="Min no.of seconds between two snapshots. "
+                             f"Default: {constants.SERVICE_SNAPSHOT_INTERVAL}",
+                        type=float, default=constants.SERVICE_SNAPSHOT_INTERVAL)
+    parser.add_argument("-d", "--debug", help="Enable debug messages",
+                        required=False, action='store_true')
+    parser.add_argument("--quiet",
+                        help="Leave out the per-file messages",
+                        required=False, action='store_true')
+
+    parsed_args = parser.parse_args(argv)
+    if parsed_args.debug or parsed_args.quiet:
+        logger.setup_logging(log_level="DEBUG" if parsed_args.debug else "INFO",
+                             quiet=parsed_args.quiet)
+    num_workers = parsed_args.num_threads
+    if num_workers is None:
+        num_workers = constants.MAX_THREADS
+        if parsed_args.executor == constants.EXECUTOR_PROCESS:
+            num_workers = os.cpu_count()
+    service = AnalyzerService(
+        html_files_dir_path=os.path.join(
+            os.getcwd(), parsed_args.relative_dir_path),
+        snapshot_file_path=os.path.join(
+            os.getcwd(), parsed_args.snapshot_file),
+        host=parsed_args.host,
+        port=parsed_args.port,
+        poll_interval=parsed_args.poll_interval,
+        snapshot_interval=parsed_args.snapshot_interval,
+        word_bank_file_path=parsed_args.word_bank_file_path,
+        num_threads=num_workers,
+        executor=parsed_args.executor,
+        text_cache_dir_path=parsed_args.text_cache_dir)
+    signal.signal(signal.SIGTERM, service.stop)
+    signal.signal(signal.SIGINT, service.stop)
+    service.run()
+
+
+if __name__ == "__main__":
+    main()
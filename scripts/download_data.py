@@ -3,22 +3,157 @@ A script to download source HTML for the list of urls listed in a text file.
 """
 import argparse
 import concurrent.futures
-import requests
+import hashlib
+import json
 import random
 import os
 import re
 import threading
 import time
+from collections import Counter
 from urllib.parse import urlparse
 
 import lib.logger as logger
 import lib.constants as constants
+from lib.corpus import NOT_FOUND_PREFIX, PackedCorpusWriter
+from lib.count_cache import file_digest
+from lib.manifest import (STATUS_DOWNLOADED, STATUS_NOT_FOUND, STATUS_PENDING,
+                          DownloadManifest)
+from lib.rate_control import HostRateController, RetryingWorkQueue
+from lib.sharding import in_shard, parse_shard
+from lib.url_source import iter_urls
+
+
+class DownloadTask(object):
+    """A url to be downloaded along with its retry state"""
+
+    __slots__ = ("url", "index", "output_file_path", "attempt", "error")
+
+    def __init__(self, url, index, output_file_path):
+        self.url = url
+        self.index = index
+        self.output_file_path = output_file_path
+        self.attempt = 0
+        self.error = None
+
+
+class DownloadProgress(object):
+    """Counts of the urls handled so far, checkpointed periodically by a
+    background thread: logged along with the throughput, and written to a
+    JSON file if one is given.
+    """
+
+    def __init__(self, interval=constants.PROGRESS_INTERVAL,
+                 checkpoint_file_path=None):
+        """
+        Constructor
+
+        Args:
+            interval(float): Seconds between two checkpoints. Default: 30
+            checkpoint_file_path(str): Path of the JSON file the latest
+                                       checkpoint is written to.
+                                       Default: None
+        """
+        self.interval = interval
+        self.checkpoint_file_path = checkpoint_file_path
+        # No.of lines of the url list read so far
+        self.lines_read = 0
+        self.counts = Counter()
+        self.bytes = 0
+        self.started = time.monotonic()
+        # (time, no.of urls handled, bytes) of the last checkpoint
+        self._last = (self.started, 0, 0)
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def add(self, outcome, size=0):
+        """
+        Counts a url.
+
+        Args:
+            outcome(str): What happened to the url, eg: "downloaded"
+            size(int): No.of bytes downloaded. Default: 0
+        """
+        with self._lock:
+            self.counts[outcome] += 1
+            self.bytes += size
+
+    def checkpoint(self):
+        """
+        Logs the progress and the throughput since the start and since the
+        last checkpoint, and writes them to the checkpoint file.
+
+        Returns: Dict with the progress
+        """
+        now = time.monotonic()
+        with self._lock:
+            counts = dict(self.counts)
+            num_bytes = self.bytes
+        handled = sum(counts.get(outcome, 0) for outcome in
+                      ("downloaded", "unchanged", "not_found", "failed"))
+        last_time, last_handled, last_bytes = self._last
+        self._last = (now, handled, num_bytes)
+        elapsed = max(now - self.started, 1e-9)
+        since_last = max(now - last_time, 1e-9)
+        progress = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "elapsed_sec": round(elapsed, 1),
+            "lines_read": self.lines_read,
+            "handled": handled,
+            "counts": counts,
+            "bytes": num_bytes,
+            "urls_per_sec": round(handled / elapsed, 2),
+            "mb_per_sec": round(num_bytes / 2 ** 20 / elapsed, 3),
+            "current_urls_per_sec": round(
+                (handled - last_handled) / since_last, 2),
+        }
+        logger.INFO(f"Progress: {self.lines_read} lines read, {handled} urls "
+                    f"handled {counts}, {progress['urls_per_sec']} urls/sec "
+                    f"({progress['current_urls_per_sec']} since the last "
+                    f"checkpoint), {progress['mb_per_sec']} MB/sec")
+        if self.checkpoint_file_path:
+            tmp_path = f"{self.checkpoint_file_path}.tmp"
+            with open(tmp_path, "w") as file:
+                json.dump(progress, file, indent=2)
+            os.replace(tmp_path, self.checkpoint_file_path)
+        return progress
+
+    def start(self):
+        """
+        Starts checkpointing every interval seconds.
+        """
+        def run():
+            while not self._stopped.wait(self.interval):
+                self.checkpoint()
+
+        self._thread = threading.Thread(target=run, name="progress",
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops checkpointing, after a last checkpoint.
+        """
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.checkpoint()
 
 
 class PageSourceDownloader(object):
     def __init__(self, save_dir, url_list_file,
                  max_retries=constants.MAX_RETRIES_TO_GET_URL_CONTENT,
-                 num_threads=constants.MAX_THREADS):
+                 num_threads=constants.MAX_THREADS,
+                 backend=constants.DOWNLOAD_BACKEND_THREAD,
+                 max_in_flight=constants.MAX_IN_FLIGHT_REQUESTS,
+                 max_connections_per_host=constants.MAX_CONNECTIONS_PER_HOST,
+                 corpus_file=None,
+                 manifest_file=None,
+                 refresh=False,
+                 shard=None,
+                 progress_interval=constants.PROGRESS_INTERVAL,
+                 progress_file=None):
         """
         Constructor
 
@@ -26,11 +161,43 @@ class PageSourceDownloader(object):
             save_dir(str): Directory where the source HTML for the files to be
                            stored
             url_list_file(str): Relative file path that contains list of urls to
-                                be fetched
+                                be fetched, one per line. A .gz file is
+                                decompressed on the fly and "-" reads the
+                                standard input. The list is streamed, so
+                                it can be of any length.
             max_retries(int): Max no.of retries to be done if HTTP GET for any
                               url fails without a response. Default: 5
             num_threads(int): No.of simultaneous worker threads to be used to
                               download all files. Default: 30
+            backend(str): "thread" or "async". The async backend downloads
+                          on a single thread using asyncio with a shared pool
+                          of keep-alive connections. Default: thread
+            max_in_flight(int): Max no.of simultaneous requests with the
+                                async backend. Default: 1000
+            max_connections_per_host(int): Max no.of simultaneous connections
+                                           to a single host with the async
+                                           backend. Default: 100
+            corpus_file(str): When given, the page sources are appended to
+                              this packed corpus segment file instead of
+                              being saved as one file per url under
+                              save_dir. Default: None
+            manifest_file(str): Path of the download manifest (see
+                                lib.manifest) that keeps the state of every
+                                url across runs. Default: None (the state
+                                is kept in memory only)
+            refresh(bool): Whether the urls that were already downloaded
+                           should be fetched again. The ETag/Last-Modified
+                           of the stored page is sent along, so that a page
+                           is transferred and rewritten only if it changed.
+                           Default: False
+            shard(tuple): (index, num_shards) tuple. When given, only the
+                          urls of the shard are downloaded (see
+                          lib.sharding), eg: to split a url list across
+                          downloader instances. Default: None
+            progress_interval(float): Seconds between two progress
+                                      checkpoints. Default: 30
+            progress_file(str): Path of the JSON file the latest progress
+                                checkpoint is written to. Default: None
         """
 
         self.save_dir = save_dir
@@ -38,109 +205,447 @@ class PageSourceDownloader(object):
         self.max_retries = max_retries
         # Number of concurrent threads to use
         self.num_threads = num_threads
-        self.unexpected_status_code = False
-        # Create the directory if it doesn't exist
+        self.backend = backend
+        self.max_in_flight = max_in_flight
+        self.max_connections_per_host = max_connections_per_host
+        self.max_rate_limited_retries = constants.MAX_RATE_LIMITED_RETRIES
+        self.rate_controller = None
+        self.work_queue = None
+        self.corpus_writer = None
+        if corpus_file:
+            self.corpus_writer = PackedCorpusWriter(corpus_file)
+        else:
+            self.create_save_dir()
+        self.manifest = DownloadManifest(manifest_file)
+        self.refresh = refresh
+        self.shard = shard
+        self.progress = DownloadProgress(progress_interval, progress_file)
+
+    def create_save_dir(self):
+        """
+        Creates the directory the page sources are saved to if it doesn't
+        exist.
+        """
         os.makedirs(self.save_dir, exist_ok=True)
-        self.duplicates = {}
 
-    def download_url_and_save(self, url, index):
+    def iter_tasks(self, urls):
         """
-        Given the url, downloads the page source and saves it to a file under
-        output directory (specified to save_dir option during object creation).
+        Generates the download tasks for the urls that weren't already
+        handled by an earlier run.
 
         Args:
-            url(str): URL
-            index(int): identifier for logging purpose
+            urls(iterable): (line number, url) tuples, see
+                            lib.url_source.iter_urls
 
+        Returns: Generator of DownloadTask objects
         """
+        earlier_downloads = None
+        if not len(self.manifest):
+            earlier_downloads = self.list_earlier_downloads()
+        for index, url in urls:
+            self.progress.lines_read = index
+            if self.shard is not None and not in_shard(url, self.shard):
+                continue
+            entry = self.manifest.assign_file_name(
+                url, self.get_file_name_candidates(url))
+            if entry.status == STATUS_PENDING and earlier_downloads:
+                status = earlier_downloads.get(entry.file_name)
+                if status is not None:
+                    self.manifest.record(url, status)
+            task = DownloadTask(url, index,
+                                os.path.join(self.save_dir, entry.file_name))
+            if self.is_downloaded(task) and not self.refresh:
+                # Already downloaded
+                logger.DEBUG(f"Exists {index}. {url}", sample_key="exists")
+                self.progress.add("exists")
+                continue
+            yield task
+
+    def list_earlier_downloads(self):
+        """
+        Lists the pages stored by runs from before the download manifest
+        was used, so that they are recorded in the manifest instead of being
+        downloaded again.
+
+        Returns: Dict of file name to its status
+        """
+        if self.corpus_writer is not None:
+            return {name: STATUS_NOT_FOUND
+                    if self.corpus_writer.is_not_found(name)
+                    else STATUS_DOWNLOADED
+                    for name in self.corpus_writer.index}
+        earlier_downloads = {}
+        with os.scandir(self.save_dir) as entries:
+            for entry in entries:
+                if entry.name.startswith(NOT_FOUND_PREFIX):
+                    earlier_downloads.setdefault(
+                        entry.name[len(NOT_FOUND_PREFIX):], STATUS_NOT_FOUND)
+                else:
+                    earlier_downloads[entry.name] = STATUS_DOWNLOADED
+        return earlier_downloads
+
+    def get_request_headers(self, task):
+        """
+        Computes the headers of the request for the url. When a stored page
+        is refreshed, its validators make the request conditional.
+
+        Args:
+            task(DownloadTask): Task of the url to be downloaded
+
+        Returns: Dict of headers
+        """
+        headers = {}
+        entry = self.manifest.get(task.url)
+        if self.refresh and entry.status == STATUS_DOWNLOADED:
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+    def download_url_and_save(self, task):
+        """
+        Given the task, downloads the page source of its url and saves it to
+        a file under output directory (specified to save_dir option during
+        object creation). If the request fails or gets throttled, the task is
+        rescheduled once the host's backoff elapses.
+
+        Args:
+            task(DownloadTask): Task of the url to be downloaded
+
+        """
+        # Imported here so that runs with nothing left to download, or with
+        # the async backend, don't pay for it
+        import requests
 
-        if self.unexpected_status_code:
-            # If any one thread has got an unexpected status code, the other
-            # threads should not pick up any more new work.
-            return
-        failed = False
-        ex = None
         name = threading.current_thread().name
-        url = url.strip("/")
-        file_name = f"{url.split('/')[-1]}.html"
+        host = urlparse(task.url).netloc
+        task.attempt += 1
+        response = None
+        self.rate_controller.acquire(host)
+        try:
+            # Using fake user agents also didn't help to overcome
+            # request limits.
+            response = requests.get(task.url,
+                                    headers=self.get_request_headers(task),
+                                    timeout=constants.REQUEST_TIMEOUT)
+        except Exception as e:
+            task.error = e
+            logger.DEBUG(f"{name} - Error downloading {task.url}: {e} - "
+                         f"attempt {task.attempt}")
+        finally:
+            status_code, retry_after = None, None
+            if response is not None:
+                status_code = response.status_code
+                retry_after = response.headers.get("Retry-After")
+            delay = self.rate_controller.release(host, status_code,
+                                                 retry_after)
 
-        # check if its duplicate case
-        # Eg:
-        #  "https://www.engadget.com/2019/08/24/the-morning-after",
-        #  "https://www.engadget.com/2019/08/23/the-morning-after",
-        if file_name in self.duplicates:
-            self.duplicates[file_name].append(url)
-            rel_url_path = urlparse(url).path
-            file_name = re.sub(r'\/', '-', rel_url_path)
+        if status_code == 200:
+            self.save_page(task, response.text)
+            self.record_page(task, response.text, response.headers)
+            self.progress.add("downloaded", len(response.content))
+            logger.INFO(f"{name} - Downloaded {task.index}. {task.url}",
+                        sample_key="downloaded")
+        elif status_code == 304:
+            self.manifest.mark_unchanged(task.url)
+            self.progress.add("unchanged")
+            logger.INFO(f"{name} - Unchanged {task.index}. {task.url}",
+                        sample_key="unchanged")
+        elif status_code == 404:
+            self.save_not_found(task)
+            self.manifest.record(task.url, STATUS_NOT_FOUND)
+            self.progress.add("not_found")
+            logger.INFO(f"{name} - NOT FOUND {task.index}. {task.url}",
+                        sample_key="not_found")
         else:
-            self.duplicates[file_name] = [url]
-
-        output_file_path = os.path.join(
-            self.save_dir, file_name)
-        not_found_file_path = os.path.join(
-            self.save_dir, f"NOT_FOUND_{file_name}")
-        logger.DEBUG(f"checking if file {output_file_path} exists")
-        if os.path.exists(output_file_path) or os.path.exists(not_found_file_path):
-            # Already downloaded
-            logger.DEBUG(f"{name} - Exists {index}. {url}")
+            self.reschedule(task, status_code, delay)
+
+    def reschedule(self, task, status_code, delay):
+        """
+        Puts a failed task back to the work queue to be retried after the
+        delay, unless it ran out of retries.
+
+        Args:
+            task(DownloadTask): Task that failed
+            status_code(int): Response status code or None if the request
+                              failed without a response
+            delay(float): No.of seconds to wait before retrying
+        """
+        max_attempts = self.max_retries if status_code is None \
+            else self.max_rate_limited_retries
+        if task.attempt >= max_attempts:
+            reason = task.error if status_code is None \
+                else f"status code {status_code}"
+            logger.INFO(f"Error downloading {task.url}: {reason}")
+            self.progress.add("failed")
             return
-        for attempt in range(1, self.max_retries + 1):
+        if status_code is not None:
+            logger.INFO(f"FAILED STATUS CODE {task.index}. {task.url} - "
+                        f"{status_code}, retrying in {delay:.1f}s")
+        # Jitter keeps the retries of a host from firing all at once
+        self.work_queue.retry(task, delay + random.random())
 
-            if failed:
-                # need this condition to avoid sleep for the first attempt
-                time.sleep(random.randint(0, 5))
+    def run_worker(self):
+        """
+        Downloads tasks from the work queue until all of them are done.
+        """
+        while True:
+            task = self.work_queue.get()
+            if task is None:
+                return
             try:
-                # Using fake user agents also didn't help to overcome
-                # request limits.
-                response = requests.get(url)
-
-                if response.status_code == 200:
-                    with open(output_file_path, 'w', encoding='utf-8') as file:
-                        file.write(response.text)
-                    logger.INFO(f"{name} - Downloaded {index}. {url}")
-                elif response.status_code == 404:
-                    with open(not_found_file_path, 'w', encoding='utf-8') as file:
-                        file.write("")
-                    logger.INFO(f"{name} - NOT FOUND {index}. {url}")
-                else:
-                    self.unexpected_status_code = True
-                    logger.INFO(f"{name} - FAILED STATUS CODE "
-                                f"{index}. {url} - {response.status_code}")
-
-                failed = False
+                self.download_url_and_save(task)
             except Exception as e:
-                logger.DEBUG(
-                    f"{name} - Error downloading {url}: {ex} - attempt {attempt}")
-                failed = True
-                ex = e
+                self.handle_task_error(task, e)
+            finally:
+                self.work_queue.task_done()
 
-            if not failed:
-                return
-        # If it has reached here, then retries had been exhausted, but the action
-        # was not completed
-        logger.INFO(f"{name} - Error downloading {url}: {ex}")
+    def handle_task_error(self, task, error):
+        """
+        Handles an unexpected error while downloading or storing the page
+        of a url, eg: a file that can't be written. The url is counted as
+        failed, so that a single url never stops the worker.
+
+        Args:
+            task(DownloadTask): Task of the url
+            error(Exception): Error
+        """
+        logger.ERROR(f"Error handling {task.index}. {task.url}: "
+                     f"{type(error).__name__}: {error}")
+        self.progress.add("failed")
+
+    def get_file_name_candidates(self, url):
+        """
+        Computes the preferred file names for the page source of the url.
+        The download manifest assigns the first one no other url has. With
+        a shard, the names only depend on the url itself, so that shards
+        that don't share a manifest never assign the same name to different
+        urls.
+
+        Args:
+            url(str): URL without the trailing slash
+
+        Returns: List of file names
+        """
+        # Different urls can end the same way, eg:
+        #  "https://www.engadget.com/2019/08/24/the-morning-after",
+        #  "https://www.engadget.com/2019/08/23/the-morning-after",
+        # so the whole path of the url is the fallback
+        rel_url_path = urlparse(url).path
+        path_name = re.sub(r'\/', '-', rel_url_path)
+        if self.shard is not None:
+            # Urls of different hosts can have the same path
+            url_hash = hashlib.sha1(url.encode("utf-8")).hexdigest()[:8]
+            return [path_name, f"{path_name}-{url_hash}"]
+        return [f"{url.split('/')[-1]}.html", path_name]
+
+    def is_downloaded(self, task):
+        """
+        Checks if the url was already handled by an earlier run.
+
+        Args:
+            task(DownloadTask): Task of the url
+
+        Returns: True if the url needn't be downloaded again
+        """
+        return self.manifest.get(task.url).status != STATUS_PENDING
+
+    def record_page(self, task, text, headers):
+        """
+        Records a downloaded page in the download manifest.
+
+        Args:
+            task(DownloadTask): Task of the downloaded url
+            text(str): Page source
+            headers(Mapping): Response headers
+        """
+        content = text.encode("utf-8")
+        self.manifest.record(task.url, STATUS_DOWNLOADED,
+                             etag=headers.get("ETag"),
+                             last_modified=headers.get("Last-Modified"),
+                             size=len(content),
+                             content_hash=file_digest(content))
+
+    def write_file(self, file_path, content):
+        """
+        Writes the content to the file.
+
+        Args:
+            file_path(str): File path
+            content(str): Content to be written
+        """
+        with open(file_path, 'w', encoding='utf-8') as file:
+            file.write(content)
+
+    def save_page(self, task, text):
+        """
+        Handles the page source of a downloaded url. By default it is saved
+        to the task's output file, or to the packed corpus if one is used.
+
+        Args:
+            task(DownloadTask): Task of the downloaded url
+            text(str): Page source
+        """
+        if self.corpus_writer is not None:
+            self.corpus_writer.add(
+                os.path.basename(task.output_file_path), text)
+            return
+        self.write_file(task.output_file_path, text)
+
+    def save_not_found(self, task):
+        """
+        Handles a url that doesn't exist. The download manifest keeps track
+        of it, so nothing is saved, except for a not found entry in the
+        packed corpus if one is used.
+
+        Args:
+            task(DownloadTask): Task of the url
+        """
+        if self.corpus_writer is not None:
+            self.corpus_writer.add(
+                os.path.basename(task.output_file_path), "", not_found=True)
+
+    async def async_download_url_and_save(self, session, task):
+        """
+        Asyncio counterpart of download_url_and_save. The file is written on
+        the default executor so that the event loop is never blocked on
+        disk I/O.
+
+        Args:
+            session(aiohttp.ClientSession): Session with the shared
+                                            connection pool
+            task(DownloadTask): Task of the url to be downloaded
+        """
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        host = urlparse(task.url).netloc
+        task.attempt += 1
+        status_code, retry_after, text, headers = None, None, None, None
+        await self.rate_controller.async_acquire(host)
+        try:
+            # The headers are looked up in the manifest, off the event loop
+            request_headers = await loop.run_in_executor(
+                None, self.get_request_headers, task)
+            async with session.get(task.url,
+                                   headers=request_headers) as response:
+                status_code = response.status
+                headers = response.headers
+                retry_after = headers.get("Retry-After")
+                if status_code == 200:
+                    text = await response.text(errors="replace")
+        except Exception as e:
+            status_code = None
+            task.error = e
+            logger.DEBUG(f"Error downloading {task.url}: {e} - "
+                         f"attempt {task.attempt}")
+        finally:
+            delay = self.rate_controller.release(host, status_code,
+                                                 retry_after)
+
+        if status_code == 200:
+            await loop.run_in_executor(None, self.save_page, task, text)
+            await loop.run_in_executor(None, self.record_page, task, text,
+                                       headers)
+            self.progress.add("downloaded", len(text.encode("utf-8")))
+            logger.INFO(f"Downloaded {task.index}. {task.url}",
+                        sample_key="downloaded")
+        elif status_code == 304:
+            await loop.run_in_executor(None, self.manifest.mark_unchanged,
+                                       task.url)
+            self.progress.add("unchanged")
+            logger.INFO(f"Unchanged {task.index}. {task.url}",
+                        sample_key="unchanged")
+        elif status_code == 404:
+            await loop.run_in_executor(None, self.save_not_found, task)
+            await loop.run_in_executor(None, self.manifest.record, task.url,
+                                       STATUS_NOT_FOUND)
+            self.progress.add("not_found")
+            logger.INFO(f"NOT FOUND {task.index}. {task.url}",
+                        sample_key="not_found")
+        else:
+            self.reschedule(task, status_code, delay)
+
+    async def async_execution(self):
+        """
+        Downloads the tasks of the work queue using a fixed no.of coroutines
+        that share one connection pool.
+        """
+        # Imported here so that aiohttp is needed, and asyncio is loaded, only
+        # by the async backend
+        import asyncio
+
+        import aiohttp
+
+        async def worker(session):
+            while True:
+                task = await self.work_queue.async_get()
+                if task is None:
+                    return
+                try:
+                    await self.async_download_url_and_save(session, task)
+                except Exception as e:
+                    self.handle_task_error(task, e)
+                finally:
+                    self.work_queue.task_done()
+
+        connector = aiohttp.TCPConnector(
+            limit=self.max_in_flight,
+            limit_per_host=self.max_connections_per_host)
+        timeout = aiohttp.ClientTimeout(total=constants.REQUEST_TIMEOUT)
+        async with aiohttp.ClientSession(connector=connector,
+                                         timeout=timeout) as session:
+            await asyncio.gather(*(worker(session)
+                                   for _ in range(self.max_in_flight)))
 
     def begin_execution(self):
         """
-        Method that starts execution by reading the urls file and then begins
-        to download the source HTML for those
+        Method that starts execution by streaming the urls file and then
+        begins to download the source HTML for those. The urls are read
+        only as fast as the workers take them, so the no.of urls in memory
+        is bounded by the no.of requests in flight.
         """
-        urls = []
-        with open(self.url_list_file, "r") as file:
-            data = file.read()
-            urls = data.splitlines()
+        self.work_queue = RetryingWorkQueue(
+            self.iter_tasks(iter_urls(self.url_list_file)))
+        self.progress.start()
+        try:
+            if self.backend == constants.DOWNLOAD_BACKEND_ASYNC:
+                import asyncio
 
-        logger.DEBUG("Total urls: %s" % len(urls))
+                self.rate_controller = HostRateController(
+                    max_limit=self.max_connections_per_host)
+                asyncio.run(self.async_execution())
+                return
 
-        # Create a ThreadPoolExecutor with the specified number of threads
-        with concurrent.futures.ThreadPoolExecutor(max_workers=self.num_threads) as executor:
-            # Download all URLs concurrently and save to files
-            executor.map(self.download_url_and_save,
-                         urls, range(1, (len(urls)+1)))
+            self.rate_controller = HostRateController(
+                max_limit=self.num_threads)
+            # Create a ThreadPoolExecutor with the specified number of threads
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.num_threads) as executor:
+                # Download all URLs concurrently and save to files
+                workers = [executor.submit(self.run_worker)
+                           for _ in range(self.num_threads)]
+                # Raises the error that stopped a worker, eg: a url list
+                # that can't be read
+                for worker in workers:
+                    worker.result()
+        finally:
+            self.progress.stop()
+            if self.corpus_writer is not None:
+                self.corpus_writer.close()
+            self.manifest.close()
 
 
-if __name__ == "__main__":
+def main(argv=None, prog=None):
+    """
+    Downloads the HTML source of the urls of the url list file.
+
+    Args:
+        argv(list): Command line arguments. Default: None (sys.argv)
+        prog(str): Program name in the usage message. Default: None
+    """
     parser = argparse.ArgumentParser(
+        prog=prog,
         description="A script to download HTML source for URLs")
     parser.add_argument("-o", "--save_dir",
                         help='relative (to the cwd) directory path that '
@@ -149,6 +654,8 @@ if __name__ == "__main__":
                         type=str, default=constants.RELATIVE_HTML_DIR_PATH)
     parser.add_argument("-f", "--url_list_file",
                         help='relative (to the cwd) file path for url list. '
+                             'A .gz file is decompressed on the fly and "-" '
+                             'reads the urls from the standard input. '
                              f'Default: {constants.RELATIVE_URL_LIST_FILE_PATH}',
                         type=str, default=constants.RELATIVE_URL_LIST_FILE_PATH)
     parser.add_argument("-r", "--max_retries",
@@ -160,16 +667,89 @@ if __name__ == "__main__":
                         help=f"No.of worker threads to use. "
                              f"Default: {constants.MAX_THREADS}",
                              type=int, default=constants.MAX_THREADS)
+    parser.add_argument("-b", "--backend",
+                        help="Download backend. 'async' downloads on a single "
+                             "thread with asyncio and pooled keep-alive "
+                             "connections. "
+                             f"Default: {constants.DOWNLOAD_BACKEND_THREAD}",
+                        choices=[constants.DOWNLOAD_BACKEND_THREAD,
+                                 constants.DOWNLOAD_BACKEND_ASYNC],
+                        default=constants.DOWNLOAD_BACKEND_THREAD)
+    parser.add_argument("--max_in_flight",
+                        help="Max no.of simultaneous requests with the async "
+                             "backend. "
+                             f"Default: {constants.MAX_IN_FLIGHT_REQUESTS}",
+                        type=int, default=constants.MAX_IN_FLIGHT_REQUESTS)
+    parser.add_argument("--max_connections_per_host",
+                        help="Max no.of simultaneous connections to a single "
+                             "host with the async backend. "
+                             f"Default: {constants.MAX_CONNECTIONS_PER_HOST}",
+                        type=int, default=constants.MAX_CONNECTIONS_PER_HOST)
+    parser.add_argument("-p", "--corpus_file",
+                        help="relative (to the cwd) file path of a packed "
+                             "corpus segment to append the HTML sources to, "
+                             "instead of saving one file per url under "
+                             "--save_dir. Eg: "
+                             f"{constants.RELATIVE_PACKED_CORPUS_FILE_PATH}",
+                        type=str, default=None)
+    parser.add_argument("-m", "--manifest_file",
+                        help="relative (to the cwd) file path of the download "
+                             "manifest that keeps the state of every url, so "
+                             "that reruns resume where the last run stopped. "
+                             f"Default: {constants.RELATIVE_DOWNLOAD_MANIFEST_FILE_PATH}",
+                        type=str,
+                        default=constants.RELATIVE_DOWNLOAD_MANIFEST_FILE_PATH)
+    parser.add_argument("--refresh",
+                        help="Fetch the urls that were already downloaded "
+                             "again, conditionally, so that only the pages "
+                             "that changed are transferred and rewritten",
+                        required=False, action='store_true')
+    parser.add_argument("--shard",
+                        help="Download only the urls of the i-th (0 based) "
+                             "of N shards of the url list, given as i/N, eg: "
+                             "to split the list across downloader instances. "
+                             "Use a separate --manifest_file per shard. The "
+                             "shards can share --save_dir, the page of a url "
+                             "is named after its path. "
+                             "Default: all the urls",
+                        type=parse_shard, default=None)
+    parser.add_argument("--progress_interval",
+                        help="Seconds between two progress checkpoints. "
+                             f"Default: {constants.PROGRESS_INTERVAL}",
+                        type=float, default=constants.PROGRESS_INTERVAL)
+    parser.add_argument("--progress_file",
+                        help="relative (to the cwd) file path of a JSON file "
+                             "the latest progress checkpoint is written to. "
+                             "Default: None",
+                        type=str, default=None)
     parser.add_argument("-d", "--debug", help="Enable debug messages",
                         required=False, action='store_true')
+    parser.add_argument("--quiet",
+                        help="Leave out the per-url messages, eg: for bulk "
+                             "runs",
+                        required=False, action='store_true')
 
-    parsed_args = parser.parse_args()
-    if parsed_args.debug:
-        logger.setup_logging(log_level="DEBUG")
+    parsed_args = parser.parse_args(argv)
+    if parsed_args.debug or parsed_args.quiet:
+        logger.setup_logging(log_level="DEBUG" if parsed_args.debug else "INFO",
+                             quiet=parsed_args.quiet)
     downloader = PageSourceDownloader(
         url_list_file=parsed_args.url_list_file,
         save_dir=parsed_args.save_dir,
         max_retries=parsed_args.max_retries,
-        num_threads=parsed_args.num_threads
+        num_threads=parsed_args.num_threads,
+        backend=parsed_args.backend,
+        max_in_flight=parsed_args.max_in_flight,
+        max_connections_per_host=parsed_args.max_connections_per_host,
+        corpus_file=parsed_args.corpus_file,
+        manifest_file=parsed_args.manifest_file,
+        refresh=parsed_args.refresh,
+        shard=parsed_args.shard,
+        progress_interval=parsed_args.progress_interval,
+        progress_file=parsed_args.progress_file
     )
     downloader.begin_execution()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+A script to merge the partial counts written by sharded word_analyzer.py runs
+(see word_analyzer.py --shard) into the top words of the whole corpus.
+"""
+import argparse
+import glob
+import json
+import os
+
+import lib.constants as constants
+import lib.logger as logger
+from lib.partial_counts import PARTIAL_COUNTS_EXTENSION, PartialCounts
+
+
+def merge_partial_counts(file_paths):
+    """
+    Merges partial count files. Every shard must be covered by only one of
+    the files, since which of two overlapping files (eg: a merged file and
+    the file of one of its shards) should win can't be told from them.
+
+    Args:
+        file_paths(list): Partial count file paths
+
+    Returns: lib.partial_counts.PartialCounts of the merged files
+
+    Raises:
+        ValueError: If the files overlap, have an unsupported format or
+                    were computed with different settings
+    """
+    merged = None
+    # Shard -> file path of the file that covers it
+    shard_files = {}
+    for file_path in file_paths:
+        partial_counts = PartialCounts.load(file_path)
+        overlap = sorted(shard for shard in partial_counts.shards
+                         if shard in shard_files)
+        if overlap:
+            raise ValueError(
+                f"Shards {overlap} of {file_path} are already covered by "
+                f"{', '.join(sorted({shard_files[shard] for shard in overlap}))}"
+                f", give each shard only once")
+        for shard in partial_counts.shards:
+            shard_files[shard] = file_path
+        if merged is None:
+            merged = partial_counts
+            continue
+        merged.merge(partial_counts)
+    if merged is None:
+        raise ValueError("No partial count files to merge")
+    missing_shards = merged.missing_shards()
+    if missing_shards:
+        logger.ERROR(f"Shards {missing_shards} of {merged.num_shards} are "
+                     f"missing, the counts are incomplete")
+    return merged
+
+
+def main(argv=None, prog=None):
+    """
+    Merges the partial counts of sharded runs.
+
+    Args:
+        argv(list): Command line arguments. Default: None (sys.argv)
+        prog(str): Program name in the usage message. Default: None
+    """
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        description="A script to merge the partial counts of sharded word "
+                    "frequency runs")
+    parser.add_argument("partial_files", nargs="*",
+                        help="relative (to the cwd) partial count file paths. "
+                             "Default: every partial count file under "
+                             f"{constants.RELATIVE_PARTIAL_COUNTS_DIR_PATH}")
+    parser.add_argument("-c", "--count",
+                        help=f"Count of top words needed. If not specified in the "
+                             "command line, checks for TOP_WORD_COUNT ENV variable. "
+                             f"Default: {constants.TOP_WORD_COUNT}",
+                             type=int,
+                             default=os.environ.get("TOP_WORD_COUNT", constants.TOP_WORD_COUNT))
+    parser.add_argument("-o", "--output",
+                        help="relative (to the cwd) file path to write the "
+                             "merged partial counts to, eg: to merge them "
+                             "again with the counts of other shards later. "
+                             "Default: None",
+                        type=str, default=None)
+
+    parsed_args = parser.parse_args(argv)
+    partial_files = parsed_args.partial_files or sorted(glob.glob(os.path.join(
+        constants.RELATIVE_PARTIAL_COUNTS_DIR_PATH,
+        f"*{PARTIAL_COUNTS_EXTENSION}")))
+    try:
+        merged = merge_partial_counts(partial_files)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    logger.INFO(f"Merged {len(merged.shards)} of {merged.num_shards} shards "
+                f"({merged.num_files} files)")
+    if parsed_args.output:
+        merged.save(parsed_args.output)
+    result = merged.get_top_words(count=int(parsed_args.count))
+
+    logger.INFO("Top {count} words are: {data}".format(
+        count=parsed_args.count,
+        data=json.dumps(result, indent=2)
+    ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+A script to pack a directory (or a zip archive) of downloaded HTML files into
+a single packed corpus segment that word_analyzer.py can read in place.
+"""
+import argparse
+import os
+
+import lib.constants as constants
+import lib.logger as logger
+from lib.corpus import NOT_FOUND_PREFIX, PackedCorpusWriter, open_corpus
+
+
+def pack_corpus(source_path, corpus_file):
+    """
+    Appends every document of the source corpus that is not yet part of the
+    packed corpus.
+
+    Args:
+        source_path(str): Directory, zip archive or packed segment file path
+        corpus_file(str): Packed corpus segment file path
+
+    Returns: No.of documents added
+    """
+    source = open_corpus(source_path)
+    added = 0
+    with PackedCorpusWriter(corpus_file) as writer:
+        for name in source.names():
+            if name in writer:
+                continue
+            writer.add(name, source.read_bytes(name))
+            added += 1
+        if os.path.isdir(source_path):
+            # Not found markers are skipped by the corpus readers, but the
+            # packed corpus keeps track of them so that the downloader
+            # doesn't fetch those urls again.
+            with os.scandir(source_path) as entries:
+                for entry in entries:
+                    name = entry.name[len(NOT_FOUND_PREFIX):]
+                    if entry.name.startswith(NOT_FOUND_PREFIX) and \
+                            name not in writer:
+                        writer.add(name, b"", not_found=True)
+    return added
+
+
+def main(argv=None, prog=None):
+    """
+    Packs html files into a packed corpus segment.
+
+    Args:
+        argv(list): Command line arguments. Default: None (sys.argv)
+        prog(str): Program name in the usage message. Default: None
+    """
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        description="A script to pack downloaded HTML files into a packed "
+                    "corpus segment")
+    parser.add_argument("-s", "--source_path",
+                        help='relative (to the cwd) directory path that '
+                             'contains html files, or a zip archive of it. '
+                             f"Default: {constants.RELATIVE_HTML_DIR_PATH}",
+                        type=str, default=constants.RELATIVE_HTML_DIR_PATH)
+    parser.add_argument("-p", "--corpus_file",
+                        help="relative (to the cwd) file path of the packed "
+                             "corpus segment. "
+                             f"Default: {constants.RELATIVE_PACKED_CORPUS_FILE_PATH}",
+                        type=str,
+                        default=constants.RELATIVE_PACKED_CORPUS_FILE_PATH)
+
+    parsed_args = parser.parse_args(argv)
+    count = pack_corpus(parsed_args.source_path, parsed_args.corpus_file)
+    logger.INFO(f"Packed {count} files into {parsed_args.corpus_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,405 @@
+"""
+A script that downloads the HTML source for the list of urls and analyzes
+their word frequency as a single streaming pipeline. Pages are counted while
+other pages are still being downloaded and storing the HTML files is
+optional.
+"""
+import argparse
+import concurrent.futures
+import json
+import os
+import queue
+import threading
+
+import lib.constants as constants
+import lib.logger as logger
+from lib.manifest import STATUS_DOWNLOADED, STATUS_NOT_FOUND
+from scripts.download_data import PageSourceDownloader
+from scripts.word_analyzer import (WordFrequencyProcessor, _count_html,
+                                   _init_worker)
+
+
+class StreamingPageSourceDownloader(PageSourceDownloader):
+    """Downloader that hands the downloaded page sources over to a queue
+    instead of (or in addition to) saving them to files.
+    """
+
+    def __init__(self, page_queue, persist_html=False, **kwargs):
+        """
+        Constructor
+
+        Args:
+            page_queue(queue.Queue): Bounded queue the page sources are put
+                                     into
+            persist_html(bool): Whether the page sources should also be saved
+                                to files like PageSourceDownloader does.
+                                Default: False
+            kwargs(dict): Arguments for PageSourceDownloader
+        """
+        # Set first, since the constructor of PageSourceDownloader creates
+        # the save dir only if the page sources are persisted
+        self.page_queue = page_queue
+        self.persist_html = persist_html
+        super().__init__(**kwargs)
+
+    def create_save_dir(self):
+        if self.persist_html:
+            super().create_save_dir()
+
+    def list_earlier_downloads(self):
+        if not self.persist_html:
+            return {}
+        return super().list_earlier_downloads()
+
+    def is_downloaded(self, task):
+        status = self.manifest.get(task.url).status
+        # Nothing is stored without persist_html, so every url has to be
+        # fetched except the ones known not to exist. The pages saved by an
+        # earlier run are fed from the disk by the workers, see
+        # feed_stored_page.
+        return status == STATUS_NOT_FOUND
+
+    def feed_stored_page(self, task):
+        """
+        Feeds the page saved by an earlier run to the parsers instead of
+        fetching it again, so that the result still covers every url. Done
+        by the worker that took the url, so that blocking on a full queue
+        only holds up that worker, not the work queue's iterator that every
+        worker takes new urls from.
+
+        Args:
+            task(DownloadTask): Task of the url
+
+        Returns: True if the page was fed from the disk
+        """
+        if not self.persist_html or \
+                self.manifest.get(task.url).status != STATUS_DOWNLOADED or \
+                not os.path.exists(task.output_file_path):
+            return False
+        with open(task.output_file_path, "r", encoding="utf-8") as file:
+            self.page_queue.put(file.read())
+        logger.DEBUG(f"Exists {task.index}. {task.url}", sample_key="exists")
+        self.progress.add("exists")
+        return True
+
+    def download_url_and_save(self, task):
+        if not self.feed_stored_page(task):
+            super().download_url_and_save(task)
+
+    async def async_download_url_and_save(self, session, task):
+        import asyncio
+
+        # The file is read and queued off the event loop
+        if not await asyncio.get_running_loop().run_in_executor(
+                None, self.feed_stored_page, task):
+            await super().async_download_url_and_save(session, task)
+
+    def record_page(self, task, text, headers):
+        # A page that isn't stored must not be recorded as downloaded, or a
+        # later run sharing the manifest would skip it
+        if self.persist_html:
+            super().record_page(task, text, headers)
+
+    def save_page(self, task, text):
+        if self.persist_html:
+            super().save_page(task, text)
+        # Blocks while the queue is full, which keeps the downloads from
+        # running ahead of the parsers
+        self.page_queue.put(text)
+
+    def save_not_found(self, task):
+        if self.persist_html:
+            super().save_not_found(task)
+
+
+class StreamingPipeline(object):
+    def __init__(self, url_list_file, save_dir=constants.RELATIVE_HTML_DIR_PATH,
+                 persist_html=False,
+                 manifest_file=constants.RELATIVE_DOWNLOAD_MANIFEST_FILE_PATH,
+                 word_bank_file_path=None,
+                 max_retries=constants.MAX_RETRIES_TO_GET_URL_CONTENT,
+                 num_threads=constants.MAX_THREADS,
+                 backend=constants.DOWNLOAD_BACKEND_THREAD,
+                 num_parsers=os.cpu_count(),
+                 executor=constants.EXECUTOR_THREAD,
+                 queue_size=constants.PIPELINE_QUEUE_SIZE,
+                 top_k_capacity=None):
+        """
+        Constructor
+
+        Args:
+            url_list_file(str): Relative file path that contains list of urls
+                                to be fetched
+            save_dir(str): Directory where the source HTML for the files is
+                           stored when persist_html is set.
+                           Default: data/downloaded_files
+            persist_html(bool): Whether the page sources should also be saved
+                                to files. Default: False
+            manifest_file(str): Path of the download manifest (see
+                                lib.manifest). It keeps the urls that don't
+                                exist across runs, so that they are not
+                                fetched again, and the pages saved when
+                                persist_html is set.
+                                Default: data/download_manifest.sqlite
+            word_bank_file_path(str): Relative (to the cwd) file path for the
+                                      word bank. Default: None
+            max_retries(int): Max no.of retries to be done if HTTP GET for any
+                              url fails without a response. Default: 5
+            num_threads(int): No.of worker threads used to download.
+                              Default: 30
+            backend(str): Download backend, "thread" or "async".
+                          Default: thread
+            num_parsers(int): No.of worker threads (or processes with the
+                              process executor) used to count the pages.
+                              Default: no.of cores
+            executor(str): "thread" or "process". Default: thread
+            queue_size(int): Max no.of downloaded pages waiting to be counted.
+                             Default: 100
+            top_k_capacity(int): Use the bounded-memory approximate top-K mode
+                                 that tracks at most this many words.
+                                 Default: None
+        """
+        self.page_queue = queue.Queue(maxsize=queue_size)
+        self.queue_size = queue_size
+        self.num_parsers = num_parsers
+        self.executor = executor
+        self.pages_processed = 0
+        self.processor = WordFrequencyProcessor(
+            html_files_dir_path=save_dir,
+            word_bank_file_path=word_bank_file_path,
+            num_threads=num_parsers, executor=executor,
+            top_k_capacity=top_k_capacity)
+        self.downloader = StreamingPageSourceDownloader(
+            page_queue=self.page_queue, persist_html=persist_html,
+            save_dir=save_dir, url_list_file=url_list_file,
+            manifest_file=manifest_file, max_retries=max_retries, num_threads=num_threads, backend=backend)
+
+    def run_parser(self):
+        """
+        Counts the pages from the queue until the end of the stream.
+        """
+        while True:
+            html_content = self.page_queue.get()
+            if html_content is None:
+                return
+            try:
+                self.processor.process_file_content(html_content)
+            except Exception as e:
+                logger.ERROR(f"Error processing a page: {e}")
+            with self.processor.counter_lock:
+                self.pages_processed += 1
+
+    def run_dispatcher(self, pool):
+        """
+        Hands the pages from the queue over to the worker processes until
+        the end of the stream, keeping at most queue_size pages in flight.
+
+        Args:
+            pool(concurrent.futures.ProcessPoolExecutor): Worker processes
+        """
+        in_flight = threading.BoundedSemaphore(self.queue_size)
+
+        def on_counted(future):
+            try:
+                counter, extractor_stats = future.result()
+                self.processor.add_counts(counter)
+                self.processor.extractor.merge_stats(extractor_stats)
+            except Exception as e:
+                logger.ERROR(f"Error processing a page: {e}")
+            with self.processor.counter_lock:
+                self.pages_processed += 1
+            in_flight.release()
+
+        while True:
+            html_content = self.page_queue.get()
+            if html_content is None:
+                return
+            in_flight.acquire()
+            pool.submit(_count_html, html_content).add_done_callback(
+                on_counted)
+
+    def get_top_words(self, count):
+        """
+        Returns the top words of the pages processed so far. Can be called
+        while the pipeline is running.
+
+        Args:
+            count(int): Count of top no.of words needed
+
+        Returns:
+            List of top (word, no_of_occurences) pairs
+        """
+        with self.processor.counter_lock:
+            return self.processor.get_top_words(count)
+
+    def begin_execution(self, report_count=constants.TOP_WORD_COUNT,
+                        report_interval=None):
+        """
+        Downloads and counts all the pages.
+
+        Args:
+            report_count(int): Count of top words logged periodically.
+                               Default: 10
+            report_interval(float): Seconds between the logs of the running
+                                    top words. Default: None (no logs)
+        """
+        done = threading.Event()
+
+        def report():
+            while not done.wait(report_interval):
+                logger.INFO(f"Running top {report_count} words after "
+                            f"{self.pages_processed} pages: "
+                            f"{self.get_top_words(report_count)}")
+
+        pool = None
+        if self.executor == constants.EXECUTOR_PROCESS:
+            pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.num_parsers, initializer=_init_worker,
+                initargs=(self.processor.html_files_dir_path,
+                          self.processor.word_bank, None,
+                          logger.get_settings()))
+            consumers = [threading.Thread(target=self.run_dispatcher,
+                                          args=(pool,))]
+        else:
+            consumers = [threading.Thread(target=self.run_parser)
+                         for _ in range(self.num_parsers)]
+        if report_interval:
+            consumers.append(threading.Thread(target=report, daemon=True))
+        for consumer in consumers:
+            consumer.start()
+
+        try:
+            self.downloader.begin_execution()
+        finally:
+            for _ in range(len(consumers)):
+                self.page_queue.put(None)
+            done.set()
+            for consumer in consumers:
+                consumer.join()
+            if pool is not None:
+                pool.shutdown(wait=True)
+        logger.INFO(f"Processed {self.pages_processed} pages")
+        self.processor.log_extractor_stats()
+
+
+def main(argv=None, prog=None):
+    """
+    Downloads the urls and analyzes their word frequency in a single pass.
+
+    Args:
+        argv(list): Command line arguments. Default: None (sys.argv)
+        prog(str): Program name in the usage message. Default: None
+    """
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        description="A script to download and analyze word frequency of "
+                    "the URLs in a single streaming pass")
+    parser.add_argument("-f", "--url_list_file",
+                        help='relative (to the cwd) file path for url list. '
+                             f'Default: {constants.RELATIVE_URL_LIST_FILE_PATH}',
+                        type=str, default=constants.RELATIVE_URL_LIST_FILE_PATH)
+    parser.add_argument("-o", "--save_dir",
+                        help='relative (to the cwd) directory path that '
+                             'should store HTML source files of the urls when '
+                             '--persist_html is given. '
+                             f"Default: {constants.RELATIVE_HTML_DIR_PATH}",
+                        type=str, default=constants.RELATIVE_HTML_DIR_PATH)
+    parser.add_argument("--persist_html",
+                        help="Also save the HTML source files, and count the "
+                             "files saved by earlier runs instead of fetching "
+                             "them again",
+                        required=False, action='store_true')
+    parser.add_argument("-m", "--manifest_file",
+                        help="relative (to the cwd) file path of the download "
+                             "manifest that keeps the urls that don't exist, "
+                             "and the pages saved with --persist_html, across "
+                             "runs. "
+                             f"Default: {constants.RELATIVE_DOWNLOAD_MANIFEST_FILE_PATH}",
+                        type=str,
+                        default=constants.RELATIVE_DOWNLOAD_MANIFEST_FILE_PATH)
+    parser.add_argument("-w", "--word_bank_file_path",
+                        help='relative (to the cwd) file path for word bank. '
+                             'Default: None',
+                        type=str, default=None)
+    parser.add_argument("-c", "--count",
+                        help=f"Count of top words needed. If not specified in the "
+                             "command line, checks for TOP_WORD_COUNT ENV variable. "
+                             f"Default: {constants.TOP_WORD_COUNT}",
+                             type=int,
+                             default=os.environ.get("TOP_WORD_COUNT", constants.TOP_WORD_COUNT))
+    parser.add_argument("-r", "--max_retries",
+                        help=f"Max no.of retries on failures to get a response "
+                        "from the server to fetch URL source content. "
+                             f"Default: {constants.MAX_RETRIES_TO_GET_URL_CONTENT}",
+                             type=int, default=constants.MAX_RETRIES_TO_GET_URL_CONTENT)
+    parser.add_argument("-n", "--num_threads",
+                        help=f"No.of worker threads to download with. "
+                             f"Default: {constants.MAX_THREADS}",
+                             type=int, default=constants.MAX_THREADS)
+    parser.add_argument("-b", "--backend",
+                        help="Download backend. "
+                             f"Default: {constants.DOWNLOAD_BACKEND_THREAD}",
+                        choices=[constants.DOWNLOAD_BACKEND_THREAD,
+                                 constants.DOWNLOAD_BACKEND_ASYNC],
+                        default=constants.DOWNLOAD_BACKEND_THREAD)
+    parser.add_argument("-j", "--num_parsers",
+                        help="No.of worker threads (or processes with the "
+                             "process executor) to count the pages with. "
+                             "Default: no.of cores",
+                        type=int, default=os.cpu_count())
+    parser.add_argument("-e", "--executor",
+                        help="Executor used to count the pages. "
+                             f"Default: {constants.EXECUTOR_THREAD}",
+                        choices=[constants.EXECUTOR_THREAD,
+                                 constants.EXECUTOR_PROCESS],
+                        default=constants.EXECUTOR_THREAD)
+    parser.add_argument("-q", "--queue_size",
+                        help="Max no.of downloaded pages waiting to be "
+                             "counted. "
+                             f"Default: {constants.PIPELINE_QUEUE_SIZE}",
+                        type=int, default=constants.PIPELINE_QUEUE_SIZE)
+    parser.add_argument("-i", "--report_interval",
+                        help="Seconds between the logs of the running top "
+                             "words. Default: no running reports",
+                        type=float, default=None)
+    parser.add_argument("-k", "--top_k_capacity",
+                        help="Use the bounded-memory approximate top-K mode "
+                             "that tracks at most this many words. "
+                             "Default: exact counting",
+                        type=int, default=None)
+    parser.add_argument("-d", "--debug", help="Enable debug messages",
+                        required=False, action='store_true')
+    parser.add_argument("--quiet",
+                        help="Leave out the per-page messages, eg: for bulk "
+                             "runs",
+                        required=False, action='store_true')
+
+    parsed_args = parser.parse_args(argv)
+    if parsed_args.debug or parsed_args.quiet:
+        logger.setup_logging(log_level="DEBUG" if parsed_args.debug else "INFO",
+                             quiet=parsed_args.quiet)
+    pipeline = StreamingPipeline(
+        url_list_file=parsed_args.url_list_file,
+        save_dir=parsed_args.save_dir,
+        persist_html=parsed_args.persist_html,
+        manifest_file=parsed_args.manifest_file,
+        word_bank_file_path=parsed_args.word_bank_file_path,
+        max_retries=parsed_args.max_retries,
+        num_threads=parsed_args.num_threads,
+        backend=parsed_args.backend,
+        num_parsers=parsed_args.num_parsers,
+        executor=parsed_args.executor,
+        queue_size=parsed_args.queue_size,
+        top_k_capacity=parsed_args.top_k_capacity)
+    pipeline.begin_execution(report_count=parsed_args.count,
+                             report_interval=parsed_args.report_interval)
+    result = pipeline.get_top_words(count=parsed_args.count)
+
+    logger.INFO("Top {count} words are: {data}".format(
+        count=parsed_args.count,
+        data=json.dumps(result, indent=2)
+    ))
+
+
+if __name__ == "__main__":
+    main()
@@ -4,36 +4,195 @@ A script to analyze word frequency of displayable content in HTML files
 import argparse
 import concurrent.futures
 import json
-import re
 import os
-# lxml quirk to explicitly import subpackage
-import lxml.html
 import threading
-from collections import Counter
-from bs4 import BeautifulSoup
+from collections import Counter, defaultdict
 
 import lib.constants as constants
 import lib.logger as logger
+from lib.corpus import open_corpus
+from lib.count_cache import FileCountCache, file_digest
+from lib.date_partitions import UNDATED, DatePartitions, date_of, parse_date
+from lib.extractor import EXTRACTOR_VERSION, ContentExtractor
+from lib.fingerprint import FingerprintIndex, simhash
+from lib.heavy_hitters import SpaceSaving
+from lib.manifest import DownloadManifest
+from lib.partial_counts import PartialCounts, partial_counts_file_name
+from lib.reports import load_report_specs, union_word_bank
+from lib.scheduler import iter_batches, run_bounded
+from lib.sharding import in_shard, parse_shard
+from lib.text_cache import ExtractedTextCache
+from lib.tokenizer import TokenCounter
+from lib.word_bank import TOKEN_PATTERN, WordBank
 
 
 class WordFrequencyProcessor(object):
 
     def __init__(self, html_files_dir_path, word_bank_file_path=None,
-                 num_threads=constants.MAX_THREADS):
-        """Constructor"""
+                 num_threads=constants.MAX_THREADS,
+                 compiled_word_bank_file_path=None,
+                 executor=constants.EXECUTOR_THREAD,
+                 count_cache_file_path=None,
+                 top_k_capacity=None,
+                 text_cache_dir_path=None,
+                 shard=None,
+                 max_bytes_in_flight=constants.MAX_BYTES_IN_FLIGHT,
+                 word_bank=None,
+                 dedup=None,
+                 fingerprint_file_path=None,
+                 partitions_file_path=None,
+                 manifest_file_path=None):
+        """
+        Constructor
+
+        Args:
+            html_files_dir_path(str): Directory that contains the html files.
+                                      A zip archive of the directory or a
+                                      packed corpus segment file is read in
+                                      place as well.
+            word_bank_file_path(str): Relative (to the cwd) file path for the
+                                      word bank. Default: None
+            num_threads(int): No.of worker threads to use. Default: 30
+            compiled_word_bank_file_path(str): Relative (to the cwd) file path
+                                               where the compiled word bank is
+                                               cached across runs.
+                                               Default: None
+            executor(str): "thread" or "process". Selects whether the files
+                           are processed by a pool of threads or a pool of
+                           worker processes. Default: thread
+            count_cache_file_path(str): Relative (to the cwd) file path of the
+                                        per-file word count cache. When given,
+                                        only new or modified files are parsed.
+                                        Default: None
+            top_k_capacity(int): When given, words are counted by a bounded
+                                 memory heavy hitters sketch that tracks at
+                                 most this many words, instead of an exact
+                                 counter of the whole vocabulary.
+                                 Default: None
+            text_cache_dir_path(str): Relative (to the cwd) directory path of
+                                      the extracted text cache. When given,
+                                      pages extracted by earlier runs are
+                                      only tokenized, not parsed again.
+                                      Default: None
+            shard(tuple): (index, num_shards) tuple. When given, only the
+                          files of the shard are processed (see
+                          lib.sharding), eg: to split the analysis across
+                          machines and merge the partial counts later.
+                          Default: None
+            max_bytes_in_flight(int): Max no.of bytes of the files handed
+                                      over to the workers at a time.
+                                      Default: 256 MiB
+            word_bank(lib.word_bank.WordBank): Word bank to use when no word
+                                               bank file path is given, eg:
+                                               the union of the word banks
+                                               of several reports.
+                                               Default: None
+            dedup(str): "exact" or "near". When given, only the first of
+                        the files with the same content ("exact") or with
+                        near-identical article text ("near") is counted,
+                        see lib.fingerprint. Exact copies are skipped
+                        without being parsed. Near duplicate detection needs
+                        the thread executor. Default: None
+            fingerprint_file_path(str): Relative (to the cwd) file path
+                                        where the fingerprints of the files
+                                        are kept across runs, so that the
+                                        unchanged files are deduplicated
+                                        without being read or parsed.
+                                        Default: None (next to the count
+                                        cache file with the .fingerprints
+                                        suffix if one is given, else the
+                                        fingerprints are kept in memory
+                                        only)
+            partitions_file_path(str): Relative (to the cwd) file path of
+                                       the word counts per publish day (see
+                                       lib.date_partitions), written by
+                                       process_all_files. Default: None
+            manifest_file_path(str): Relative (to the cwd) file path of the
+                                     download manifest, to find the url, and
+                                     so the publish day, of each file.
+                                     Default: None (the day is taken from
+                                     the file name)
+        """
 
         self.counter = Counter()
+        # Word count vector of the files counted in batches
+        self.token_counter = None
+        self.heavy_hitters = None
+        if top_k_capacity:
+            self.heavy_hitters = SpaceSaving(top_k_capacity)
         self.html_files_dir_path = html_files_dir_path
+        self._corpus = None
+        self.text_cache_dir_path = None
+        text_cache = None
+        if text_cache_dir_path:
+            self.text_cache_dir_path = os.path.join(
+                os.getcwd(), text_cache_dir_path)
+            text_cache = ExtractedTextCache(self.text_cache_dir_path)
+        self.extractor = ContentExtractor(text_cache=text_cache)
         self.num_threads = num_threads
-        self.word_bank = []
+        self.shard = shard
+        self.max_bytes_in_flight = max_bytes_in_flight
+        # No.of files processed by the last process_all_files
+        self.num_files = 0
+        self.executor = executor
+        self.count_cache_file_path = None
+        if count_cache_file_path:
+            self.count_cache_file_path = os.path.join(
+                os.getcwd(), count_cache_file_path)
+        self.word_bank = word_bank
+        self.dedup = dedup
+        self.fingerprints = None
+        if dedup:
+            if dedup == constants.DEDUP_NEAR and \
+                    executor == constants.EXECUTOR_PROCESS:
+                raise ValueError("Near duplicate detection needs the thread "
+                                 "executor")
+            if fingerprint_file_path:
+                fingerprint_file_path = os.path.join(
+                    os.getcwd(), fingerprint_file_path)
+            elif self.count_cache_file_path:
+                # The duplicates never get into the count cache, so without
+                # their fingerprints the near duplicates would be parsed
+                # again on every run
+                fingerprint_file_path = self.count_cache_file_path + \
+                    constants.FINGERPRINT_FILE_SUFFIX
+            self.fingerprints = FingerprintIndex(
+                fingerprint_file_path,
+                settings_key=f"{EXTRACTOR_VERSION}|{TOKEN_PATTERN.pattern}")
+        self.partitions_file_path = None
+        if partitions_file_path:
+            self.partitions_file_path = os.path.join(
+                os.getcwd(), partitions_file_path)
+        # File name -> publish day, of the files downloaded with a manifest
+        self.file_days = {}
+        if manifest_file_path:
+            manifest = DownloadManifest(os.path.join(
+                os.getcwd(), manifest_file_path))
+            self.file_days = {entry.file_name: date_of(entry.url)
+                              for entry in manifest.iter_entries()}
+            manifest.close()
+        # Publish day -> word counts and no.of files of the day
+        self.day_counters = defaultdict(Counter)
+        self.day_files = Counter()
         # Create a lock to protect the counter
         self.counter_lock = threading.Lock()
         # Handle if word bank file is given
         if word_bank_file_path:
             word_bank_file_path = os.path.join(
                 os.getcwd(), word_bank_file_path)
-            with open(word_bank_file_path, "r", encoding="utf-8") as file:
-                self.word_bank = file.read().splitlines()
+            if compiled_word_bank_file_path:
+                compiled_word_bank_file_path = os.path.join(
+                    os.getcwd(), compiled_word_bank_file_path)
+            self.word_bank = WordBank.load(
+                word_bank_file_path,
+                compiled_file_path=compiled_word_bank_file_path)
+
+    @property
+    def corpus(self):
+        """Corpus of the html files, opened on first use"""
+        if self._corpus is None:
+            self._corpus = open_corpus(self.html_files_dir_path)
+        return self._corpus
 
     def tokenize_and_clean(self, text):
         """
@@ -48,56 +207,49 @@ class WordFrequencyProcessor(object):
         Returns: List of words
         """
 
-        words = re.findall(r'\b[a-z]{3,}\b', text.lower())
-        if self.word_bank:
-            words = list(filter(lambda word: word in self.word_bank, words))
-        return words
+        if self.word_bank is not None:
+            return self.word_bank.tokenize(text)
+        return TOKEN_PATTERN.findall(text.lower())
 
-    def retrieve_text(self, html_content):
-        parsed_html = lxml.html.fromstring(html_content)
-
-        # Different HTML pages follow different structure but they typically
-        # fall under one of the below expected structures. Whenever a new structure
-        # is encountered, here is where th logic should be updated/
-
-        # 1. Process by xpath
-        elements = parsed_html.xpath('//div[@class="caas-content-wrapper"]')
-        if len(elements) and len(elements) == 1:
-            return elements[0].text_content()
+    def retrieve_text(self, html_content, digest=None):
+        """
+        Extracts the displayable article content of the page. See
+        lib.extractor for the structures that are handled.
 
-        # 2. Process by another xpath
-        elements = parsed_html.xpath('//section[@class="articles"]')
-        if len(elements) and len(elements) == 1:
-            return elements[0].text_content()
+        Args:
+            html_content(str or bytes): HTML file content
+            digest(str): Content hash of the page for the text cache.
+                         Default: None (computed when needed)
 
-        # 3. Process by another xpath
-        elements = parsed_html.xpath('//main[@class="W(100%)"]')
-        if len(elements) and len(elements) == 1:
-            return elements[0].text_content()
+        Returns: Text
+        """
+        return self.extractor.extract(html_content, digest=digest)
 
-        # 4. Process using BeautifulSoap
-        soup = BeautifulSoup(html_content, 'html.parser')
-        all_text = soup.get_text()
+    def log_extractor_stats(self):
+        """
+        Logs the hit count and the time spent by each extraction strategy,
+        to find the slow or rarely matching ones.
+        """
+        for line in self.extractor.report():
+            logger.INFO(f"Extraction {line}")
 
-        # 4a. Try regex1
-        match = re.search(r'Read full article(.+)Latest Stories', all_text)
-        if match:
-            return match.group(1)
+    def count_words(self, html_content, digest=None):
+        """
+        This method accepts the html source file content, then extracts
+        only the relevant content, then tokenize the content into words and
+        returns the word frequency of that content alone.
 
-        # 4b. Try regex2
-        pattern = re.compile(r'See all articles(.+)View All Comments', re.S)
-        match = re.search(pattern, all_text)
-        if match:
-            return match.group(1)
+        Args:
+            html_content(str or bytes): HTML file content to be processed
+            digest(str): Content hash of the page for the text cache.
+                         Default: None (computed when needed)
 
-        # Handle new patterns here as needed
-        # ....
+        Returns: Counter of words
 
-        # A fallback of considering the whole visible text (title + essay + reviews + extras)
-        # can be considered to avoid unnecessary exception. When processing in 1000s, such
-        # fallbacks for a few no.of files will not skew the result majorly.
-        logger.DEBUG(f"---NONE OF THE MECHANISMS WORKED, FALLBACK USED---")
-        return all_text
+        """
+        all_text = self.retrieve_text(html_content, digest=digest)
+        # Tokenize and clean the text
+        return Counter(self.tokenize_and_clean(all_text))
 
     def process_file_content(self, html_content):
         """
@@ -111,38 +263,419 @@ class WordFrequencyProcessor(object):
         Returns: None
 
         """
-        all_text = self.retrieve_text(html_content)
-        # Tokenize and clean the text
-        words = self.tokenize_and_clean(all_text)
+        self.add_counts(self.count_words(html_content))
+
+    def add_counts(self, counter):
+        """
+        Adds word counts to the overall word frequency in a threadsafe way.
 
-        # Update the words to the counter in a threadsafe way
+        Args:
+            counter(Counter): Word counts to be added
+        """
         with self.counter_lock:
-            self.counter.update(words)
+            if self.heavy_hitters is not None:
+                self.heavy_hitters.update(counter)
+            else:
+                self.counter.update(counter)
 
     def process_all_files(self):
         """
         Process all the files by considering only the relevant content of our
-        interest, tokenizing the words and then counting those.
+        interest, tokenizing the words and then counting those. The files are
+        listed lazily and handed over to the workers in batches, with a
+        bounded no.of batches and file bytes in flight, so that the memory
+        stays flat however large the corpus is.
         """
         # Iterate through the file paths and calculate word frequency
-        logger.INFO(f"Processing all files under {self.html_files_dir_path}")
-        file_paths = [f for f in os.listdir(self.html_files_dir_path)]
-        # Create a ThreadPoolExecutor with the specified number of threads
-        with concurrent.futures.ThreadPoolExecutor(max_workers=self.num_threads) as executor:
-            # Download all URLs concurrently and save to files
-            executor.map(self.run_checks_and_process_file, file_paths)
+        logger.INFO(f"Processing all files under {self.html_files_dir_path} "
+                    f"using {self.executor} executor")
+        self.num_files = 0
+        if self.heavy_hitters is None and not self.count_cache_file_path \
+                and not self.partitions_file_path:
+            self.token_counter = TokenCounter(self.word_bank)
+        file_entries = self.iter_file_entries()
+        if self.fingerprints is not None:
+            file_entries = self.iter_unique_entries(file_entries)
+        batches = iter_batches(file_entries, constants.PROCESS_BATCH_SIZE,
+                               constants.MAX_BATCH_BYTES)
+        if self.count_cache_file_path:
+            self.process_all_files_incrementally(list(file_entries))
+        elif self.partitions_file_path:
+            self.process_all_files_by_day(batches)
+        elif self.executor == constants.EXECUTOR_PROCESS:
+            self.process_all_files_in_processes(batches)
+        else:
+            # Create a ThreadPoolExecutor with the specified number of threads
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.num_threads) as executor:
+                for _ in self.run_batches(executor, self.process_batch,
+                                          batches):
+                    pass
+        if self.shard is not None:
+            logger.INFO(f"{self.num_files} files belong to shard "
+                        f"{self.shard[0]}/{self.shard[1]}")
+        if self.fingerprints is not None:
+            self.fingerprints.save()
+            self.log_dedup_stats()
+        if self.partitions_file_path:
+            self.save_date_partitions()
+        if self.extractor.text_cache is not None:
+            # The workers are done, so their segments can be merged
+            self.extractor.text_cache.compact()
 
-    def run_checks_and_process_file(self, file_name):
-        full_path = os.path.join(self.html_files_dir_path, file_name)
-        if not os.path.isfile(full_path):
-            return
-        if file_name.startswith("NOT_FOUND_"):
-            logger.DEBUG(f"Skipping {full_path}")
+    def iter_file_entries(self):
+        """
+        Lists the files to be processed lazily, only the ones of the shard
+        if one is given, and counts them in num_files.
+
+        Returns: Generator of (file name, size in bytes) tuples
+        """
+        for file_name, size in self.corpus.iter_entries():
+            if self.shard is None or in_shard(file_name, self.shard):
+                self.num_files += 1
+                yield file_name, size
+
+    def iter_unique_entries(self, file_entries):
+        """
+        Leaves out the files that are duplicates of a file listed before
+        them: the exact copies, and with near duplicate detection, the
+        files whose SimHash is known from an earlier run and is near the
+        one of an earlier file. The other near duplicates are only found
+        once they are parsed, see extract_file.
+
+        Args:
+            file_entries(iterable): (file name, size in bytes) tuples
+
+        Returns: Generator of (file name, size in bytes) tuples
+        """
+        for file_name, size in file_entries:
+            self.fingerprints.fingerprint(self.corpus, file_name)
+            canonical = self.fingerprints.claim_digest(file_name, size)
+            if canonical is None and self.dedup == constants.DEDUP_NEAR:
+                canonical = self.fingerprints.claim_simhash(file_name,
+                                                            size=size)
+            if canonical is not None:
+                logger.DEBUG(f"Skipping {file_name}, a duplicate of "
+                             f"{canonical}", sample_key="duplicate")
+                continue
+            yield file_name, size
+
+    def is_near_duplicate(self, file_name, text):
+        """
+        Computes the SimHash of a file that has none yet, and checks it
+        against the files counted so far.
+
+        Args:
+            file_name(str): File name relative to the html files dir
+            text(str): Article text of the file
+
+        Returns: True if the file is a near duplicate of a file counted
+                 before it
+        """
+        entry = self.fingerprints.entries.get(file_name)
+        if entry is None or entry.simhash is not None:
+            # Not fingerprinted, or already checked before it was parsed
+            return False
+        canonical = self.fingerprints.claim_simhash(
+            file_name, simhash(TOKEN_PATTERN.findall(text.lower())))
+        if canonical is None:
+            return False
+        logger.DEBUG(f"Skipping {file_name}, a near duplicate of "
+                     f"{canonical}", sample_key="duplicate")
+        return True
+
+    def log_dedup_stats(self):
+        """
+        Logs how many duplicate files were skipped and how many bytes were
+        not parsed because of it.
+        """
+        stats = self.fingerprints.stats()
+        num_skipped = stats["exact_duplicates"] + stats["near_duplicates"]
+        share = 100 * num_skipped / self.num_files if self.num_files else 0
+        logger.INFO(f"Skipped {num_skipped} of {self.num_files} files "
+                    f"({share:.1f}%): {stats['exact_duplicates']} exact and "
+                    f"{stats['near_duplicates']} near duplicates. "
+                    f"{stats['skipped_bytes'] / 2 ** 20:.1f} MB were not "
+                    f"parsed")
+
+    def run_batches(self, executor, fn, batches):
+        """
+        Runs fn on the batches with a bounded no.of batches and bytes in
+        flight (see lib.scheduler.run_bounded).
+
+        Args:
+            executor(concurrent.futures.Executor): Executor
+            fn(callable): Function that gets a list of file names
+            batches(iterable): (list of file names, no.of bytes) tuples
+
+        Returns: Generator of (list of file names, result of fn) tuples
+        """
+        return run_bounded(
+            executor, fn, batches,
+            max_in_flight=constants.BATCHES_IN_FLIGHT_PER_WORKER *
+            self.num_threads,
+            max_bytes_in_flight=self.max_bytes_in_flight)
+
+    def process_all_files_in_processes(self, batches):
+        """
+        Process the files in a pool of worker processes. Each worker counts
+        a batch of files into its own local counter and the parent merges
+        the per-batch counts as they complete, so that parsing is not
+        limited by the GIL and no lock is contended per file.
+
+        Args:
+            batches(iterable): (list of file names, no.of bytes) tuples
+        """
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.num_threads,
+                initializer=_init_worker,
+                initargs=(self.html_files_dir_path, self.word_bank,
+                          self.text_cache_dir_path, logger.get_settings())) as executor:
+            for _, ((words, counts), extractor_stats) in self.run_batches(
+                    executor, _count_files, batches):
+                if self.token_counter is not None:
+                    self.token_counter.merge_sparse(words, counts)
+                else:
+                    self.add_counts(Counter(dict(zip(
+                        (word.decode("ascii") for word in words), counts))))
+                self.extractor.merge_stats(extractor_stats)
+
+    def process_all_files_incrementally(self, file_entries):
+        """
+        Process only the files that are new or modified since the last run,
+        using the per-file word count cache. The cached aggregate of all the
+        files is then added to the overall word frequency.
+
+        Args:
+            file_entries(list): (file name, size in bytes) tuples of the
+                                files relative to the html files dir
+        """
+        cache = FileCountCache(self.count_cache_file_path,
+                               settings_key=self.settings_key())
+        num_processed = self.update_count_cache(cache, file_entries)
+        logger.INFO(f"{num_processed} of {len(file_entries)} files were "
+                    f"processed, the rest were served from the count cache")
+        cache.save()
+        self.add_counts(cache.aggregate)
+        if self.partitions_file_path:
+            for file_name in cache.entries:
+                self.add_day_counts(file_name, cache.get(file_name))
+
+    def process_all_files_by_day(self, batches):
+        """
+        Process the files one by one instead of in batches, to add the
+        word counts of each file to the counts of its publish day as well.
+
+        Args:
+            batches(iterable): (list of file names, no.of bytes) tuples
+        """
+        executor, fn = self.per_file_executor()
+        with executor:
+            for file_names, (counters, extractor_stats) in self.run_batches(
+                    executor, fn, batches):
+                for file_name, counter in zip(file_names, counters):
+                    if counter is not None:
+                        self.add_counts(counter)
+                        self.add_day_counts(file_name, counter)
+                if extractor_stats is not None:
+                    self.extractor.merge_stats(extractor_stats)
+
+    def per_file_executor(self):
+        """
+        Returns: (executor, function) tuple, where the function counts the
+                 words of each file of a batch separately in the executor
+        """
+        if self.executor == constants.EXECUTOR_PROCESS:
+            return concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.num_threads,
+                initializer=_init_worker,
+                initargs=(self.html_files_dir_path, self.word_bank,
+                          self.text_cache_dir_path, logger.get_settings())), _count_each_file
+        return concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.num_threads), self.count_each_file
+
+    def day_of(self, file_name):
+        """
+        Args:
+            file_name(str): File name relative to the html files dir
+
+        Returns: Publish day (YYYY-MM-DD) of the file, from its url in the
+                 download manifest or from its name, or "undated"
+        """
+        return self.file_days.get(file_name) or date_of(file_name) or UNDATED
+
+    def add_day_counts(self, file_name, counter):
+        """
+        Adds the word counts of a file to the counts of its publish day.
+
+        Args:
+            file_name(str): File name relative to the html files dir
+            counter(Counter): Word counts of the file
+        """
+        day = self.day_of(file_name)
+        self.day_counters[day].update(counter)
+        self.day_files[day] += 1
+
+    def save_date_partitions(self):
+        """
+        Replaces the word counts per publish day on disk with the ones of
+        this run.
+        """
+        partitions = DatePartitions(self.partitions_file_path)
+        partitions.replace(self.day_counters, self.day_files)
+        partitions.close()
+        logger.INFO(f"Word counts of {len(self.day_files)} days are written "
+                    f"to {self.partitions_file_path}, "
+                    f"{self.day_files.get(UNDATED, 0)} files have no date")
+
+    def update_count_cache(self, cache, file_entries):
+        """
+        Brings the per-file word count cache up to date with the files:
+        the files that are new or modified are processed and the files that
+        no longer exist are dropped.
+
+        Args:
+            cache(lib.count_cache.FileCountCache): Word count cache
+            file_entries(list): (file name, size in bytes) tuples of the
+                                files relative to the html files dir
+
+        Returns: No.of files processed
+        """
+        sizes = dict(file_entries)
+        pending = cache.refresh(self.corpus, list(sizes))
+        if not pending:
+            return 0
+        pending_by_name = {item[0]: item for item in pending}
+        batches = iter_batches(
+            ((file_name, sizes[file_name]) for file_name in pending_by_name),
+            constants.PROCESS_BATCH_SIZE, constants.MAX_BATCH_BYTES)
+        executor, fn = self.per_file_executor()
+        with executor:
+            for file_names, (counters, extractor_stats) in self.run_batches(
+                    executor, fn, batches):
+                for file_name, counter in zip(file_names, counters):
+                    if counter is not None:
+                        _, signature, digest = pending_by_name[file_name]
+                        cache.update(file_name, signature, digest, counter)
+                if extractor_stats is not None:
+                    self.extractor.merge_stats(extractor_stats)
+        return len(pending)
+
+    def reopen_corpus(self):
+        """
+        Drops the opened corpus, so that the files added since it was
+        opened are seen.
+        """
+        self._corpus = None
+
+    def settings_key(self):
+        """
+        Returns: Key that identifies the settings the word counts depend on
+        """
+        word_bank_key = "none"
+        if self.word_bank is not None:
+            word_bank_key = self.word_bank.fingerprint()
+        return f"{EXTRACTOR_VERSION}|{TOKEN_PATTERN.pattern}|{word_bank_key}"
+
+    def count_file(self, file_name):
+        """
+        Counts the words of a single file.
+
+        Args:
+            file_name(str): File name relative to the html files dir
+
+        Returns: Counter of words or None if the file failed
+        """
+        text = self.extract_file(file_name)
+        if text is None:
+            return None
+        return Counter(self.tokenize_and_clean(text))
+
+    def count_each_file(self, file_names):
+        """
+        Counts the words of each file of a batch separately.
+
+        Args:
+            file_names(list): File names relative to the html files dir
+
+        Returns: (list of Counters of words or None for the files that
+                 failed, None) tuple, like _count_each_file in a worker
+                 process but without extractor stats to be merged
+        """
+        return [self.count_file(file_name) for file_name in file_names], None
+
+    def process_batch(self, file_names):
+        """
+        Counts the words of a batch of files into the overall word
+        frequency.
+
+        Args:
+            file_names(list): File names relative to the html files dir
+        """
+        if self.token_counter is not None:
+            self.count_batch(file_names)
             return
+        for file_name in file_names:
+            self.run_checks_and_process_file(file_name)
 
-        logger.INFO(f"Handling {full_path}")
-        with open(full_path, "r", encoding="utf-8") as file:
-            self.process_file_content(html_content=file.read())
+    def count_batch(self, file_names):
+        """
+        Counts the words of a batch of files into the word count vector.
+        The texts of the batch are tokenized and counted all at once.
+
+        Args:
+            file_names(list): File names relative to the html files dir
+        """
+        texts = [text for text in map(self.extract_file, file_names)
+                 if text is not None]
+        with self.counter_lock:
+            self.token_counter.update(texts)
+
+    def extract_file(self, file_name):
+        """
+        Extracts the displayable article content of a single file.
+
+        Args:
+            file_name(str): File name relative to the html files dir
+
+        Returns: Text or None if the file failed
+        """
+        try:
+            if self.extractor.text_cache is None:
+                text = self.retrieve_text(self.read_file(file_name))
+            else:
+                # The raw content is only hashed, and decoded and parsed only
+                # if its text is not cached yet
+                content = self.read_file(file_name, binary=True)
+                text = self.retrieve_text(content,
+                                          digest=file_digest(content))
+        except Exception as e:
+            logger.ERROR(f"Error processing {file_name}: {e}")
+            return None
+        if self.dedup == constants.DEDUP_NEAR and \
+                self.is_near_duplicate(file_name, text):
+            return None
+        return text
+
+    def read_file(self, file_name, binary=False):
+        """
+        Reads the html file from the corpus.
+
+        Args:
+            file_name(str): File name relative to the html files dir
+            binary(bool): Whether the raw bytes should be returned instead of
+                          the decoded text. Default: False
+
+        Returns: File content
+        """
+        logger.INFO(f"Handling {file_name}", sample_key="handling")
+        if binary:
+            return self.corpus.read_bytes(file_name)
+        return self.corpus.read(file_name)
+
+    def run_checks_and_process_file(self, file_name):
+        counter = self.count_file(file_name)
+        if counter is not None:
+            self.add_counts(counter)
 
     def get_top_words(self, count):
         """
@@ -152,47 +685,351 @@ class WordFrequencyProcessor(object):
             count(int): Count of top no.of words needed
 
         Returns:
-            List of top (word, no_of_occurences) pairs
+            List of top (word, no_of_occurences) pairs. When the heavy
+            hitters sketch is used, (word, no_of_occurences,
+            max_overestimation) tuples are returned instead.
+
+        """
+        if self.heavy_hitters is not None:
+            return self.heavy_hitters.top(count)
+        if self.token_counter is not None and not self.counter:
+            return self.token_counter.top(count)
+        return self.get_word_counts().most_common(count)
 
+    def get_word_counts(self):
+        """
+        Returns: Counter of all the words counted (exact counting only)
         """
-        return self.counter.most_common(count)
+        if self.token_counter is None:
+            return self.counter
+        return self.counter + self.token_counter.to_counter()
 
+    def get_reports(self, report_specs):
+        """
+        Answers every report from the word counts of the files processed,
+        so that any no.of reports cost a single pass over the corpus.
 
-if __name__ == "__main__":
+        Args:
+            report_specs(list): lib.reports.ReportSpec objects
+
+        Returns: Dict of report name to the report spec along with its
+                 "top_words", a list of top (word, no_of_occurences) pairs
+        """
+        if self.heavy_hitters is not None:
+            raise ValueError("Reports need exact word counts, they can't be "
+                             "answered from the heavy hitters sketch")
+        counter = self.get_word_counts()
+        return {spec.name: dict(spec.to_dict(),
+                                top_words=spec.top_words(counter))
+                for spec in report_specs}
+
+    def get_partial_counts(self):
+        """
+        Returns: lib.partial_counts.PartialCounts of the files processed, to
+                 be merged with the ones of the other shards
+        """
+        index, num_shards = self.shard or (0, 1)
+        if self.heavy_hitters is not None:
+            return PartialCounts([index], num_shards, self.settings_key(),
+                                 self.num_files, sketch=self.heavy_hitters)
+        return PartialCounts([index], num_shards, self.settings_key(),
+                             self.num_files, counter=self.get_word_counts())
 
-    parser = argparse.ArgumentParser(description="Word frequency processor")
+
+# Processor of the current worker process when the process executor is used
+_worker_processor = None
+
+
+def _init_worker(html_files_dir_path, word_bank, text_cache_dir_path=None,
+                 log_settings=None):
+    global _worker_processor
+    # Before anything is logged, which would set up the default logging
+    logger.setup_worker_logging(log_settings)
+    _worker_processor = WordFrequencyProcessor(
+        html_files_dir_path=html_files_dir_path,
+        text_cache_dir_path=text_cache_dir_path)
+    _worker_processor.word_bank = word_bank
+    _worker_processor.token_counter = TokenCounter(word_bank)
+
+
+def _count_files(file_names):
+    _worker_processor.count_batch(file_names)
+    return (_worker_processor.token_counter.pop_sparse(),
+            _worker_processor.extractor.pop_stats())
+
+
+def _count_html(html_content):
+    return (_worker_processor.count_words(html_content),
+            _worker_processor.extractor.pop_stats())
+
+
+def _count_each_file(file_names):
+    return ([_worker_processor.count_file(file_name)
+             for file_name in file_names],
+            _worker_processor.extractor.pop_stats())
+
+
+def query_date_partitions(parser, parsed_args):
+    """
+    Answers a top words query for a date range from the word counts per
+    publish day, without reading the html files.
+
+    Args:
+        parser(argparse.ArgumentParser): Parser of the command line
+        parsed_args(argparse.Namespace): Parsed command line arguments
+    """
+    partitions_file = parsed_args.partitions_file or \
+        constants.RELATIVE_DATE_PARTITIONS_FILE_PATH
+    if not os.path.isfile(partitions_file):
+        parser.error(f"{partitions_file} doesn't exist, run the analysis "
+                     "with --partitions_file first")
+    if parsed_args.reports or parsed_args.top_k_capacity:
+        parser.error("--from/--to can't be combined with -r or -k")
+    partitions = DatePartitions(os.path.join(os.getcwd(), partitions_file))
+    result = {
+        "from": parsed_args.from_date,
+        "to": parsed_args.to_date,
+        "files": partitions.num_files(parsed_args.from_date,
+                                      parsed_args.to_date),
+        "top_words": partitions.top_words(int(parsed_args.count),
+                                          parsed_args.from_date,
+                                          parsed_args.to_date),
+    }
+    partitions.close()
+    logger.INFO("Top {count} words of the files published from {start} to "
+                "{end} are: {data}".format(
+                    count=parsed_args.count,
+                    start=parsed_args.from_date or "the first day",
+                    end=parsed_args.to_date or "the last day",
+                    data=json.dumps(result, indent=2)))
+    if parsed_args.output:
+        with open(os.path.join(os.getcwd(), parsed_args.output), "w",
+                  encoding="utf-8") as file:
+            json.dump(result, file, indent=2)
+
+
+def main(argv=None, prog=None):
+    """
+    Analyzes the word frequency of the html files.
+
+    Args:
+        argv(list): Command line arguments. Default: None (sys.argv)
+        prog(str): Program name in the usage message. Default: None
+    """
+    parser = argparse.ArgumentParser(prog=prog,
+                                     description="Word frequency processor")
     parser.add_argument("-p", "--relative_dir_path",
                         help='relative (to the cwd) directory path that contains html files. '
+                             'A zip archive of the directory or a packed corpus '
+                             'segment file (see download_data.py --corpus_file) '
+                             'is read in place as well. '
                              f"Default: {constants.RELATIVE_HTML_DIR_PATH}",
                         type=str, default=constants.RELATIVE_HTML_DIR_PATH)
     parser.add_argument("-w", "--word_bank_file_path",
                         help='relative (to the cwd) file path for word bank. '
-                             f'Default: {constants.RELATIVE_WORD_BANK_FILE_PATH}',
-                        type=str, default=constants.RELATIVE_WORD_BANK_FILE_PATH)
+                             f'Default: {constants.RELATIVE_WORD_BANK_FILE_PATH} '
+                             'if it exists, otherwise no word bank',
+                        type=str, default=None)
     parser.add_argument("-c", "--count",
                         help=f"Count of top words needed. If not specified in the "
                              "command line, checks for TOP_WORD_COUNT ENV variable. "
                              f"Default: {constants.TOP_WORD_COUNT}",
                              type=int,
                              default=os.environ.get("TOP_WORD_COUNT", constants.TOP_WORD_COUNT))
-    parser.add_argument("-n", "--num_threads",
-                        help=f"No.of worker threads to use. "
-                             f"Default: {constants.MAX_THREADS}",
-                             type=int, default=constants.MAX_THREADS)
+    parser.add_argument("-n", "--num_threads", "--workers",
+                        help=f"No.of worker threads (or processes with the "
+                             "process executor) to use. "
+                             f"Default: {constants.MAX_THREADS} threads or "
+                             "one process per core",
+                             type=int, default=None)
+    parser.add_argument("-e", "--executor",
+                        help="Executor used to process the files. 'process' "
+                             "parses the files in worker processes and scales "
+                             "with the no.of cores. "
+                             f"Default: {constants.EXECUTOR_THREAD}",
+                        choices=[constants.EXECUTOR_THREAD,
+                                 constants.EXECUTOR_PROCESS],
+                        default=constants.EXECUTOR_THREAD)
+    parser.add_argument("--cache_file",
+                        help="relative (to the cwd) file path of the per-file "
+                             "word count cache. When given, only new or "
+                             "modified files are parsed on reruns. "
+                             f"Eg: {constants.RELATIVE_COUNT_CACHE_FILE_PATH}",
+                        type=str, default=None)
+    parser.add_argument("--text_cache_dir",
+                        help="relative (to the cwd) directory path of the "
+                             "extracted text cache. When given, the article "
+                             "text of every page is stored there and reruns "
+                             "only tokenize it, so changing the word bank or "
+                             "the count does not parse the HTML again. "
+                             f"Eg: {constants.RELATIVE_TEXT_CACHE_DIR_PATH}",
+                        type=str, default=None)
+    parser.add_argument("-k", "--top_k_capacity",
+                        help="Use the bounded-memory approximate top-K mode "
+                             "that tracks at most this many words. Each top "
+                             "word is reported along with the max no.of "
+                             "occurrences it may be overestimated by. "
+                             "Default: exact counting",
+                        type=int, default=None)
+    parser.add_argument("--max_in_flight_mb",
+                        help="Max no.of megabytes of the files handed over "
+                             "to the workers at a time. Bounds the memory "
+                             "used for large corpora. "
+                             f"Default: {constants.MAX_BYTES_IN_FLIGHT // 2 ** 20}",
+                        type=int,
+                        default=constants.MAX_BYTES_IN_FLIGHT // 2 ** 20)
+    parser.add_argument("--shard",
+                        help="Process only the i-th (0 based) of N shards "
+                             "of the files, given as i/N, and write its "
+                             "partial counts to --partial_output, to be "
+                             "combined by merge_counts.py. Use a separate "
+                             "--cache_file per shard. Default: all the files",
+                        type=parse_shard, default=None)
+    parser.add_argument("--partial_output",
+                        help="relative (to the cwd) file path of the partial "
+                             "counts of the shard. "
+                             f"Default: {constants.RELATIVE_PARTIAL_COUNTS_DIR_PATH}"
+                             "/shard-<i>-of-<N>.json.gz",
+                        type=str, default=None)
+    parser.add_argument("-r", "--reports",
+                        help="relative (to the cwd) file path of a JSON list "
+                             "of report specs, each with its own name, count, "
+                             "word_bank, min_length and max_length. All the "
+                             "reports are answered from a single pass over "
+                             "the files. Can't be combined with -w or -k",
+                        type=str, default=None)
+    parser.add_argument("-o", "--output",
+                        help="relative (to the cwd) file path to write the "
+                             "result to as JSON. Default: None",
+                        type=str, default=None)
+    parser.add_argument("--dedup",
+                        help="Count only the first of the duplicate pages: "
+                             "the exact copies, or the near duplicates "
+                             "(SimHash of the article text) as well. Exact "
+                             "copies are skipped without being parsed. "
+                             "'near' needs the thread executor. "
+                             "Default: every page is counted",
+                        choices=[constants.DEDUP_EXACT, constants.DEDUP_NEAR],
+                        default=None)
+    parser.add_argument("--fingerprint_file",
+                        help="relative (to the cwd) file path where the "
+                             "fingerprints of the pages are kept across runs "
+                             "with --dedup, so that unchanged pages are "
+                             "deduplicated without being read or parsed. "
+                             "Default: next to --cache_file with the "
+                             f"{constants.FINGERPRINT_FILE_SUFFIX} suffix if "
+                             "it is given. "
+                             f"Eg: {constants.RELATIVE_FINGERPRINT_INDEX_FILE_PATH}",
+                        type=str, default=None)
+    parser.add_argument("--partitions_file",
+                        help="relative (to the cwd) file path to write the "
+                             "word counts per publish day to, for --from/--to "
+                             "queries. Can't be combined with -k or --shard. "
+                             f"Eg: {constants.RELATIVE_DATE_PARTITIONS_FILE_PATH}",
+                        type=str, default=None)
+    parser.add_argument("-m", "--manifest_file",
+                        help="relative (to the cwd) file path of the download "
+                             "manifest, to find the publish day of each file "
+                             "from its url. "
+                             f"Default: {constants.RELATIVE_DOWNLOAD_MANIFEST_FILE_PATH} "
+                             "if it exists, otherwise the day is taken from "
+                             "the file name",
+                        type=str, default=None)
+    parser.add_argument("--from", dest="from_date",
+                        help="First publish day (YYYY-MM-DD) of a top words "
+                             "query answered from the word counts per day of "
+                             "an earlier --partitions_file run, without "
+                             "reading the html files. Default: None",
+                        type=parse_date, default=None)
+    parser.add_argument("--to", dest="to_date",
+                        help="Last publish day (YYYY-MM-DD) of a top words "
+                             "query, see --from. Default: None",
+                        type=parse_date, default=None)
     parser.add_argument("-d", "--debug", help="Enable debug messages",
                         required=False, action='store_true')
+    parser.add_argument("--quiet",
+                        help="Leave out the per-file messages, eg: for bulk "
+                             "runs",
+                        required=False, action='store_true')
 
-    parsed_args = parser.parse_args()
-    if parsed_args.debug:
-        logger.setup_logging(log_level="DEBUG")
+    parsed_args = parser.parse_args(argv)
+    if parsed_args.reports and (parsed_args.word_bank_file_path or
+                                parsed_args.top_k_capacity):
+        parser.error("--reports can't be combined with -w or -k, give each "
+                     "report its own word_bank instead")
+    if parsed_args.dedup == constants.DEDUP_NEAR and \
+            parsed_args.executor == constants.EXECUTOR_PROCESS:
+        parser.error("--dedup near needs the thread executor")
+    if parsed_args.partitions_file and (parsed_args.top_k_capacity or
+                                        parsed_args.shard):
+        parser.error("--partitions_file can't be combined with -k or --shard")
+    if parsed_args.debug or parsed_args.quiet:
+        logger.setup_logging(log_level="DEBUG" if parsed_args.debug else "INFO",
+                             quiet=parsed_args.quiet)
+    if parsed_args.from_date or parsed_args.to_date:
+        query_date_partitions(parser, parsed_args)
+        return
+    num_workers = parsed_args.num_threads
+    if num_workers is None:
+        num_workers = constants.MAX_THREADS
+        if parsed_args.executor == constants.EXECUTOR_PROCESS:
+            num_workers = os.cpu_count()
+    manifest_file = parsed_args.manifest_file
+    if parsed_args.partitions_file and manifest_file is None and \
+            os.path.isfile(constants.RELATIVE_DOWNLOAD_MANIFEST_FILE_PATH):
+        manifest_file = constants.RELATIVE_DOWNLOAD_MANIFEST_FILE_PATH
     html_files_dir_path = os.path.join(
         os.getcwd(), parsed_args.relative_dir_path)
+    word_bank_file_path = parsed_args.word_bank_file_path
+    if word_bank_file_path is None and \
+            os.path.isfile(constants.RELATIVE_WORD_BANK_FILE_PATH):
+        word_bank_file_path = constants.RELATIVE_WORD_BANK_FILE_PATH
+    report_specs, word_bank = None, None
+    if parsed_args.reports:
+        report_specs = load_report_specs(parsed_args.reports)
+        # Only the words of some report need to be counted
+        word_bank_file_path = None
+        word_bank = union_word_bank(report_specs)
     analyzer = WordFrequencyProcessor(html_files_dir_path=html_files_dir_path,
-                                      num_threads=parsed_args.num_threads)
+                                      word_bank_file_path=word_bank_file_path,
+                                      word_bank=word_bank,
+                                      num_threads=num_workers,
+                                      executor=parsed_args.executor,
+                                      count_cache_file_path=parsed_args.cache_file,
+                                      top_k_capacity=parsed_args.top_k_capacity,
+                                      text_cache_dir_path=parsed_args.text_cache_dir,
+                                      shard=parsed_args.shard,
+                                      max_bytes_in_flight=parsed_args.max_in_flight_mb * 2 ** 20,
+                                      dedup=parsed_args.dedup,
+                                      fingerprint_file_path=parsed_args.fingerprint_file,
+                                      partitions_file_path=parsed_args.partitions_file,
+                                      manifest_file_path=manifest_file)
     analyzer.process_all_files()
-    result = analyzer.get_top_words(count=parsed_args.count)
+    analyzer.log_extractor_stats()
+    if parsed_args.shard is not None:
+        partial_output = parsed_args.partial_output or os.path.join(
+            constants.RELATIVE_PARTIAL_COUNTS_DIR_PATH,
+            partial_counts_file_name(parsed_args.shard))
+        analyzer.get_partial_counts().save(
+            os.path.join(os.getcwd(), partial_output))
+        logger.INFO(f"Partial counts of {analyzer.num_files} files are "
+                    f"written to {partial_output}")
+    if report_specs:
+        result = {"files": analyzer.num_files,
+                  "reports": analyzer.get_reports(report_specs)}
+        logger.INFO(f"Reports are: {json.dumps(result, indent=2)}")
+    else:
+        result = analyzer.get_top_words(count=parsed_args.count)
+
+        logger.INFO("Top {count} words are: {data}".format(
+            count=parsed_args.count,
+            data=json.dumps(result, indent=2)
+        ))
+    if parsed_args.output:
+        with open(os.path.join(os.getcwd(), parsed_args.output), "w",
+                  encoding="utf-8") as file:
+            json.dump(result, file, indent=2)
 
-    logger.INFO("Top {count} words are: {data}".format(
-        count=parsed_args.count,
-        data=json.dumps(result, indent=2)
-    ))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+The single entry point of the scripts, eg:
+
+    python scripts/wordprocessor.py download --quiet
+    python scripts/wordprocessor.py analyze -c 20
+
+The script of a subcommand is only imported when the subcommand runs, so
+that a run (or --help) never pays for the imports of the other ones.
+"""
+import argparse
+import importlib
+import sys
+
+
+# Subcommand -> (module of the script, description)
+SUBCOMMANDS = {
+    "download": ("scripts.download_data",
+                 "Download the HTML source of the urls"),
+    "analyze": ("scripts.word_analyzer",
+                "Analyze the word frequency of the html files"),
+    "stream": ("scripts.stream_analyzer",
+               "Download the urls and analyze their word frequency in a "
+               "single pass"),
+    "merge": ("scripts.merge_counts",
+              "Merge the partial counts of sharded analyze runs"),
+    "pack": ("scripts.pack_corpus",
+             "Pack html files into a packed corpus segment"),
+    "serve": ("scripts.analyzer_service",
+              "Run the word frequency service"),
+}
+
+
+def main(argv=None):
+    """
+    Runs the subcommand given in the command line arguments.
+
+    Args:
+        argv(list): Command line arguments. Default: None (sys.argv)
+    """
+    parser = argparse.ArgumentParser(
+        prog="wordprocessor",
+        description="Downloads web pages and analyzes their word frequency",
+        epilog="Run 'wordprocessor <command> --help' for the options of a "
+               "command",
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", metavar="<command>",
+                                       required=True)
+    for command, (_, description) in SUBCOMMANDS.items():
+        # The options are parsed by the script of the subcommand itself
+        subparsers.add_parser(command, help=description, add_help=False)
+
+    if argv is None:
+        argv = sys.argv[1:]
+    parsed_args, command_argv = parser.parse_known_args(argv[:1])
+    module = importlib.import_module(SUBCOMMANDS[parsed_args.command][0])
+    module.main(command_argv + argv[1:],
+                prog=f"{parser.prog} {parsed_args.command}")
+
+
+if __name__ == "__main__":
+    main()